@@ -1,15 +1,12 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from src.chatbot import chatbot_ask, index, metadatas  # importer le RAG existant
-import faiss
-import pickle
+from src.chatbot import chatbot_ask, reload_index  # importer le RAG existant
 from pathlib import Path
 
 app = FastAPI(title="API RAG - Chatbot Événements Lyon")
 
 BASE_DIR = Path(__file__).parent.parent
 INDEX_FILE = BASE_DIR / "db/faiss_evenements.index"
-METADATAS_FILE = BASE_DIR / "db/metadatas.pkl"
 
 # --------------------------- Modèle de requête ---------------------------
 class QuestionRequest(BaseModel):
@@ -31,10 +28,7 @@ async def ask_question(request: QuestionRequest):
 @app.get("/rebuild")
 async def rebuild_index():
     try:
-        global index, metadatas
-        index = faiss.read_index(str(INDEX_FILE))
-        with open(METADATAS_FILE, "rb") as f:
-            metadatas = pickle.load(f)
+        reload_index()
         return {"status": "success", "message": "Index et métadonnées rechargés."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
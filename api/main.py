@@ -1,10 +1,13 @@
 import os
 import sys
 from pathlib import Path
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-import faiss
-import pickle
 import logging
 import subprocess
 import time
@@ -17,19 +20,40 @@ from threading import Thread
 BASE_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(BASE_DIR / "src"))
 
-from chatbot import chatbot_ask, index, metadatas  # Import du chatbot existant
+# Nombre de processus uvicorn ; au-delà de 1, l'index est ouvert en mémoire mappée
+# pour que les workers partagent ses pages au lieu d'en garder chacun une copie
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+if API_WORKERS > 1:
+    os.environ.setdefault("FAISS_MMAP", "1")
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "64"))  # questions max par appel /ask/batch
+
+from chatbot import (  # Import du chatbot existant
+    chatbot_ask, chatbot_ask_async, chatbot_ask_stream, chatbot_ask_batch_async, retriever, reload_index,
+    llm, answer_cache, embedding_cache, preload, warmup
+)
+from search_filters import SearchFilters
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app):
+    """Au démarrage : charge et chauffe le modèle d'embedding et l'index avant la première requête."""
+    loop = asyncio.get_running_loop()
+    duration = await loop.run_in_executor(None, preload)
+    logger.info(f"Modèle d'embedding et index chargés en {duration:.2f} s")
+    duration = await loop.run_in_executor(None, warmup)
+    logger.info(f"Warm-up du modèle d'embedding terminé en {duration:.2f} s")
+    yield
+
 app = FastAPI(
     title="API Chatbot Événements Lyon",
     description="API pour interroger un chatbot basé sur FAISS et des événements à Lyon",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 INDEX_FILE = BASE_DIR / "db/faiss_evenements.index"
-METADATAS_FILE = BASE_DIR / "db/metadatas.pkl"
 
 # --------------------------------------------------------------------
 # Variables globales
@@ -39,12 +63,45 @@ last_ask_metadata = []  # stocke les métadatas utilisées par la dernière ques
 # --------------------------------------------------------------------
 # Modèle de requête
 # --------------------------------------------------------------------
+class FiltersRequest(BaseModel):
+    date_from: date | None = Field(None, description="Premier jour de la période recherchée")
+    date_to: date | None = Field(None, description="Dernier jour de la période recherchée")
+    postal_codes: list[str] | None = Field(
+        None, example=["69001", "7"], description="Codes postaux ou numéros d'arrondissement de Lyon"
+    )
+    age: int | None = Field(None, ge=0, le=120, description="Âge du participant (bornes age_min / age_max)")
+
+    def to_filters(self):
+        return SearchFilters(self.date_from, self.date_to, self.postal_codes, self.age)
+
 class QuestionRequest(BaseModel):
     question: str = Field(
         ...,
         example="Quels événements ce week-end à Lyon ?",
         description="La question envoyée au chatbot"
     )
+    filters: FiltersRequest | None = Field(
+        None, description="Contraintes optionnelles appliquées à la recherche vectorielle"
+    )
+
+def filters_kwargs(filters):
+    """Arguments `filters` pour le chatbot (aucun si la requête n'en a pas)."""
+    if filters is None:
+        return {}
+    try:
+        return {"filters": filters.to_filters()}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+class BatchQuestionRequest(BaseModel):
+    questions: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=BATCH_MAX_QUESTIONS,
+        example=["Quels événements ce week-end à Lyon ?", "Quels concerts ce soir ?"],
+        description="Les questions envoyées au chatbot, traitées ensemble"
+    )
+    filters: FiltersRequest | None = Field(None, description="Contraintes appliquées à toutes les questions")
 
 # --------------------------------------------------------------------
 # Endpoints
@@ -61,8 +118,11 @@ async def ask_question(request: QuestionRequest):
     question = request.question.strip()
     if not question:
         raise HTTPException(status_code=400, detail="La question ne peut pas être vide.")
+    kwargs = filters_kwargs(request.filters)
     try:
-        response_text, response_metadata = chatbot_ask(question)
+        # Encodage/FAISS dans un pool de threads et appel Mistral asynchrone :
+        # une réponse lente du LLM ne bloque plus les autres requêtes (ni /health)
+        response_text, response_metadata = await chatbot_ask_async(question, **kwargs)
         last_ask_metadata = response_metadata  # Mise à jour des métadatas de la dernière requête
         return {
             "question": question,
@@ -73,21 +133,106 @@ async def ask_question(request: QuestionRequest):
         logger.error(f"Erreur dans /ask : {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/batch", tags=["Chatbot"])
+async def ask_questions_batch(request: BatchQuestionRequest):
+    """
+    Pose plusieurs questions en un appel : encodage groupé, une seule recherche
+    FAISS, puis appels Mistral concurrents. Les résultats sont renvoyés dans
+    l'ordre des questions ; une question en échec a un champ `error` au lieu
+    de `response`, sans faire échouer le reste du lot.
+    """
+    questions = [q.strip() for q in request.questions]
+    valid = [q for q in questions if q]
+    kwargs = filters_kwargs(request.filters)
+    try:
+        answers = iter(await chatbot_ask_batch_async(valid, **kwargs) if valid else [])
+    except Exception as e:
+        logger.error(f"Erreur dans /ask/batch : {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    results = []
+    for question in questions:
+        if not question:
+            results.append({"question": question, "error": "La question ne peut pas être vide."})
+            continue
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            logger.error(f"Erreur dans /ask/batch pour {question!r} : {answer}")
+            results.append({"question": question, "error": str(answer)})
+        else:
+            response_text, response_metadata = answer
+            results.append({"question": question, "response": response_text, "metadata": response_metadata})
+    return {
+        "count": len(results),
+        "errors": sum("error" in r for r in results),
+        "results": results
+    }
+
+def sse_event(event, data):
+    """Formate un événement server-sent events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ask/stream", tags=["Chatbot"])
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Pose une question au chatbot et renvoie la réponse en server-sent events :
+    un événement `sources` dès la fin de la recherche, puis des événements `token`
+    au fil de la génération, et enfin `done` (ou `error`).
+    """
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="La question ne peut pas être vide.")
+    kwargs = filters_kwargs(request.filters)
+
+    async def event_stream():
+        try:
+            async for kind, value in chatbot_ask_stream(question, **kwargs):
+                if kind == "sources":
+                    yield sse_event("sources", {"question": question, "metadata": value})
+                else:
+                    yield sse_event("token", {"text": value})
+            yield sse_event("done", {})
+        except Exception as e:
+            logger.error(f"Erreur dans /ask/stream : {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/rebuild", tags=["Administration"])
 async def rebuild_index():
-    """Recharge l'index FAISS et les métadonnées."""
+    """
+    Recharge l'index FAISS et les métadonnées sans interrompre le service :
+    le chargement et la validation se font dans un thread, puis la nouvelle
+    version remplace atomiquement l'ancienne. Avec plusieurs workers, seul
+    celui qui reçoit l'appel recharge tout de suite ; les autres suivent
+    quand ils voient le nouveau manifeste (INDEX_CHECK_INTERVAL secondes).
+    """
     try:
-        global index, metadatas
         if not INDEX_FILE.exists():
             raise FileNotFoundError(f"Index introuvable : {INDEX_FILE}")
-        index = faiss.read_index(str(INDEX_FILE))
-        with open(METADATAS_FILE, "rb") as f:
-            metadatas = pickle.load(f)
-        return {"status": "success", "message": "Index et métadonnées rechargés."}
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(None, reload_index)
+        return {
+            "status": "success",
+            "message": "Index et métadonnées rechargés.",
+            "index": snapshot.info()
+        }
     except Exception as e:
         logger.error(f"Erreur dans /rebuild : {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/index", tags=["Administration"])
+async def get_index_info():
+    """
+    Renvoie la version de l'index utilisée par le worker qui répond : `version`
+    compte ses chargements, `built_at` identifie le build servi dans tous les workers.
+    """
+    return retriever.current.info()
+
 @app.get("/metadata", tags=["Administration"])
 async def get_metadata():
     """Renvoie les métadatas utilisées par la dernière requête /ask."""
@@ -103,12 +248,30 @@ async def get_metadata():
         logger.error(f"Erreur dans /metadata : {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stats", tags=["Administration"])
+async def get_stats():
+    """Renvoie les métriques de l'API : appels Mistral, caches des réponses et des embeddings."""
+    return {
+        "worker": os.getpid(),  # métriques et caches propres à ce worker (un processus par worker)
+        "llm": llm.metrics.snapshot(),
+        "answer_cache": answer_cache.stats(),
+        "embedding_cache": embedding_cache.stats()
+    }
+
 # --------------------------------------------------------------------
 # Lancement local
 # --------------------------------------------------------------------
 if __name__ == "__main__":
     import uvicorn
 
+    if API_WORKERS > 1:
+        # Mode multi-workers : uvicorn a besoin d'une chaîne d'import ("main:app" depuis api/,
+        # sans passer par api/__init__.py qui chargerait une seconde fois le chatbot)
+        logger.info(f"Lancement de {API_WORKERS} workers (index FAISS en mémoire mappée)")
+        uvicorn.run("main:app", app_dir=str(BASE_DIR / "api"), host="127.0.0.1", port=8080,
+                    workers=API_WORKERS)
+        sys.exit(0)
+
     def run_server():
         uvicorn.run(app, host="127.0.0.1", port=8080)
 
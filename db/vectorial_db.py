@@ -1,11 +1,25 @@
 # %% --------------------------- IMPORTS ---------------------------
 from pathlib import Path
 import os, sys
+import time
+import re
+import bisect
+import hashlib
+import argparse
 import pandas as pd
+import numpy as np
 import json
 from io import StringIO
+import faiss
 sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
 
+from vectorisation import BATCH_SIZE, MODEL_NAME
+from metadata_store import MetadataStore, load_metadatas, EVENTS_FILE, CHUNKS_FILE
+from date_index import DateIndex, event_date_ranges, DATE_INDEX_FILE
+from sparse_index import SparseIndex, SPARSE_INDEX_FILE
+from search_filters import FILTER_FIELDS
+from embeddings import EMBEDDING_BACKEND, EMBEDDING_BACKENDS, load_embedding_model
+
 
 # %% --------------------------- CONFIGURATION DES CHEMINS ---------------------------
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -13,104 +27,549 @@ DB_DIR = BASE_DIR / "db"
 DB_DIR.mkdir(exist_ok=True)  # crée le dossier si non existant
 
 FAISS_INDEX_FILE = DB_DIR / "faiss_evenements.index"
-METADATAS_FILE = DB_DIR / "metadatas.pkl"
+MANIFEST_FILE = DB_DIR / "manifest.json"  # hash du texte de chaque event_id -> ids des vecteurs
+
+INPUT_FILE = BASE_DIR / "src" / "evenements_lyon_vectorises.jsonl"
 
+# Type d'index : "flat" (exact), "ivf_flat", "hnsw" ou "ivf_pq" (approchés)
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+MAX_TRAIN_SIZE = 100_000  # taille max de l'échantillon d'entraînement IVF/PQ
 
-input_file = Path(__file__).resolve().parent.parent / "src" / "evenements_lyon_vectorises.jsonl"
-# Lecture sûre du JSONL
-with open(input_file, "r", encoding="utf-8") as f:
-    data = f.read()
+# Découpage en tokens : budget par défaut = longueur max du modèle (256 pour all-MiniLM-L6-v2)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "0")) or None
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
 
-df = pd.read_json(StringIO(data), lines=True)
 
-print(f"Nombre d'événements chargés : {len(df)}")
 # %% --------------------------- EXTRACTION DES CHUNKS DE TEXTE ---------------------------
 
 def split_text(text, chunk_size=500, chunk_overlap=50):
     """
-    Découpe un texte en chunks, mais ne découpe pas si le texte est inférieur 
+    Découpe un texte en chunks, mais ne découpe pas si le texte est inférieur
     à la taille du chunk.
     """
     if not text:
         return []
-    
+
     text_len = len(text)
-    
+
     # NE PAS CHUNKER si le texte est déjà court et dense
     if text_len <= chunk_size:
         return [text]
 
     chunks = []
     start = 0
-    
+
     while start < text_len:
         end = min(start + chunk_size, text_len)
         chunks.append(text[start:end])
         # Assurez-vous de ne pas avoir de chevauchement négatif à la fin
-        start = start + chunk_size - chunk_overlap 
+        start = start + chunk_size - chunk_overlap
         if start >= text_len:
             break
-            
+
     return chunks
 
-# Appliquer le split à la colonne vectorise_text (code inchangé ici)
-df['chunks'] = df['vectorise_text'].apply(lambda x: split_text(x))
+
+SENTENCE_END = re.compile(r"(?<=[.!?…;])\s+|\n+")
+
+
+def sentence_starts(text):
+    """Positions (caractères) des débuts de phrase, 0 compris."""
+    return [0] + [m.end() for m in SENTENCE_END.finditer(text) if m.end() < len(text)]
+
+
+class TokenChunker:
+    """
+    Découpe un texte en chunks d'au plus `max_tokens` tokens du tokenizer du
+    modèle d'embedding, en regroupant des phrases entières. Deux chunks
+    consécutifs se recouvrent d'environ `overlap_tokens` tokens (phrases
+    entières si possible). Une phrase plus longue que le budget est coupée
+    entre deux mots ; ces coupes sont comptées dans `stats`.
+    """
+
+    def __init__(self, tokenizer, max_tokens, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens doit être compris entre 0 et max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.reset()
+
+    def reset(self):
+        self.stats = {"texts": 0, "chunks": 0, "tokens": 0, "sentences_split": 0}
+
+    @classmethod
+    def from_model(cls, model, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        """Budget = max_seq_length du modèle moins les tokens spéciaux ([CLS], [SEP])."""
+        if max_tokens is None:
+            max_tokens = model.max_seq_length - 2
+        return cls(model.tokenizer, max_tokens, overlap_tokens)
+
+    @property
+    def name(self):
+        return f"tokens:{self.max_tokens}/{self.overlap_tokens}"
+
+    def offsets(self, text):
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return [(start, end) for start, end in encoding["offset_mapping"] if end > start]
+
+    def __call__(self, text):
+        if not text:
+            return []
+        offsets = self.offsets(text)
+        self.stats["texts"] += 1
+        self.stats["tokens"] += len(offsets)
+        n = len(offsets)
+        if n <= self.max_tokens:
+            self.stats["chunks"] += 1
+            return [text.strip()] if n else []
+
+        token_starts = [start for start, _ in offsets]
+        # Index du premier token de chaque phrase, et des tokens qui commencent un mot
+        sentences = sorted({bisect.bisect_left(token_starts, c) for c in sentence_starts(text)} | {n})
+        words = [i for i, (start, _) in enumerate(offsets)
+                 if i == 0 or start > offsets[i - 1][1] or not text[start - 1].isalnum()] + [n]
+
+        chunks = []
+        start = end = 0
+        while end < n:
+            limit = start + self.max_tokens
+            previous_end = end
+            # Chaque chunk doit aller plus loin que le précédent (pas de chunk inclus dans le recouvrement)
+            end = _last_at_most(sentences, limit, previous_end)
+            if end is None:  # phrase trop longue : coupe au dernier mot qui tient
+                self.stats["sentences_split"] += 1
+                end = _last_at_most(words, limit, previous_end) or limit
+            chunks.append(text[offsets[start][0]:offsets[end - 1][1]])
+            # Recouvrement : début de phrase (sinon de mot) le plus proche de end - overlap,
+            # sans dépasser la moitié du chunk
+            target = end - min(self.overlap_tokens, (end - start) // 2)
+            start = _first_at_least(sentences, target, end) or _first_at_least(words, target, end) or end
+        self.stats["chunks"] += len(chunks)
+        return chunks
+
+    def count_tokens(self, text):
+        return len(self.offsets(text))
+
+    def report(self):
+        s = self.stats
+        mean = s["tokens"] / s["chunks"] if s["chunks"] else 0
+        return (f"Découpage {self.name} : {s['texts']} textes -> {s['chunks']} chunks "
+                f"({mean:.0f} tokens de texte en moyenne), {s['sentences_split']} phrases coupées")
+
+
+def _last_at_most(positions, limit, after):
+    """Plus grande position de la liste triée telle que after < p <= limit, sinon None."""
+    i = bisect.bisect_right(positions, limit) - 1
+    return positions[i] if i >= 0 and positions[i] > after else None
+
+
+def _first_at_least(positions, target, before):
+    """Plus petite position de la liste triée telle que target <= p < before, sinon None."""
+    i = bisect.bisect_left(positions, max(target, 1))
+    return positions[i] if i < len(positions) and positions[i] < before else None
+
+
+def count_truncated(chunks, tokenizer, max_tokens):
+    """Nombre de chunks qui dépassent max_tokens et seront donc tronqués à l'encodage."""
+    return sum(
+        len(tokenizer(chunk, add_special_tokens=False)["input_ids"]) > max_tokens for chunk in chunks
+    )
+
+
+def build_chunks(df, chunker=split_text):
+    """
+    Découpe chaque événement en chunks (TokenChunker, ou split_text par défaut)
+    et renvoie la liste à plat des chunks avec, pour chacun, ses métadonnées.
+    """
+    def column(name):
+        if name in df.columns:
+            return df[name].tolist()
+        return [""] * len(df)
+
+    chunks = []
+    metadatas = []
+    filter_columns = [column(f) for f in FILTER_FIELDS]
+    for row, (event_id, title, dates_text, geo_text, vectorise_text) in enumerate(zip(
+        column("event_id"), column("title"), column("dates_text"),
+        column("geo_text"), column("vectorise_text")
+    )):
+        for chunk in chunker(vectorise_text):
+            chunks.append(chunk)
+            # Capture toutes les infos du texte vectorisé
+            meta = {
+                "event_id": event_id,
+                "title": title,
+                "dates_text": dates_text,
+                "geo_text": geo_text,
+                "vectorise_text": vectorise_text,  # toutes les infos
+                "chunk": chunk
+            }
+            # Champs utilisés par la recherche filtrée (code postal, âges)
+            meta.update({f: values[row] for f, values in zip(FILTER_FIELDS, filter_columns)})
+            metadatas.append(meta)
+    return chunks, metadatas
 
 
 # %% --------------------------- VECTORISATION DES CHUNKS ---------------------------
-from sentence_transformers import SentenceTransformer
-import numpy as np
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+def encode_chunks(model, chunks, batch_size=BATCH_SIZE):
+    """
+    Encode les chunks par lots dans une matrice float32 préallouée.
 
-vectors = []
-metadatas = []
+    Les chunks sont triés par longueur avant l'encodage pour limiter le padding
+    dans chaque lot ; chaque vecteur est réécrit à la position de son chunk.
+    Renvoie la matrice (n_chunks, dim) et un rapport de temps.
+    """
+    dim = model.get_sentence_embedding_dimension()
+    vectors = np.empty((len(chunks), dim), dtype="float32")
 
+    order = np.argsort([len(c) for c in chunks], kind="stable")
+    start_time = time.perf_counter()
+    for start in range(0, len(chunks), batch_size):
+        batch_ids = order[start:start + batch_size]
+        vectors[batch_ids] = model.encode(
+            [chunks[i] for i in batch_ids],
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+    elapsed = time.perf_counter() - start_time
 
-for _, row in df.iterrows():
-    for chunk in row['chunks']:
-        vec = model.encode(chunk, normalize_embeddings=True).astype('float32')
-        vectors.append(vec)
-        # Capture toutes les infos du texte vectorisé
-        metadatas.append({
-            "event_id": row.get("event_id", ""),
-            "title": row.get("title", ""),
-            "dates_text": row.get("dates_text", ""),
-            "geo_text": row.get("geo_text", ""),
-            "vectorise_text": row.get("vectorise_text", ""),  # toutes les infos
-            "chunk": chunk
-        })
+    report = {
+        "chunks": len(chunks),
+        "batch_size": batch_size,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(len(chunks) / elapsed, 1) if elapsed > 0 else None
+    }
+    return vectors, report
 
-vectors = np.array(vectors, dtype='float32')
-# %% --------------------------- CRÉATION DE L'INDEX FAISS ---------------------------
-import faiss
 
-d = vectors.shape[1]  # dimension des embeddings
-index = faiss.IndexFlatIP(d)  # Index pour similarité cosinus (normalisé)
-index.add(vectors)
+# %% --------------------------- MISE À JOUR INCRÉMENTALE ---------------------------
+
+def hash_text(text):
+    """Empreinte du texte vectorisé d'un événement."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def new_manifest(index_type="flat", chunking="chars", embedding_backend="torch", embedding_model=MODEL_NAME):
+    # Backend et modèle d'embedding : des vecteurs d'un autre espace ne doivent pas être mélangés à l'index
+    return {"next_id": 0, "index_type": index_type, "chunking": chunking,
+            "embedding_backend": embedding_backend, "embedding_model": embedding_model, "events": {}}
+
+
+def chunking_name(chunker):
+    return getattr(chunker, "name", "chars")
+
+
+# %% --------------------------- FABRIQUE D'INDEX ---------------------------
+
+def count_chunks(df, chunker=split_text):
+    """Nombre de chunks que produira build_chunks (sans encoder)."""
+    return sum(len(chunker(text)) for text in df["vectorise_text"])
+
+
+def default_nlist(n_vectors):
+    """≈ 4·√n listes IVF, en gardant au moins ~39 points d'entraînement par liste."""
+    return int(max(1, min(4 * np.sqrt(n_vectors), n_vectors // 39)))
+
+
+def index_description(index_type, dim, n_vectors, nlist=None, hnsw_m=32):
+    """Chaîne faiss.index_factory correspondant au type d'index demandé."""
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m}"
+    nlist = nlist or default_nlist(n_vectors)
+    if index_type == "ivf_flat":
+        return f"IDMap2,IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        # Sous-quantifieurs de 8 dimensions ; moins de bits si l'échantillon est petit
+        pq_m = max(m for m in range(1, dim // 8 + 1) if dim % m == 0)
+        nbits = int(min(8, max(4, np.log2(max(n_vectors, 1) / 39))))
+        return f"IDMap2,IVF{nlist},PQ{pq_m}x{nbits}"
+    raise ValueError(f"Type d'index inconnu : {index_type} (attendu : {', '.join(INDEX_TYPES)})")
+
+
+def create_index(dim, index_type="flat", n_vectors=0, nlist=None):
+    """
+    Index cosinus (vecteurs normalisés, produit scalaire) dont les vecteurs sont
+    identifiés par un id stable. Les index IVF doivent être entraînés (train_index).
+    """
+    description = index_description(index_type, dim, n_vectors, nlist)
+    return faiss.index_factory(dim, description, faiss.METRIC_INNER_PRODUCT)
+
+
+def train_index(index, vectors, max_train_size=MAX_TRAIN_SIZE, seed=0):
+    """Entraîne l'index (IVF/PQ) sur un échantillon des vecteurs si nécessaire."""
+    if getattr(index, "is_trained", True):
+        return
+    if len(vectors) > max_train_size:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[rng.choice(len(vectors), max_train_size, replace=False)]
+    index.train(vectors)
+
+
+def load_manifest(path=MANIFEST_FILE):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def diff_events(df, manifest):
+    """
+    Compare les événements du DataFrame au manifeste.
+    Renvoie les empreintes courantes, les event_id nouveaux ou modifiés
+    et les event_id disparus.
+    """
+    hashes = {
+        event_id: hash_text(text)
+        for event_id, text in zip(df["event_id"], df["vectorise_text"])
+    }
+    known = manifest["events"]
+    changed = [eid for eid, h in hashes.items() if known.get(eid, {}).get("hash") != h]
+    deleted = [eid for eid in known if eid not in hashes]
+    return hashes, changed, deleted
+
+
+def record_event_attributes(manifest, metadatas, df):
+    """
+    Met à jour, pour chaque événement du DataFrame (ré-encodé ou non), son
+    intervalle de dates (jours) dans le manifeste et ses champs de filtrage
+    dans les métadonnées de ses chunks : ces valeurs peuvent changer sans que
+    le texte vectorisé change. L'index de dates est reconstruit à chaque
+    sauvegarde à partir du manifeste.
+    """
+    ranges = event_date_ranges(df)
+    events = manifest["events"]
+    fields = [f for f in FILTER_FIELDS if f in df.columns]
+    for row in df[["event_id", *fields]].to_dict("records"):
+        entry = events.get(row["event_id"])
+        if entry is None:
+            continue
+        entry["dates"] = ranges.get(row["event_id"])
+        for vector_id in entry["ids"]:
+            metadatas[vector_id].update({f: row[f] for f in fields})
+
+
+def open_existing_index(index_type, incremental=True, chunking="chars", embedding_backend="torch",
+                        embedding_model=MODEL_NAME):
+    """
+    Renvoie (index, métadonnées, manifeste) du dernier build s'il peut être mis
+    à jour en place avec ce type d'index, ce découpage et ce modèle d'embedding
+    (backend compris), sinon None (reconstruction complète).
+    """
+    manifest = load_manifest() if incremental else None
+    if manifest is not None and manifest.get("index_type", "flat") != index_type:
+        print(f"Type d'index modifié ({manifest.get('index_type', 'flat')} -> {index_type})")
+        manifest = None
+    if manifest is not None and manifest.get("chunking", "chars") != chunking:
+        print(f"Découpage modifié ({manifest.get('chunking', 'chars')} -> {chunking})")
+        manifest = None
+    # Manifeste antérieur à ces champs : construit avec SentenceTransformer (torch) et MODEL_NAME
+    if manifest is not None and manifest.get("embedding_backend", "torch") != embedding_backend:
+        print(f"Backend d'embedding modifié ({manifest.get('embedding_backend', 'torch')} -> {embedding_backend})")
+        manifest = None
+    if manifest is not None and manifest.get("embedding_model", MODEL_NAME) != embedding_model:
+        print(f"Modèle d'embedding modifié ({manifest.get('embedding_model', MODEL_NAME)} -> {embedding_model})")
+        manifest = None
+    if manifest is not None and index_type == "hnsw":
+        print("HNSW ne permet pas de retirer des vecteurs")
+        manifest = None
+    if manifest is not None and FAISS_INDEX_FILE.exists() and EVENTS_FILE.exists():
+        print("Mise à jour incrémentale de l'index existant")
+        return faiss.read_index(str(FAISS_INDEX_FILE)), load_metadatas().to_dict(), manifest
+    if incremental:
+        print("Aucun manifeste exploitable : reconstruction complète")
+    return None
+
+
+def remove_events(index, metadatas, manifest, event_ids, keep_entries=False):
+    """
+    Retire de l'index et des métadonnées les vecteurs des événements donnés.
+    Avec keep_entries, leurs entrées du manifeste sont conservées (événements
+    sur le point d'être ré-encodés). Renvoie le nombre de vecteurs retirés.
+    """
+    events = manifest["events"]
+    stale_ids = [i for eid in event_ids for i in events.get(eid, {}).get("ids", [])]
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype="int64"))
+        for i in stale_ids:
+            metadatas.pop(i, None)
+    if not keep_entries:
+        for eid in event_ids:
+            events.pop(eid, None)
+    return len(stale_ids)
+
+
+def update_index(index, metadatas, manifest, df, model, batch_size=BATCH_SIZE, chunker=split_text):
+    """
+    Met à jour l'index, les métadonnées (dict id -> métadonnées) et le manifeste
+    en place : seuls les événements nouveaux ou modifiés sont ré-encodés, les
+    vecteurs des événements modifiés ou supprimés sont retirés de l'index.
+    """
+    df = df.drop_duplicates("event_id", keep="last")
+    hashes, changed, deleted = diff_events(df, manifest)
+    events = manifest["events"]
+    n_new = sum(1 for eid in changed if eid not in events)
+
+    chunks_removed = remove_events(index, metadatas, manifest, changed, keep_entries=True)
+    chunks_removed += remove_events(index, metadatas, manifest, deleted)
+
+    chunks, chunk_metadatas = build_chunks(df[df["event_id"].isin(changed)], chunker)
+    ids = np.arange(manifest["next_id"], manifest["next_id"] + len(chunks), dtype="int64")
+    report = None
+    if chunks:
+        vectors, report = encode_chunks(model, chunks, batch_size)
+        train_index(index, vectors)
+        index.add_with_ids(vectors, ids)
+    manifest["next_id"] += len(chunks)
+
+    for eid in changed:
+        events[eid] = {"hash": hashes[eid], "ids": []}
+    for vector_id, meta in zip(ids.tolist(), chunk_metadatas):
+        metadatas[vector_id] = meta
+        events[meta["event_id"]]["ids"].append(vector_id)
+    record_event_attributes(manifest, metadatas, df)
+
+    return {
+        "new": n_new,
+        "updated": len(changed) - n_new,
+        "deleted": len(deleted),
+        "unchanged": len(hashes) - len(changed),
+        "chunks_removed": chunks_removed,
+        "chunks_encoded": len(chunks),
+        "encoding": report
+    }
+
+
+def _atomic_write(path, write):
+    """Écrit dans un fichier temporaire puis le renomme, pour ne jamais laisser un fichier à moitié écrit."""
+    tmp_path = Path(f"{path}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_all(index, metadatas, manifest, index_file=FAISS_INDEX_FILE, events_file=EVENTS_FILE,
+             chunks_file=CHUNKS_FILE, manifest_file=MANIFEST_FILE, date_index_file=DATE_INDEX_FILE,
+             sparse_index_file=SPARSE_INDEX_FILE, incremental=False):
+    """
+    Sauvegarde l'index et ses fichiers annexes. Avec `incremental` (build parti
+    de l'index précédent, ids de vecteurs jamais réutilisés), l'index BM25 est
+    mis à jour en ne tokenisant que les chunks ajoutés ; le store Arrow et
+    l'index de dates sont réécrits en entier (sans ré-encodage).
+    """
+    _atomic_write(index_file, lambda p: faiss.write_index(index, str(p)))
+
+    # Métadonnées au format colonnaire : champs d'événement stockés une seule fois
+    MetadataStore.from_dict(metadatas).save(events_file, chunks_file)
+
+    # Intervalles de dates des événements, pour le filtrage temporel sans analyse de texte
+    _atomic_write(date_index_file, DateIndex.from_manifest(manifest).save)
+
+    # Index BM25 des chunks (titres, noms propres), fusionné avec FAISS à la recherche
+    previous = SparseIndex.load(sparse_index_file) if incremental else None
+    _atomic_write(sparse_index_file, SparseIndex.from_metadatas(metadatas, previous).save)
+
+    def dump_manifest(p):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+    # Le manifeste est écrit en dernier : il ne décrit jamais un index non sauvegardé
+    _atomic_write(manifest_file, dump_manifest)
+
+
+# %% ----------- MAIN SCRIPT: exécuté UNIQUEMENT en ligne de commande -----------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit l'index FAISS des événements.")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="ne ré-encode que les événements nouveaux ou modifiés depuis le dernier build"
+    )
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE,
+                        help="type d'index FAISS (défaut : variable FAISS_INDEX_TYPE ou flat)")
+    parser.add_argument("--nlist", type=int, default=None,
+                        help="nombre de listes des index IVF (défaut : ≈ 4·√n)")
+    parser.add_argument("--chunking", choices=("tokens", "chars"), default="tokens",
+                        help="découpage par phrases et tokens du modèle, ou ancien découpage en caractères")
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS,
+                        help="tokens par chunk (défaut : longueur max du modèle)")
+    parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND,
+                        help="torch (SentenceTransformer) ou ONNX Runtime (exporté par scripts/export_onnx.py)")
+    args = parser.parse_args()
+
+    # Lecture sûre du JSONL
+    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+        data = f.read()
+
+    df = pd.read_json(StringIO(data), lines=True)
+    print(f"Nombre d'événements chargés : {len(df)}")
 
-print(f"Index Faiss créé avec {index.ntotal} vecteurs")
+    model = load_embedding_model(args.embedding_backend, MODEL_NAME)
+    chunker = split_text
+    if args.chunking == "tokens":
+        chunker = TokenChunker.from_model(model, args.max_tokens, args.overlap_tokens)
 
-# Sauvegarde dans le dossier db
-faiss.write_index(index, str(FAISS_INDEX_FILE))
-print(f"Index FAISS sauvegardé dans {FAISS_INDEX_FILE}")
+    existing = open_existing_index(args.index_type, args.incremental, chunking_name(chunker),
+                                   args.embedding_backend, MODEL_NAME)
+    if existing is not None:
+        index, metadatas, manifest = existing
+    else:
+        print(f"Création d'un index {args.index_type}")
+        manifest = new_manifest(args.index_type, chunking_name(chunker), args.embedding_backend, MODEL_NAME)
+        n_vectors = count_chunks(df, chunker) if args.index_type.startswith("ivf") else 0
+        if isinstance(chunker, TokenChunker):
+            chunker.reset()
+        index = create_index(
+            model.get_sentence_embedding_dimension(), args.index_type,
+            n_vectors=n_vectors, nlist=args.nlist
+        )
+        metadatas = {}
 
-# %% --------------------------- SAUVEGARDE DES MÉTADONNÉES ---------------------------
-import pickle
+    first_new_id = manifest["next_id"]
+    stats = update_index(index, metadatas, manifest, df, model, chunker=chunker)
+    print(
+        f"Événements : {stats['new']} nouveaux, {stats['updated']} modifiés, "
+        f"{stats['deleted']} supprimés, {stats['unchanged']} inchangés"
+    )
+    print(f"Chunks : {stats['chunks_encoded']} encodés, {stats['chunks_removed']} retirés")
+    if isinstance(chunker, TokenChunker):
+        print(chunker.report())
+    # Seuls les chunks encodés pendant ce build sont retokenisés (pas tout le catalogue)
+    new_chunks = [metadatas[i]["chunk"] for i in range(first_new_id, manifest["next_id"])]
+    print(f"Chunks encodés tronqués (> {model.max_seq_length - 2} tokens) : "
+          f"{count_truncated(new_chunks, model.tokenizer, model.max_seq_length - 2)} / {len(new_chunks)}")
+    report = stats["encoding"]
+    if report:
+        print(
+            f"Encodage : {report['chunks']} chunks en {report['seconds']} s "
+            f"({report['chunks_per_second']} chunks/s, lots de {report['batch_size']})"
+        )
 
-with open(METADATAS_FILE, "wb") as f:
-    pickle.dump(metadatas, f)
-print(f"Métadonnées sauvegardées dans {METADATAS_FILE}")
+    print(f"Index Faiss avec {index.ntotal} vecteurs")
 
-# %% --------------------------- EXEMPLE DE RECHERCHE ---------------------------
-query = "Concert de jazz à Paris cet été"
-q_vec = model.encode(query, normalize_embeddings=True).astype('float32')
+    # --------------------------- SAUVEGARDE ---------------------------
+    save_all(index, metadatas, manifest, incremental=existing is not None)
+    print(f"Index FAISS sauvegardé dans {FAISS_INDEX_FILE}")
+    print(f"Métadonnées sauvegardées dans {EVENTS_FILE} et {CHUNKS_FILE}")
+    print(f"Index de dates sauvegardé dans {DATE_INDEX_FILE}")
+    print(f"Index BM25 sauvegardé dans {SPARSE_INDEX_FILE}")
+    print(f"Manifeste sauvegardé dans {MANIFEST_FILE}")
 
-k = 5  # nombre de résultats
-D, I = index.search(np.array([q_vec]), k)
+    # --------------------------- EXEMPLE DE RECHERCHE ---------------------------
+    query = "Concert de jazz à Paris cet été"
+    q_vec = model.encode(query, normalize_embeddings=True).astype('float32')
 
-print("Résultats les plus proches :")
-for i in I[0]:
-    print(metadatas[i]['title'], "-", metadatas[i]['dates_text'], "-", metadatas[i]['geo_text'])
+    k = 5  # nombre de résultats
+    D, I = index.search(np.array([q_vec]), k)
 
-# %%
+    print("Résultats les plus proches :")
+    for i in I[0]:
+        if i == -1:
+            continue
+        print(metadatas[i]['title'], "-", metadatas[i]['dates_text'], "-", metadatas[i]['geo_text'])
@@ -0,0 +1,68 @@
+"""
+Compare les backends d'embedding (torch, onnx, onnx-int8), chacun dans un
+interpréteur neuf : temps de chargement du modèle (démarrage de l'API),
+latence d'encodage d'une question (moyenne / p95) et mémoire résidente max.
+
+    python scripts/benchmark_embeddings.py
+    python scripts/benchmark_embeddings.py --queries 500 onnx onnx-int8
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR / "src"))
+
+from embeddings import EMBEDDING_BACKENDS
+
+SNIPPET = """
+import sys, time, json, resource
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+from embeddings import load_embedding_model
+model = load_embedding_model({backend!r})
+load_s = time.perf_counter() - start
+questions = {questions!r}
+model.encode(questions[0], normalize_embeddings=True)  # échauffement
+latencies = []
+for i in range({n}):
+    start = time.perf_counter()
+    model.encode(questions[i % len(questions)], normalize_embeddings=True)
+    latencies.append((time.perf_counter() - start) * 1000)
+latencies.sort()
+print(json.dumps({{
+    "load_s": load_s,
+    "mean_ms": sum(latencies) / len(latencies),
+    "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+}}))
+"""
+
+QUESTIONS = [
+    "Quels événements ce week-end à Lyon ?",
+    "Quels concerts ce soir ?",
+    "Que faire avec des enfants aujourd'hui ?",
+    "Quelles expositions en ce moment ?",
+    "Où a lieu l'apéro végétal pendant le Run in Lyon ?",
+]
+
+
+def run(backend, n_queries):
+    code = SNIPPET.format(src=str(BASE_DIR / "src"), backend=backend, questions=QUESTIONS, n=n_queries)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=BASE_DIR).stdout.strip().splitlines()[-1]
+    return json.loads(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("backends", nargs="*", default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10} {'chargement s':>12} {'ms moy':>8} {'ms p95':>8} {'RSS max Mo':>11}")
+    for backend in args.backends:
+        r = run(backend, args.queries)
+        print(f"{backend:<10} {r['load_s']:>12.2f} {r['mean_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['rss_mb']:>11.0f}")
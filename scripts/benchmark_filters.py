@@ -0,0 +1,127 @@
+"""
+Recherche filtrée (période, lieu, âge) : compare, pour chaque type d'index
+et plusieurs sélectivités du filtre, la recherche sans filtre, l'IDSelector
+FAISS et la recherche élargie (k × overfetch) filtrée ensuite.
+Le chemin mesuré est celui du chatbot : FilterIndex.selection (ids autorisés
+et sélecteur mis en cache par filtre) puis filtered_search avec
+make_search_params.
+Latence moyenne / p95 par requête et recall@k par rapport à la recherche
+exacte restreinte aux vecteurs autorisés.
+
+    python scripts/benchmark_filters.py
+    python scripts/benchmark_filters.py --synthetic 200000 --selectivity 0.5 0.05 0.005
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+sys.path.append(str(BASE_DIR / "src"))
+
+from db.vectorial_db import INDEX_TYPES, create_index, train_index
+from scripts.benchmark_index import make_queries, synthetic_vectors
+from src.chatbot import make_search_params
+from src.search_filters import FILTER_OVERFETCH, FilterIndex, SearchFilters, filtered_search
+
+
+def synthetic_filter_index(n_vectors, chunks_per_event, seed=0):
+    """
+    FilterIndex d'événements synthétiques : age_min tiré uniformément dans
+    [0, 100[ et pas d'age_max, si bien que SearchFilters(age=100 × s) autorise
+    une fraction ≈ s des événements.
+    """
+    rng = np.random.default_rng(seed)
+    event_rows = np.arange(n_vectors) // chunks_per_event
+    n_events = event_rows.max() + 1
+    return FilterIndex([f"EV{i}" for i in range(n_events)], [""] * n_events,
+                       rng.random(n_events) * 100, [""] * n_events,
+                       np.arange(n_vectors, dtype="int64"), event_rows)
+
+
+def timed(search, queries):
+    """Latences (ms) des requêtes une par une, comme dans chatbot_ask, et résultats."""
+    search(queries[:1])  # échauffement
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(search(q[None, :])[1][0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies), np.array(results)
+
+
+def recall(I, ground_truth):
+    return np.mean([len(set(a[a != -1]) & set(b)) / len(b) for a, b in zip(I, ground_truth)])
+
+
+def benchmark(vectors, queries, k, nprobe, ef_search, selectivities, chunks_per_event, overfetch):
+    ids = np.arange(len(vectors), dtype="int64")
+    rows = []
+    for index_type in INDEX_TYPES:
+        index = create_index(vectors.shape[1], index_type, n_vectors=len(vectors))
+        train_index(index, vectors)
+        index.add_with_ids(vectors, ids)
+        base = make_search_params(index, nprobe, ef_search)
+        filter_index = synthetic_filter_index(len(vectors), chunks_per_event)  # un par index, comme par snapshot
+
+        def make_params(sel):
+            return make_search_params(index, nprobe, ef_search, sel=sel)
+
+        def overfetch_only(sel):
+            if sel is not None:
+                raise RuntimeError("sélecteur désactivé")
+            return base
+
+        latencies, _ = timed(lambda q: index.search(q, k, params=base), queries)
+        rows.append((index_type, "-", "sans filtre", latencies, None))
+
+        for selectivity in selectivities:
+            filters = SearchFilters(age=100 * selectivity)
+            allowed = filter_index.allowed_ids(filters)
+            scores = queries @ vectors[allowed].T  # vérité terrain : recherche exacte restreinte
+            ground_truth = allowed[np.argsort(-scores, axis=1)[:, :k]]
+
+            def with_selector(q):
+                # Comme chatbot.search : sélecteur pris dans le cache du FilterIndex
+                allowed_ids, selector = filter_index.selection(filters)
+                return filtered_search(index, q, k, allowed_ids, make_params, overfetch=overfetch,
+                                       selector=selector)
+
+            def without_selector(q):
+                return filtered_search(index, q, k, filter_index.selection(filters)[0], overfetch_only,
+                                       overfetch=overfetch)
+
+            for name, search in (("IDSelector", with_selector), ("overfetch", without_selector)):
+                latencies, I = timed(search, queries)
+                rows.append((index_type, f"{len(allowed) / len(vectors):.3f}", name, latencies,
+                             recall(I, ground_truth)))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=50_000, help="nombre de vecteurs synthétiques")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--selectivity", type=float, nargs="+", default=[0.5, 0.1, 0.01],
+                        help="fractions des événements autorisés par le filtre")
+    parser.add_argument("--chunks-per-event", type=int, default=3)
+    parser.add_argument("--overfetch", type=int, default=FILTER_OVERFETCH)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.synthetic)
+    queries = make_queries(vectors, args.queries)
+    print(f"{len(vectors)} vecteurs de dimension {vectors.shape[1]}, {len(queries)} requêtes, k={args.k}")
+
+    print(f"\n{'index':<10} {'autorisés':>9} {'méthode':<12} {'ms moy':>8} {'ms p95':>8} {'recall@' + str(args.k):>9}")
+    for index_type, fraction, method, latencies, rec in benchmark(
+            vectors, queries, args.k, args.nprobe, args.ef_search, args.selectivity,
+            args.chunks_per_event, args.overfetch):
+        rec = "-" if rec is None else f"{rec:.3f}"
+        print(f"{index_type:<10} {fraction:>9} {method:<12} {latencies.mean():>8.3f} "
+              f"{np.percentile(latencies, 95):>8.3f} {rec:>9}")
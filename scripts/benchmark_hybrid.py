@@ -0,0 +1,105 @@
+"""
+Coût de la recherche hybride : construction et taille de l'index BM25,
+latence par requête de la recherche BM25 et de la fusion RRF, comparées à
+la recherche FAISS seule (index plat). Comme chatbot.search, le mode hybride
+demande `--candidates` voisins à FAISS au lieu de k : le surcoût compte aussi
+cette recherche dense élargie.
+
+    python scripts/benchmark_hybrid.py                    # chunks de db/ (build existant)
+    python scripts/benchmark_hybrid.py --synthetic 100000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+sys.path.append(str(BASE_DIR / "src"))
+
+from scripts.benchmark_index import synthetic_vectors
+from src.metadata_store import load_metadatas
+from src.sparse_index import RRF_K, SparseIndex, document_text, reciprocal_rank_fusion
+
+GROUND_TRUTH_FILE = BASE_DIR / "tests" / "rag_ground_truth.json"
+
+
+def synthetic_texts(n, vocabulary_size=50_000, words=60, seed=0):
+    """Chunks de mots tirés selon une loi de Zipf (fréquences proches d'un corpus réel)."""
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.2, size=(n, words)), vocabulary_size)
+    return [" ".join(f"mot{r}" for r in row) for row in ranks]
+
+
+def latencies(run, n_queries):
+    """Latences (ms) de run(i) pour chaque requête i."""
+    run(0)  # échauffement
+    out = []
+    for i in range(n_queries):
+        start = time.perf_counter()
+        run(i)
+        out.append((time.perf_counter() - start) * 1000)
+    return np.array(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=0, help="nombre de chunks synthétiques")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5, help="résultats de la recherche dense seule")
+    parser.add_argument("--candidates", type=int, default=50, help="candidats de chaque classement (HYBRID_CANDIDATES)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    if args.synthetic:
+        texts = synthetic_texts(args.synthetic)
+        queries = [" ".join(f"mot{r}" for r in rng.zipf(1.2, size=6)) for _ in range(args.queries)]
+    else:
+        metadatas = load_metadatas()
+        texts = [document_text(metadatas[int(i)]) for i in sorted(int(i) for i in metadatas.vector_ids)] \
+            if hasattr(metadatas, "vector_ids") else [document_text(metadatas[i]) for i in sorted(metadatas)]
+        questions = [q["question"] for q in json.loads(GROUND_TRUTH_FILE.read_text(encoding="utf-8"))]
+        queries = [questions[i % len(questions)] for i in range(args.queries)]
+
+    start = time.perf_counter()
+    index = SparseIndex.build(texts, np.arange(len(texts)))
+    build_s = time.perf_counter() - start
+    size_mb = (index.indptr.nbytes + index.docs.nbytes + index.weights.nbytes + index.vector_ids.nbytes) / 1024 / 1024
+    print(f"{len(texts)} chunks, {len(index.vocabulary)} termes, {len(index.docs)} postings")
+    print(f"Construction BM25 : {build_s:.2f} s, tableaux CSR : {size_mb:.1f} Mo")
+
+    vectors = synthetic_vectors(len(texts), seed=2)
+    dense = faiss.IndexFlatIP(vectors.shape[1])
+    dense.add(vectors)
+    q_vecs = vectors[rng.choice(len(vectors), len(queries))]
+    # Classements indexés par numéro de requête : une question répétée garde chacun des siens
+    dense_rankings = [None] * len(queries)
+    sparse_rankings = [None] * len(queries)
+
+    def dense_search(i, n):
+        dense_rankings[i] = dense.search(q_vecs[i][None, :], n)[1][0]
+
+    def sparse_search(i):
+        sparse_rankings[i] = index.search(queries[i], args.candidates)[1]
+
+    n_candidates = max(args.k, args.candidates)
+    rows = [
+        (f"FAISS (plat, k={args.k})", latencies(lambda i: dense_search(i, args.k), len(queries))),
+        (f"FAISS (plat, k={n_candidates})", latencies(lambda i: dense_search(i, n_candidates), len(queries))),
+        ("BM25", latencies(sparse_search, len(queries))),
+        (f"fusion RRF (k={RRF_K})",
+         latencies(lambda i: reciprocal_rank_fusion([dense_rankings[i], sparse_rankings[i]], args.k),
+                   len(queries))),
+    ]
+    print(f"\n{'étape':<22} {'ms moy':>8} {'ms p95':>8}")
+    for name, ms in rows:
+        print(f"{name:<22} {ms.mean():>8.3f} {np.percentile(ms, 95):>8.3f}")
+    dense_only = rows[0][1].mean()
+    hybrid = rows[1][1].mean() + rows[2][1].mean() + rows[3][1].mean()
+    print(f"\nRecherche dense seule : {dense_only:.3f} ms/requête, hybride : {hybrid:.3f} ms/requête")
+    print(f"Surcoût de la recherche hybride : {hybrid - dense_only:.3f} ms/requête "
+          f"({(hybrid - dense_only) / dense_only:.0%} de la recherche FAISS seule)")
@@ -0,0 +1,48 @@
+"""
+Temps d'import des modules du projet, chacun mesuré dans un interpréteur neuf
+(moyenne de plusieurs essais). Les modèles (EasyOCR, SentenceTransformer) et
+l'index FAISS ne doivent être chargés qu'au premier usage, pas à l'import.
+
+    python scripts/benchmark_imports.py
+    python scripts/benchmark_imports.py --repeat 5 preprocessing chatbot
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODULES = ["cache", "metadata_store", "llm", "vectorisation", "preprocessing", "chatbot"]
+
+SNIPPET = """
+import sys, time
+sys.path.insert(0, {src!r})
+sys.path.insert(0, {db!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("torch", "easyocr", "faiss", "sentence_transformers") if m in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+
+def import_time(module):
+    code = SNIPPET.format(src=str(BASE_DIR / "src"), db=str(BASE_DIR / "db"), module=module)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=BASE_DIR).stdout.strip().splitlines()[-1]
+    seconds, heavy = (out.split(" ", 1) + [""])[:2]
+    return float(seconds), heavy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'module':<16} {'import ms':>10}  modules lourds chargés")
+    for module in args.modules:
+        runs = [import_time(module) for _ in range(args.repeat)]
+        ms = statistics.fmean(seconds for seconds, _ in runs) * 1000
+        print(f"{module:<16} {ms:>10.1f}  {runs[-1][1] or '-'}")
@@ -0,0 +1,99 @@
+"""
+Compare les types d'index FAISS (flat, ivf_flat, hnsw, ivf_pq) :
+recall@k par rapport à la recherche exacte, latence par requête et mémoire.
+
+    python scripts/benchmark_index.py                 # vecteurs de db/faiss_evenements.index
+    python scripts/benchmark_index.py --synthetic 200000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from db.vectorial_db import FAISS_INDEX_FILE, INDEX_TYPES, create_index, train_index
+
+
+def load_vectors(path):
+    """Récupère les vecteurs d'un index plat existant (IDMap2,Flat ou IndexFlatIP)."""
+    index = faiss.read_index(str(path))
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    return inner.reconstruct_n(0, inner.ntotal)
+
+
+def synthetic_vectors(n, dim=384, n_clusters=200, seed=0):
+    """Vecteurs normalisés regroupés en clusters, proches de la structure d'un corpus réel."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype("float32")
+    vectors = centers[rng.integers(n_clusters, size=n)] + 0.5 * rng.normal(size=(n, dim)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_queries(vectors, n_queries, seed=1):
+    """Requêtes = vecteurs du corpus bruités (et renormalisés)."""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), n_queries)] + 0.1 * rng.normal(
+        size=(n_queries, vectors.shape[1])).astype("float32")
+    queries = queries.astype("float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def search_params(index_type, nprobe, ef_search):
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
+
+
+def benchmark(vectors, queries, k, nprobe, ef_search):
+    ids = np.arange(len(vectors), dtype="int64")
+    ground_truth = None
+    rows = []
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        index = create_index(vectors.shape[1], index_type, n_vectors=len(vectors))
+        train_index(index, vectors)
+        index.add_with_ids(vectors, ids)
+        build_s = time.perf_counter() - start
+
+        params = search_params(index_type, nprobe, ef_search)
+        index.search(queries[:1], k, params=params)  # échauffement
+        start = time.perf_counter()
+        for q in queries:  # requêtes une par une, comme dans chatbot_ask
+            index.search(q[None, :], k, params=params)
+        latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        _, I = index.search(queries, k, params=params)
+        if ground_truth is None:  # "flat" est toujours le premier : référence exacte
+            ground_truth = I
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(I, ground_truth)])
+        memory_mb = faiss.serialize_index(index).nbytes / 1024 / 1024
+        rows.append((index_type, recall, latency_ms, memory_mb, build_s))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=0, help="nombre de vecteurs synthétiques")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.synthetic) if args.synthetic else load_vectors(FAISS_INDEX_FILE)
+    queries = make_queries(vectors, args.queries)
+    print(f"{len(vectors)} vecteurs de dimension {vectors.shape[1]}, {len(queries)} requêtes, k={args.k}")
+
+    print(f"\n{'index':<10} {'recall@' + str(args.k):>9} {'ms/requête':>11} {'mémoire Mo':>11} {'build s':>8}")
+    for index_type, recall, latency_ms, memory_mb, build_s in benchmark(
+            vectors, queries, args.k, args.nprobe, args.ef_search):
+        print(f"{index_type:<10} {recall:>9.3f} {latency_ms:>11.3f} {memory_mb:>11.1f} {build_s:>8.2f}")
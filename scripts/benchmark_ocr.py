@@ -0,0 +1,62 @@
+"""
+Débit de l'OCR (images/seconde) sur un dossier d'affiches locales :
+ancien mode (threads partageant un seul Reader, images pleine taille)
+contre OCREngine (pool de processus, images réduites, lots).
+
+    python scripts/benchmark_ocr.py chemin/vers/affiches --workers 4
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR / "src"))
+
+from ocr_engine import OCREngine, OCR_WORKERS, OCR_BATCH_SIZE, OCR_MAX_SIDE
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp"}
+
+
+def threaded_baseline(paths, threads=8):
+    """Reproduit l'ancienne étape OCR : un Reader partagé par 8 threads."""
+    import easyocr
+    reader = easyocr.Reader(["fr"], gpu=False)
+
+    def ocr(path):
+        return " ".join(reader.readtext(Image.open(path), detail=0))
+
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(ocr, paths))
+
+
+def timed(label, fn, n_images):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:>8.2f} s {n_images / elapsed:>8.2f} images/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sample_dir", type=Path)
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=OCR_BATCH_SIZE)
+    parser.add_argument("--max-side", type=int, default=OCR_MAX_SIDE)
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    paths = sorted(str(p) for p in args.sample_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not paths:
+        sys.exit(f"Aucune image dans {args.sample_dir}")
+    print(f"{len(paths)} images, {args.workers} processus OCR, lots de {args.batch_size}, "
+          f"côté max {args.max_side} px\n")
+
+    # Le chargement des modèles est inclus dans les deux mesures
+    if not args.skip_baseline:
+        timed("threads + Reader partagé", lambda: threaded_baseline(paths), len(paths))
+    engine = OCREngine(workers=args.workers, batch_size=args.batch_size, max_side=args.max_side)
+    timed("OCREngine (processus + réduction)", lambda: engine.run(paths), len(paths))
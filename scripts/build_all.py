@@ -1,15 +1,65 @@
+"""
+Construit l'index FAISS de bout en bout dans un seul processus
+(fetch -> OCR -> nettoyage -> embeddings -> index, en flux par lots).
+
+    python scripts/build_all.py
+    python scripts/build_all.py --incremental --index-type hnsw
+    python scripts/build_all.py --checkpoints build_debug/   # sorties intermédiaires en JSONL
+    python scripts/build_all.py --legacy                     # anciens scripts enchaînés via fichiers
+"""
+import argparse
 import subprocess
 import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR / "src"))
 
 PY = sys.executable  # ← utilise automatiquement le python du venv
 
-print("🚀 Running preprocessing...")
-subprocess.check_call([PY, "src/preprocessing.py"])
 
-print("🧠 Running vectorisation...")
-subprocess.check_call([PY, "src/vectorisation.py"])
+def legacy_build(index_args):
+    print("🚀 Running preprocessing...")
+    subprocess.check_call([PY, "src/preprocessing.py"], cwd=BASE_DIR)
+
+    print("🧠 Running vectorisation...")
+    subprocess.check_call([PY, "src/vectorisation.py"], cwd=BASE_DIR)
+
+    print("📚 Building FAISS index...")
+    subprocess.check_call([PY, "db/vectorial_db.py", *index_args], cwd=BASE_DIR)
+
+
+if __name__ == "__main__":
+    from pipeline import run_build, PIPELINE_BATCH_SIZE
+    from db.vectorial_db import INDEX_TYPES, INDEX_TYPE
+    from embeddings import EMBEDDING_BACKENDS, EMBEDDING_BACKEND
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Ne ré-encode que les événements nouveaux ou modifiés")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--nlist", type=int, default=None, help="Nombre de listes IVF (défaut : ~4*sqrt(n))")
+    parser.add_argument("--chunking", choices=("tokens", "chars"), default="tokens",
+                        help="Découpage par phrases et tokens du modèle, ou ancien découpage en caractères")
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND,
+                        help="Encodage PyTorch, ou ONNX Runtime float32 / int8 (voir scripts/export_onnx.py)")
+    parser.add_argument("--batch-size", type=int, default=PIPELINE_BATCH_SIZE, help="Événements par lot")
+    parser.add_argument("--checkpoints", type=Path, default=None,
+                        help="Dossier où écrire la sortie de chaque étape (débogage)")
+    parser.add_argument("--legacy", action="store_true", help="Enchaîne les anciens scripts via des fichiers")
+    args = parser.parse_args()
 
-print("📚 Building FAISS index...")
-subprocess.check_call([PY, "db/vectorial_db.py"])
+    if args.legacy:
+        index_args = ["--index-type", args.index_type, "--chunking", args.chunking,
+                      "--embedding-backend", args.embedding_backend]
+        index_args += ["--incremental"] if args.incremental else []
+        if args.nlist:
+            index_args += ["--nlist", str(args.nlist)]
+        legacy_build(index_args)
+    else:
+        print("🚀 Running streaming build...")
+        run_build(index_type=args.index_type, nlist=args.nlist, incremental=args.incremental,
+                  chunking=args.chunking, checkpoint_dir=args.checkpoints, batch_size=args.batch_size,
+                  embedding_backend=args.embedding_backend)
 
-print("🎉 All steps completed!")
+    print("🎉 All steps completed!")
@@ -0,0 +1,115 @@
+"""
+Exporte all-MiniLM-L6-v2 vers ONNX (float32 + version quantifiée int8) pour
+le backend d'embedding ONNX Runtime, puis vérifie que les embeddings restent
+proches de ceux de PyTorch (similarité cosinus >= EMBEDDING_MIN_COSINE sur
+les questions d'évaluation et un échantillon de chunks indexés).
+
+À lancer une fois, sur une machine où torch et sentence-transformers sont
+installés ; l'API n'a ensuite besoin que d'onnxruntime et de transformers :
+
+    python scripts/export_onnx.py
+    EMBEDDING_BACKEND=onnx-int8 python api/main.py
+
+L'image Docker l'exécute à la construction (modèles dans /app/models).
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR / "src"))
+
+from embeddings import (EMBEDDING_MODEL_NAME, MIN_COSINE, ONNX_CONFIG_FILE, ONNX_FILES, ONNX_MODEL_DIR,
+                        OnnxEmbedder, cosine_similarities)
+
+GROUND_TRUTH_FILE = BASE_DIR / "tests" / "rag_ground_truth.json"
+# Questions de vérification quand la vérité terrain n'est pas disponible (tests/ exclu du build Docker)
+FALLBACK_QUESTIONS = [
+    "Quels événements ce week-end à Lyon ?",
+    "Quels concerts ce soir ?",
+    "Que faire avec des enfants aujourd'hui ?",
+    "Quelles expositions en ce moment ?",
+]
+
+
+def export(model, out_dir, opset):
+    """Exporte le transformer (sortie last_hidden_state ; le pooling est fait côté numpy)."""
+    import torch
+
+    transformer, tokenizer = model[0].auto_model.eval(), model.tokenizer
+    example = tokenizer(["Concert de jazz à Lyon ce week-end"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in example]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, tuple(example[name] for name in input_names), str(out_dir / ONNX_FILES["onnx"]),
+            input_names=input_names, output_names=["last_hidden_state"], dynamic_axes=dynamic_axes,
+            opset_version=opset, do_constant_folding=True
+        )
+    tokenizer.save_pretrained(str(out_dir))
+    config = {
+        "model_name": EMBEDDING_MODEL_NAME,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "pooling": "mean"
+    }
+    (out_dir / ONNX_CONFIG_FILE).write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+
+def quantize(out_dir):
+    """Quantification dynamique int8 des poids (activations quantifiées à la volée)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(str(out_dir / ONNX_FILES["onnx"]), str(out_dir / ONNX_FILES["onnx-int8"]),
+                     weight_type=QuantType.QInt8)
+
+
+def sample_texts(n_chunks, seed=0):
+    """Questions d'évaluation (ou FALLBACK_QUESTIONS) + chunks du dernier build (s'il existe)."""
+    if GROUND_TRUTH_FILE.exists():
+        texts = [q["question"] for q in json.loads(GROUND_TRUTH_FILE.read_text(encoding="utf-8"))]
+    else:
+        texts = list(FALLBACK_QUESTIONS)
+    try:
+        from metadata_store import load_metadatas
+        metadatas = load_metadatas()
+    except FileNotFoundError:
+        return texts
+    ids = np.asarray(metadatas.vector_ids if hasattr(metadatas, "vector_ids") else sorted(metadatas))
+    rng = np.random.default_rng(seed)
+    for i in rng.choice(ids, size=min(n_chunks, len(ids)), replace=False):
+        texts.append(metadatas[int(i)]["chunk"])
+    return texts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, default=ONNX_MODEL_DIR)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--chunks", type=int, default=500, help="chunks indexés utilisés pour la vérification")
+    parser.add_argument("--min-cosine", type=float, default=MIN_COSINE)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    args.out.mkdir(parents=True, exist_ok=True)
+    export(model, args.out, args.opset)
+    quantize(args.out)
+    for backend, name in ONNX_FILES.items():
+        size_mb = (args.out / name).stat().st_size / 1024 / 1024
+        print(f"{backend:<10} {args.out / name} ({size_mb:.1f} Mo)")
+
+    texts = sample_texts(args.chunks)
+    reference = model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    failed = False
+    print(f"\nSimilarité cosinus avec PyTorch sur {len(texts)} textes (seuil {args.min_cosine}) :")
+    for backend in ONNX_FILES:
+        embedder = OnnxEmbedder.load(args.out, quantized=backend == "onnx-int8")
+        cosines = cosine_similarities(reference, embedder.encode(texts, normalize_embeddings=True))
+        ok = cosines.min() >= args.min_cosine
+        failed |= not ok
+        print(f"{backend:<10} min {cosines.min():.4f}  moyenne {cosines.mean():.4f}  {'OK' if ok else 'ÉCHEC'}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,64 @@
+"""
+Tokens des prompts envoyés à Mistral sur le jeu d'évaluation
+(tests/rag_ground_truth.json), avant / après le regroupement des chunks par
+événement et le budget de tokens. « Avant » reproduit l'ancienne sélection :
+les top_k chunks de la recherche, doublons d'événement compris, sans limite.
+
+    python scripts/prompt_tokens_report.py
+    python scripts/prompt_tokens_report.py --top-k 8 --max-tokens 2000
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR / "src"))
+
+import chatbot
+from date_index import parse_time_window
+
+GROUND_TRUTH_FILE = BASE_DIR / "tests" / "rag_ground_truth.json"
+
+
+def before(question, top_k):
+    """Ancienne sélection : top_k chunks bruts, réordonnés selon la période, prompt sans budget."""
+    snapshot = chatbot.retriever.current
+    window = parse_time_window(question)
+    k = top_k * chatbot.TEMPORAL_OVERFETCH if window is not None and snapshot.date_index is not None else top_k
+    _, I = chatbot.search(snapshot, [chatbot.encode_question(question)], k, questions=[question])
+    chunks = chatbot.temporal_rerank([snapshot.metadatas[i] for i in I[0] if i != -1], window,
+                                     snapshot.date_index, top_k)
+    return chunks, chatbot.build_prompt(question, chunks, max_tokens=None)[0]
+
+
+def after(question, top_k, max_tokens):
+    chunks = chatbot.retrieve(question, top_k)
+    return chunks, chatbot.build_prompt(question, chunks, max_tokens=max_tokens)[0]
+
+
+def distinct_events(chunks):
+    return len({c.get("event_id", id(c)) for c in chunks})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=chatbot.TOP_K)
+    parser.add_argument("--max-tokens", type=int, default=chatbot.PROMPT_MAX_TOKENS)
+    args = parser.parse_args()
+
+    questions = [q["question"] for q in json.loads(GROUND_TRUTH_FILE.read_text(encoding="utf-8"))]
+    rows = []
+    for question in questions:
+        old_chunks, old_prompt = before(question, args.top_k)
+        new_chunks, new_prompt = after(question, args.top_k, args.max_tokens)
+        rows.append((chatbot.estimate_tokens(old_prompt), distinct_events(old_chunks), len(old_chunks),
+                     chatbot.estimate_tokens(new_prompt), distinct_events(new_chunks), len(new_chunks)))
+
+    print(f"{'':<4} {'tokens avant':>12} {'événements/chunks':>18} {'tokens après':>13} {'événements/chunks':>18}")
+    for i, (t0, e0, c0, t1, e1, c1) in enumerate(rows, 1):
+        print(f"Q{i:<3} {t0:>12} {f'{e0}/{c0}':>18} {t1:>13} {f'{e1}/{c1}':>18}")
+    mean_before = sum(r[0] for r in rows) / len(rows)
+    mean_after = sum(r[3] for r in rows) / len(rows)
+    print(f"\nTokens moyens par prompt : {mean_before:.0f} -> {mean_after:.0f} "
+          f"({(mean_after - mean_before) / mean_before:+.0%}), budget {args.max_tokens}")
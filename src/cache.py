@@ -0,0 +1,188 @@
+# %% --------------------------- IMPORTS ---------------------------
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+# %% --------------------------- CACHE SÉMANTIQUE DES RÉPONSES ---------------------------
+class SemanticCache:
+    """
+    Cache LRU des réponses du chatbot, interrogé avec l'embedding normalisé
+    de la question : une entrée est réutilisée si la similarité cosinus avec
+    une question déjà traitée dépasse `threshold`.
+
+    Chaque entrée appartient à une portée (ex. la date du jour + top_k) : le
+    prompt contient la date du jour, une réponse d'hier n'est donc jamais
+    servie aujourd'hui. La taille est bornée en nombre d'entrées et en octets.
+
+    Les vecteurs sont rangés dans une matrice préallouée (une ligne par
+    emplacement) : une recherche est un seul produit matrice-vecteur, sans
+    recopie des entrées. Les entrées périmées (autre portée, TTL dépassé) sont
+    ignorées à la lecture et purgées à l'insertion.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=1000, max_bytes=64 * 1024 * 1024, ttl=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl  # durée de vie en secondes en plus de la portée (None = jusqu'au changement de portée)
+        self._entries = OrderedDict()  # clé -> dict(slot, value, size, created)
+        self._matrix = None  # (max_entries, dim) float32, alloué au premier put
+        self._occupied = np.zeros(max_entries, dtype=bool)
+        self._created = np.zeros(max_entries, dtype="float64")
+        self._slot_keys = np.full(max_entries, -1, dtype="int64")  # emplacement -> clé
+        self._free = list(range(max_entries - 1, -1, -1))  # emplacements libres (les plus bas d'abord)
+        self._scope = None  # portée commune à toutes les entrées (purgées quand elle change)
+        self._next_key = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(vector, value):
+        return vector.nbytes + sys.getsizeof(repr(value))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+        self._occupied[entry["slot"]] = False
+        self._free.append(entry["slot"])
+
+    def _reset(self):
+        self._entries.clear()
+        self._bytes = 0
+        self._occupied[:] = False
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._scope = None
+
+    def get(self, vector, scope):
+        """Renvoie la valeur de l'entrée la plus proche au-dessus du seuil, sinon None."""
+        vector = np.asarray(vector, dtype="float32").ravel()
+        with self._lock:
+            if self._entries and scope == self._scope and len(vector) == self._matrix.shape[1]:
+                live = self._occupied
+                if self.ttl is not None:
+                    live = live & (time.monotonic() - self._created <= self.ttl)
+                scores = np.where(live, self._matrix @ vector, -np.inf)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = int(self._slot_keys[best])
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]["value"]
+            self.misses += 1
+            return None
+
+    def put(self, vector, scope, value):
+        vector = np.asarray(vector, dtype="float32").ravel()
+        size = self._sizeof(vector, value)
+        now = time.monotonic()
+        with self._lock:
+            if self.max_entries <= 0:
+                return
+            # Purge à l'insertion : entrées d'une autre portée (ex. de la veille) ou trop anciennes
+            if scope != self._scope or self._matrix is None or self._matrix.shape[1] != len(vector):
+                self._reset()
+                self._scope = scope
+                if self._matrix is None or self._matrix.shape[1] != len(vector):
+                    self._matrix = np.zeros((self.max_entries, len(vector)), dtype="float32")
+            elif self.ttl is not None:
+                for key in [k for k, e in self._entries.items() if now - e["created"] > self.ttl]:
+                    self._remove(key)
+
+            # Éviction LRU : les entrées les moins récemment utilisées sont en tête
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            slot = self._free.pop()
+            self._matrix[slot] = vector
+            self._occupied[slot] = True
+            self._created[slot] = now
+            self._slot_keys[slot] = self._next_key
+            self._entries[self._next_key] = {"slot": slot, "value": value, "size": size, "created": now}
+            self._next_key += 1
+            self._bytes += size
+            while self._entries and self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+
+# %% --------------------------- CACHE DES EMBEDDINGS DE QUESTIONS ---------------------------
+def normalize_question(text):
+    """Clé du cache d'embeddings : minuscules, espaces superflus supprimés."""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Cache LRU exact : question normalisée -> vecteur float32 (lecture seule).
+    Évite de ré-encoder les questions répétées à l'identique.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text):
+        key = normalize_question(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, text, vector):
+        vector = np.array(vector, dtype="float32")
+        vector.flags.writeable = False  # partagé entre requêtes : ne doit pas être modifié
+        key = normalize_question(text)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
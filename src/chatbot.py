@@ -1,13 +1,15 @@
 # %% src/chatbot.py
 import os, sys
-import pickle
-import faiss
+import math
 import numpy as np
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 from datetime import datetime
-import re
-import requests
+import time
+import asyncio
+import atexit
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Charge les variables d'environnement depuis le fichier .env
@@ -15,132 +17,631 @@ load_dotenv()
 
 # --------------------------- CONFIG ---------------------------
 BASE_DIR = os.path.dirname(__file__)
+sys.path.append(BASE_DIR)
+
+from llm import MistralLLM
+from cache import SemanticCache, EmbeddingCache
+from metadata_store import load_metadatas
+from retriever import Retriever
+from date_index import DateIndex, parse_time_window
+from search_filters import FilterIndex, filtered_search
+from sparse_index import SparseIndex, reciprocal_rank_fusion
+from embeddings import load_embedding_model
 
 INDEX_FILE = Path(__file__).resolve().parent.parent / "db" / "faiss_evenements.index"
-METADATAS_FILE = Path(__file__).resolve().parent.parent / "db" / "metadatas.pkl"
+MANIFEST_FILE = INDEX_FILE.parent / "manifest.json"  # écrit en dernier par chaque build
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 TOP_K = 5  # nombre de chunks à récupérer
-
-# --------------------------- WRAPPER MISTRAL ---------------------------
-class MistralLLM:
-    def __init__(self, api_key, model_name="mistral-small-latest"):
-        self.api_key = api_key
-        self.model_name = model_name
-        self.api_url = "https://api.mistral.ai/v1/chat/completions"
-
-    def __call__(self, prompt, temperature=0.7, max_tokens=512):
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": self.model_name,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": temperature,
-            "max_tokens": max_tokens
-        }
-        response = requests.post(self.api_url, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+# Question qui évoque une période (« ce week-end », « en décembre ») : candidats récupérés
+# en plus, puis ceux qui ont lieu pendant la période sont remontés en tête
+TEMPORAL_OVERFETCH = int(os.getenv("TEMPORAL_OVERFETCH", "4"))
+# Recherche hybride : classements FAISS et BM25 (db/sparse_index.npz) fusionnés par rangs réciproques.
+# Désactivée par défaut tant qu'elle n'a pas été évaluée sur la vérité terrain (tests/model_evaluation.py)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "0") == "1"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))  # candidats de chaque classement avant fusion
+# Chunks demandés par place du top-k : les chunks d'un même événement n'en occupent qu'une
+EVENT_OVERFETCH = int(os.getenv("EVENT_OVERFETCH", "3"))
+# Diversification MMR des événements retenus : 1 = pertinence seule (désactivée), 0 = diversité seule
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "1"))
+# Budget du prompt envoyé à Mistral, en tokens estimés (≈ 3,5 caractères par token en français)
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "3000"))
+PROMPT_CHARS_PER_TOKEN = 3.5
+PROMPT_MIN_DESCRIPTION_TOKENS = 50  # en dessous, une description tronquée n'est pas ajoutée
+ASK_WORKERS = int(os.getenv("ASK_WORKERS", "4"))  # threads dédiés à l'encodage + recherche FAISS
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # appels Mistral simultanés max
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))  # connexions keep-alive vers Mistral
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))  # nouvelles tentatives sur 429/5xx
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # similarité cosinus min
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", "64"))
+# Index ouvert en mémoire mappée (lecture seule) : les workers uvicorn partagent le cache de pages
+FAISS_MMAP = os.getenv("FAISS_MMAP", "0") == "1"
+# Secondes entre deux vérifications du manifeste : un nouveau build est rechargé par chaque
+# worker, pas seulement par celui qui reçoit /rebuild (0 : pas de vérification)
+INDEX_CHECK_INTERVAL = float(os.getenv("INDEX_CHECK_INTERVAL", "2"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))  # listes visitées par requête (index IVF)
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))  # taille de la file de recherche (index HNSW)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))  # appels Mistral simultanés par lot
+# Questions encodées au démarrage de l'API (séparées par "|") pour chauffer le modèle
+WARMUP_QUERIES = [q for q in os.getenv("WARMUP_QUERIES", "").split("|") if q.strip()] or [
+    "Quels événements ce week-end à Lyon ?",
+    "Quels concerts ce soir ?",
+    "Que faire avec des enfants aujourd'hui ?",
+    "Quelles expositions en ce moment ?",
+]
 
 # --------------------------- CHARGEMENT DE L'INDEX ET MÉTADONNÉES ---------------------------
-print("Chargement de l'index Faiss et des métadonnées...")
-index = faiss.read_index(str(INDEX_FILE))
-with open(METADATAS_FILE, "rb") as f:
-    metadatas = pickle.load(f)
+# faiss et sentence_transformers ne sont importés qu'au premier chargement :
+# importer ce module (outils, tests) ne coûte pas le démarrage de torch / FAISS.
+def faiss_io_flags(mmap=FAISS_MMAP):
+    # IO_FLAG_MMAP seul recopie quand même les vecteurs d'un IDMap2,Flat en mémoire privée :
+    # IO_FLAG_MMAP_IFC les lit directement dans les pages mappées du fichier
+    import faiss
+    return (faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY) if mmap else 0
+
+def load_index(path=INDEX_FILE):
+    import faiss
+    print("Chargement de l'index Faiss et des métadonnées...")
+    return faiss.read_index(str(path), faiss_io_flags())
+
+def make_search_params(index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH, sel=None):
+    """
+    Paramètres de recherche adaptés au type d'index (None pour l'index exact),
+    avec éventuellement un IDSelector qui restreint les vecteurs candidats.
+    """
+    import faiss
+    if faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(nprobe=nprobe, sel=sel)
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if hasattr(inner, "hnsw"):
+        return faiss.SearchParametersHNSW(efSearch=ef_search, sel=sel)
+    return faiss.SearchParameters(sel=sel) if sel is not None else None
 
 # --------------------------- CHARGEMENT DU MODEL D'EMBEDDING ---------------------------
-model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Modèle d'embedding (backend EMBEDDING_BACKEND : torch, onnx ou onnx-int8), chargé au premier appel."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_embedding_model(model_name=EMBEDDING_MODEL_NAME)
+    return _model
+
+# Index + métadonnées (store colonnaire mappé en mémoire, ou ancien metadatas.pkl),
+# chargés au premier accès et remplaçables à chaud par reload_index()
+retriever = Retriever(
+    load_index, load_metadatas, make_search_params,
+    expected_dim=lambda: get_model().get_sentence_embedding_dimension(),
+    load_date_index=DateIndex.load,
+    make_filter_index=FilterIndex.from_metadatas,
+    load_sparse_index=SparseIndex.load,
+    watch_file=MANIFEST_FILE if INDEX_CHECK_INTERVAL > 0 else None,
+    check_interval=INDEX_CHECK_INTERVAL
+)
 
 # Remplace par ta clé API Mistral
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "YOUR_API_KEY")
 print("MISTRAL_API_KEY =", MISTRAL_API_KEY)
 
-llm = MistralLLM(api_key=MISTRAL_API_KEY)
+llm = MistralLLM(api_key=MISTRAL_API_KEY, pool_size=LLM_POOL_SIZE, max_retries=LLM_MAX_RETRIES)
 
-# --------------------------- FILTRAGE DES ÉVÉNEMENTS DU JOUR ---------------------------
-def filter_events_today(events):
-    today = datetime.now().date()
-    filtered = []
-    for e in events:
-        dates_text = e.get("dates_text", "")
-        matches = re.findall(r"\d{2}/\d{2}/\d{4}", dates_text)
-        for m in matches:
-            try:
-                d = datetime.strptime(m, "%d/%m/%Y").date()
-                if d == today:
-                    filtered.append(e)
-                    break
-            except:
-                continue
+# Pool borné pour le travail CPU bloquant (encodage, FAISS) et limite des appels LLM concurrents
+retrieval_executor = ThreadPoolExecutor(max_workers=ASK_WORKERS, thread_name_prefix="retrieval")
+_llm_semaphores = weakref.WeakKeyDictionary()  # boucle d'événements -> asyncio.Semaphore
+_llm_semaphores_lock = threading.Lock()
+
+def llm_semaphore():
+    """
+    Limite des appels Mistral simultanés pour la boucle d'événements courante :
+    un asyncio.Semaphore est lié à sa boucle, et la boucle de l'API n'est pas
+    celle de chatbot_ask_batch. Chaque boucle a donc le sien.
+    """
+    loop = asyncio.get_running_loop()
+    with _llm_semaphores_lock:
+        semaphore = _llm_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = _llm_semaphores[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return semaphore
+
+# Cache des réponses pour les questions quasi identiques (vidé au rechargement de l'index)
+answer_cache = SemanticCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    max_bytes=int(ANSWER_CACHE_MAX_MB * 1024 * 1024)
+)
+# Cache exact des embeddings de questions (question normalisée -> vecteur)
+embedding_cache = EmbeddingCache(max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+
+def reload_index():
+    """
+    Recharge l'index et les métadonnées depuis le disque puis les publie
+    atomiquement (voir Retriever.reload). Renvoie le nouveau snapshot.
+    """
+    snapshot = retriever.reload()
+    answer_cache.clear()  # les réponses en cache reposent sur l'ancien index
+    return snapshot
+
+def preload():
+    """
+    Charge le modèle d'embedding, l'index et les métadonnées sans attendre la
+    première question (appelé au démarrage de l'API). Renvoie la durée en secondes.
+    """
+    start = time.perf_counter()
+    get_model()
+    retriever.current
+    return time.perf_counter() - start
+
+# --------------------------- FILTRAGE TEMPOREL ---------------------------
+# Les intervalles de dates sont analysés au build (db/date_index.npz) : aucune
+# analyse de dates_text au moment de la requête.
+def temporal_rerank(chunks, window, date_index, top_k=None):
+    """
+    Remonte en tête, dans l'ordre de la recherche vectorielle, les chunks dont
+    l'événement a lieu pendant `window` (premier jour, dernier jour), puis les
+    autres. Sans période ou sans index de dates, l'ordre est inchangé.
+    """
+    if window is not None and date_index is not None:
+        active = date_index.overlapping(*window)
+        chunks = sorted(chunks, key=lambda m: m.get("event_id") not in active)
+    return chunks if top_k is None else chunks[:top_k]
+
+
+def filter_events_today(events, date_index=None):
+    """Événements qui ont lieu aujourd'hui (tous les événements si aucun)."""
+    date_index = retriever.current.date_index if date_index is None else date_index
+    if date_index is None:
+        return events
+    active = date_index.active_on(datetime.now().date())
+    filtered = [e for e in events if e.get("event_id") in active]
     return filtered if filtered else events
 
+# --------------------------- SÉLECTION DES CHUNKS ---------------------------
+def collapse_events(ids, metadatas):
+    """
+    Un seul chunk par événement (le mieux classé) : les chunks d'un événement
+    long portent tous le même vectorise_text, qui n'a pas à être envoyé
+    plusieurs fois à Mistral. Renvoie (ids, métadonnées) dans l'ordre de `ids`.
+    """
+    seen, kept_ids, kept = set(), [], []
+    for i in ids:
+        if i == -1:  # moins de résultats que demandé
+            continue
+        meta = metadatas[int(i)]
+        event_id = meta.get("event_id")
+        if event_id is not None:
+            if event_id in seen:
+                continue
+            seen.add(event_id)
+        kept_ids.append(int(i))
+        kept.append(meta)
+    return kept_ids, kept
+
+
+def mmr_order(q_vec, vectors, lambda_=MMR_LAMBDA):
+    """
+    Ordre Maximal Marginal Relevance des candidats (vecteurs normalisés) : à
+    chaque pas, celui qui maximise λ·sim(question) − (1 − λ)·max sim(déjà choisis).
+    """
+    vectors = np.asarray(vectors, dtype="float32")
+    relevance = vectors @ np.asarray(q_vec, dtype="float32")
+    redundancy = np.zeros(len(vectors), dtype="float32")
+    remaining = np.ones(len(vectors), dtype=bool)
+    order = []
+    for _ in range(len(vectors)):
+        scores = np.where(remaining, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        pick = int(np.argmax(scores))
+        order.append(pick)
+        remaining[pick] = False
+        redundancy = np.maximum(redundancy, vectors @ vectors[pick])
+    return order
+
+
+def diversify(index, q_vec, ids, chunks, lambda_=MMR_LAMBDA):
+    """Réordonne les chunks par MMR (vecteurs relus dans l'index) ; inchangés si désactivé ou impossible."""
+    if lambda_ >= 1 or q_vec is None or len(ids) < 2:
+        return chunks
+    try:
+        vectors = [index.reconstruct(i) for i in ids]
+    except RuntimeError:  # index sans reconstruction par id (IVF sans table directe)
+        return chunks
+    return [chunks[j] for j in mmr_order(q_vec, vectors, lambda_)]
+
+
+def select_chunks(snapshot, ids, q_vec, window, top_k):
+    """Résultats d'une recherche -> top_k chunks : un par événement, MMR en option, période en tête."""
+    ids, chunks = collapse_events(ids, snapshot.metadatas)
+    chunks = diversify(snapshot.index, q_vec, ids, chunks)
+    return temporal_rerank(chunks, window, snapshot.date_index, top_k)
+
 # --------------------------- FONCTION CHATBOT ---------------------------
 last_event = None  # variable globale pour références vagues
 
-def chatbot_ask(question, top_k=TOP_K):
-    global last_event
+def is_vague_reference(question):
+    """Détecte les questions qui portent sur le dernier événement évoqué."""
+    vague_refs = ["cet événement", "cet atelier", "cette activité", "plus de détails"]
+    return any(ref in question.lower() for ref in vague_refs) and last_event is not None
 
-    # 1. Obtenir la date d'aujourd'hui
-    today_date = datetime.now()
-    today_str = today_date.strftime("%d %B %Y")  # ex: 05 Décembre 2025
-    current_month_name = today_date.strftime("%B")
-    current_year = today_date.strftime("%Y")
 
-    # Détection des références vagues
-    vague_refs = ["cet événement", "cet atelier", "cette activité", "plus de détails"]
+def encode_question(question):
+    q_vec = embedding_cache.get(question)
+    if q_vec is None:
+        q_vec = embedding_cache.put(question, get_model().encode(question, normalize_embeddings=True))
+    return q_vec
+
+
+def encode_questions(questions):
+    """
+    Embeddings de plusieurs questions : celles absentes du cache sont encodées
+    en un seul appel batché au modèle. Renvoie une matrice (n, dim) float32.
+    """
+    vectors = [embedding_cache.get(q) for q in questions]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        encoded = get_model().encode([questions[i] for i in missing], normalize_embeddings=True,
+                                     convert_to_numpy=True)
+        for i, vector in zip(missing, np.asarray(encoded, dtype="float32")):
+            vectors[i] = embedding_cache.put(questions[i], vector)
+    return np.asarray(vectors, dtype="float32")
+
+
+def warmup(queries=None):
+    """
+    Encode des questions types (un seul appel batché) et fait une recherche FAISS,
+    pour que la première vraie requête ne paie pas le démarrage à froid du modèle.
+    Les embeddings obtenus alimentent le cache. Renvoie la durée en secondes.
+    """
+    queries = WARMUP_QUERIES if queries is None else queries
+    start = time.perf_counter()
+    if queries:
+        vectors = get_model().encode(queries, normalize_embeddings=True, convert_to_numpy=True)
+        vectors = np.asarray(vectors, dtype="float32")
+        for query, vector in zip(queries, vectors):
+            embedding_cache.put(query, vector)
+        snapshot = retriever.current  # charge l'index s'il ne l'est pas encore
+        snapshot.index.search(vectors[:1], TOP_K, params=snapshot.search_params)
+    return time.perf_counter() - start
+
+
+def search(snapshot, q_vecs, k, filters=None, questions=None):
+    """
+    index.search sur le snapshot, restreint aux événements qui respectent
+    `filters` (SearchFilters) s'il y en a : IDSelector FAISS, avec repli sur
+    une recherche élargie puis filtrée (voir filtered_search).
+
+    Avec le texte des questions et un index BM25, la recherche est hybride :
+    les HYBRID_CANDIDATES meilleurs chunks de FAISS et de BM25 (mêmes filtres)
+    sont fusionnés par rangs réciproques. D contient alors les scores RRF.
+    """
+    q_vecs = np.asarray(q_vecs, dtype="float32")
+    allowed = selector = None
+    if filters is not None and not filters.is_empty() and snapshot.filter_index is not None:
+        allowed, selector = snapshot.filter_index.selection(filters)
+    hybrid = HYBRID_SEARCH and questions is not None and snapshot.sparse_index is not None
+    n = max(k, HYBRID_CANDIDATES) if hybrid else k
+
+    if allowed is None:
+        D, I = snapshot.index.search(q_vecs, n, params=snapshot.search_params)
+    else:
+        D, I = filtered_search(snapshot.index, q_vecs, n, allowed,
+                               lambda sel: make_search_params(snapshot.index, sel=sel), selector=selector)
+    if not hybrid:
+        return D, I
+
+    fused = [
+        reciprocal_rank_fusion([dense, snapshot.sparse_index.search(question, n, allowed)[1]], k)
+        for question, dense in zip(questions, I)
+    ]
+    return np.array([d for d, _ in fused]), np.array([i for _, i in fused])
+
 
-    # 2. Recherche vectorielle
-    if any(ref in question.lower() for ref in vague_refs) and last_event:
+def retrieve(question, top_k=TOP_K, q_vec=None, filters=None):
+    """
+    Recherche vectorielle : renvoie les métadonnées des chunks les plus proches
+    (parmi les événements qui respectent `filters`, s'il y en a).
+    """
+    global last_event
+
+    if is_vague_reference(question):
         retrieved_chunks = [last_event]
     else:
-        q_vec = model.encode(question, normalize_embeddings=True).astype('float32')
-        D, I = index.search(np.array([q_vec]), top_k)
-        retrieved_chunks = [metadatas[i] for i in I[0]]
+        if q_vec is None:
+            q_vec = encode_question(question)
+        # Un seul snapshot par requête : un rechargement concurrent ne mélange pas index et métadonnées
+        snapshot = retriever.current
+        window = parse_time_window(question)
+        k = search_k(top_k, window, snapshot)
+        D, I = search(snapshot, [q_vec], k, filters, questions=[question])
+        retrieved_chunks = select_chunks(snapshot, I[0], q_vec, window, top_k)
 
     # Mise à jour du dernier événement
     if retrieved_chunks:
         last_event = retrieved_chunks[0]
+    return retrieved_chunks
+
+
+def search_k(top_k, window, snapshot):
+    """
+    Nombre de candidats à demander à FAISS : plusieurs chunks par place (regroupés
+    ensuite par événement), et plus encore si la question évoque une période.
+    """
+    k = top_k * EVENT_OVERFETCH
+    return k * TEMPORAL_OVERFETCH if window is not None and snapshot.date_index is not None else k
+
+
+def retrieve_batch(q_vecs, top_k=TOP_K, questions=None, filters=None):
+    """
+    Une seule recherche FAISS pour toute la matrice de questions ; renvoie une
+    liste de chunks par question (un par événement, réordonnés selon la période
+    de chaque question).
+    """
+    if len(q_vecs) == 0:
+        return []
+    snapshot = retriever.current
+    windows = [parse_time_window(q) for q in questions] if questions else [None] * len(q_vecs)
+    k = max(search_k(top_k, window, snapshot) for window in windows)
+    D, I = search(snapshot, q_vecs, k, filters, questions)
+    return [
+        select_chunks(snapshot, row, q_vec, window, top_k)
+        for row, q_vec, window in zip(I, q_vecs, windows)
+    ]
+
+
+def cache_scope(top_k, filters=None):
+    """Portée du cache de réponses : le prompt dépend de la date du jour, de top_k, des filtres et de l'index."""
+    filters_key = filters.key() if filters is not None and not filters.is_empty() else None
+    return (datetime.now().date().isoformat(), top_k, filters_key, retriever.current.version)
+
+
+def cached_answer(q_vec, top_k, filters=None):
+    """Réponse déjà calculée pour une question quasi identique, ou None."""
+    global last_event
+    if q_vec is None:  # référence vague : la réponse dépend du dernier événement
+        return None
+    cached = answer_cache.get(q_vec, cache_scope(top_k, filters))
+    if cached is None:
+        return None
+    response, context_texts, first_chunk = cached
+    if first_chunk is not None:
+        last_event = first_chunk
+    return response, context_texts
+
+
+def store_answer(q_vec, top_k, response, context_texts, retrieved_chunks, filters=None):
+    if q_vec is not None:
+        first_chunk = retrieved_chunks[0] if retrieved_chunks else None
+        answer_cache.put(q_vec, cache_scope(top_k, filters), (response, context_texts, first_chunk))
+
+
+def prepare_question(question, top_k=TOP_K, filters=None):
+    """
+    Encode la question (sauf référence vague) et consulte le cache de réponses.
+    Renvoie (vecteur de la question ou None, réponse en cache ou None).
+    """
+    q_vec = None if is_vague_reference(question) else encode_question(question)
+    return q_vec, cached_answer(q_vec, top_k, filters)
+
+
+def estimate_tokens(text):
+    """Nombre de tokens estimé d'un texte (le tokenizer de Mistral n'est pas embarqué)."""
+    return math.ceil(len(text) / PROMPT_CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Coupe un texte au dernier mot entier qui tient dans max_tokens (estimés)."""
+    limit = int(max_tokens * PROMPT_CHARS_PER_TOKEN)
+    if len(text) <= limit:
+        return text
+    return text[:max(limit - 1, 0)].rsplit(" ", 1)[0] + "…"
+
+
+def build_prompt(question, retrieved_chunks, max_tokens=PROMPT_MAX_TOKENS):
+    """
+    Construit le prompt envoyé à Mistral et la liste des textes de contexte.
+    Les événements sont ajoutés dans l'ordre tant que le prompt tient dans
+    max_tokens (None : pas de limite) ; la description du premier qui dépasse
+    est tronquée, les suivants sont écartés (et absents des sources).
+    """
+    # Obtenir la date d'aujourd'hui
+    today_date = datetime.now()
+    today_str = today_date.strftime("%d %B %Y")  # ex: 05 Décembre 2025
+    current_month_name = today_date.strftime("%B")
+    current_year = today_date.strftime("%Y")
 
-    # 3. Construire le prompt
     prompt = "Tu es un assistant sympathique et humain spécialisé dans les événements de Lyon.\n"
     prompt += f"La date d'aujourd'hui est le **{today_str}**.\n"
     prompt += f"Le mois actuel est **{current_month_name} {current_year}**.\n"
     prompt += "Ta mission est de répondre à la question de l'utilisateur en français en utilisant UNIQUEMENT les informations ci-dessous.\n"
     prompt += "Voici les événements pertinents récupérés par la recherche vectorielle :\n"
 
-    context_texts = []
+    question_text = f"\nQuestion de l'utilisateur : {question}\nRéponse :"
+    budget = None if max_tokens is None else max_tokens - estimate_tokens(prompt + question_text)
+
+    context_texts, included = [], []
     for m in retrieved_chunks:
         title = m.get("title", "Titre inconnu")
         dates = m.get("dates_text", "dates inconnues")
         geo = m.get("geo_text", "lieu inconnu")
         vector_text = m.get("vectorise_text", "")
-        prompt += f"- **{title}** ({dates}, {geo}). Description : {vector_text}\n"
+        line = f"- **{title}** ({dates}, {geo}). Description : {vector_text}\n"
+        if budget is not None and estimate_tokens(line) > budget:
+            room = budget - estimate_tokens(line) + estimate_tokens(vector_text)
+            if room < PROMPT_MIN_DESCRIPTION_TOKENS and included:
+                break
+            line = f"- **{title}** ({dates}, {geo}). Description : {truncate_to_tokens(vector_text, max(room, 0))}\n"
+            budget = 0
+        elif budget is not None:
+            budget -= estimate_tokens(line)
+        prompt += line
+        included.append(m)
 
         # On construit context_texts avec plusieurs champs pour plus de chance de récupérer du texte
         full_text = m.get("full_vectorise_text") or m.get("vectorise_text") or m.get("context_chunk") or ""
         if full_text.strip():
             context_texts.append(full_text.strip())
+        if budget == 0:
+            break
 
     # Si aucun contexte trouvé, ajouter au moins le titre + dates pour ne pas renvoyer vide
     if not context_texts:
-        for m in retrieved_chunks:
+        for m in included:
             context_texts.append(f"{m.get('title', 'Titre inconnu')} ({m.get('dates_text', 'dates inconnues')})")
 
-    prompt += f"\nQuestion de l'utilisateur : {question}\nRéponse :"
+    prompt += question_text
+    return prompt, context_texts
 
-    # 4. Appel à Mistral
-    response = llm(prompt)
 
-    # 5. Affichage des sources utilisées
+def print_sources(context_texts):
     print("\n--- Sources utilisées ---")
     for text in context_texts:
         print(f"- {text[:150]}{'...' if len(text) > 150 else ''}")
 
+
+def chatbot_ask(question, top_k=TOP_K, filters=None):
+    # 1. Encodage de la question et cache des réponses
+    q_vec, cached = prepare_question(question, top_k, filters)
+    if cached is not None:
+        print_sources(cached[1])
+        return cached
+
+    # 2. Recherche vectorielle (réutilise l'embedding de la question)
+    retrieved_chunks = retrieve(question, top_k, q_vec, filters)
+
+    # 3. Construire le prompt
+    prompt, context_texts = build_prompt(question, retrieved_chunks)
+
+    # 4. Appel à Mistral
+    response = llm(prompt)
+    store_answer(q_vec, top_k, response, context_texts, retrieved_chunks, filters)
+
+    # 5. Affichage des sources utilisées
+    print_sources(context_texts)
+
+    return response, context_texts
+
+
+async def chatbot_ask_async(question, top_k=TOP_K, filters=None):
+    """
+    Variante de chatbot_ask pour l'API : l'encodage et la recherche FAISS tournent
+    dans le pool retrieval_executor, l'appel Mistral passe par un client HTTP
+    asynchrone limité par llm_semaphore. La boucle d'événements n'est jamais bloquée.
+    """
+    loop = asyncio.get_running_loop()
+    q_vec, cached = await loop.run_in_executor(retrieval_executor, prepare_question, question, top_k, filters)
+    if cached is not None:
+        return cached
+
+    retrieved_chunks = await loop.run_in_executor(retrieval_executor, retrieve, question, top_k, q_vec, filters)
+
+    prompt, context_texts = build_prompt(question, retrieved_chunks)
+
+    async with llm_semaphore():
+        response = await llm.acall(prompt)
+    store_answer(q_vec, top_k, response, context_texts, retrieved_chunks, filters)
+
+    print_sources(context_texts)
+
     return response, context_texts
 
 
+async def chatbot_ask_stream(question, top_k=TOP_K, filters=None):
+    """
+    Variante en streaming de chatbot_ask_async : produit d'abord ("sources", context_texts)
+    dès la fin de la recherche, puis ("token", texte) au fil de la génération Mistral.
+    """
+    loop = asyncio.get_running_loop()
+    q_vec, cached = await loop.run_in_executor(retrieval_executor, prepare_question, question, top_k, filters)
+    if cached is not None:
+        response, context_texts = cached
+        yield "sources", context_texts
+        yield "token", response
+        return
+
+    retrieved_chunks = await loop.run_in_executor(retrieval_executor, retrieve, question, top_k, q_vec, filters)
+
+    prompt, context_texts = build_prompt(question, retrieved_chunks)
+    yield "sources", context_texts
+
+    tokens = []
+    async with llm_semaphore():
+        async for token in llm.astream(prompt):
+            tokens.append(token)
+            yield "token", token
+    store_answer(q_vec, top_k, "".join(tokens), context_texts, retrieved_chunks, filters)
+
+
+def prepare_batch(questions, top_k=TOP_K, filters=None):
+    """
+    Encode toutes les questions en un appel, consulte le cache de réponses puis
+    cherche les questions restantes en une seule recherche FAISS.
+    Renvoie, pour chaque question, (vecteur, réponse en cache ou None, chunks).
+    Les questions d'un lot sont indépendantes : pas de référence au dernier événement.
+    """
+    q_vecs = encode_questions(questions)
+    cached = [answer_cache.get(v, cache_scope(top_k, filters)) for v in q_vecs]
+    todo = [i for i, c in enumerate(cached) if c is None]
+    retrieved = dict(zip(todo, retrieve_batch(q_vecs[todo], top_k, [questions[i] for i in todo], filters)))
+    return [(q_vecs[i], cached[i], retrieved.get(i, [])) for i in range(len(questions))]
+
+
+async def chatbot_ask_batch_async(questions, top_k=TOP_K, max_concurrency=BATCH_LLM_CONCURRENCY, filters=None):
+    """
+    Répond à plusieurs questions : encodage et recherche FAISS groupés (dans le
+    pool retrieval_executor), puis appels Mistral concurrents, au plus
+    `max_concurrency` pour ce lot (et toujours dans la limite de llm_semaphore).
+    Renvoie une liste dans l'ordre des questions : (réponse, contextes) ou
+    l'exception levée pour cette question.
+    """
+    loop = asyncio.get_running_loop()
+    prepared = await loop.run_in_executor(retrieval_executor, prepare_batch, list(questions), top_k, filters)
+    batch_semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def answer(question, q_vec, cached, retrieved_chunks):
+        if cached is not None:
+            response, context_texts, _ = cached
+            return response, context_texts
+        prompt, context_texts = build_prompt(question, retrieved_chunks)
+        async with batch_semaphore, llm_semaphore():
+            response = await llm.acall(prompt)
+        store_answer(q_vec, top_k, response, context_texts, retrieved_chunks, filters)
+        return response, context_texts
+
+    return await asyncio.gather(
+        *(answer(question, *item) for question, item in zip(questions, prepared)),
+        return_exceptions=True
+    )
+
+
+# Boucle des appels synchrones par lot, conservée d'un appel à l'autre : le client HTTP
+# (connexions keep-alive) et le sémaphore du LLM ne sont pas recréés à chaque lot
+_batch_runner = None
+_batch_runner_lock = threading.Lock()
+
+def close_batch_runner():
+    """Ferme le client HTTP de la boucle des lots puis la boucle elle-même (appelé à la sortie)."""
+    global _batch_runner
+    with _batch_runner_lock:
+        runner, _batch_runner = _batch_runner, None
+        if runner is not None:
+            try:
+                runner.run(llm.aclose())
+            finally:
+                runner.close()
+
+atexit.register(close_batch_runner)  # une seule fois : sans effet si aucun lot n'a été lancé
+
+def chatbot_ask_batch(questions, top_k=TOP_K, max_concurrency=BATCH_LLM_CONCURRENCY, filters=None):
+    """Version synchrone de chatbot_ask_batch_async (scripts d'évaluation), sur une boucle réutilisée."""
+    global _batch_runner
+    with _batch_runner_lock:
+        if _batch_runner is None:
+            _batch_runner = asyncio.Runner()
+        return _batch_runner.run(chatbot_ask_batch_async(questions, top_k, max_concurrency, filters))
+
+
 # --------------------------- INTERACTION ---------------------------
 if __name__ == "__main__":
     print("Chatbot prêt ! Posez vos questions sur les événements de Lyon.")
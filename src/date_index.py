@@ -0,0 +1,212 @@
+# %% --------------------------- IMPORTS ---------------------------
+import re
+import bisect
+import calendar
+import unicodedata
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# %% --------------------------- CONFIG ---------------------------
+DB_DIR = Path(__file__).resolve().parent.parent / "db"
+DATE_INDEX_FILE = DB_DIR / "date_index.npz"  # intervalles de dates des événements (jours)
+
+EPOCH = date(1970, 1, 1)
+MONTHS = ["janvier", "fevrier", "mars", "avril", "mai", "juin", "juillet",
+          "aout", "septembre", "octobre", "novembre", "decembre"]
+
+
+def to_day(d):
+    """Date -> nombre de jours depuis le 1er janvier 1970."""
+    return (d - EPOCH).days
+
+
+# %% --------------------------- EXTRACTION AU BUILD ---------------------------
+def parse_day_column(col):
+    """
+    Colonne de dates (Timestamp, "jj/mm/aaaa hh:mm:ss" produit par le
+    preprocessing, ou ISO 8601) -> jours depuis 1970 en float (NaN si absente).
+    """
+    if not pd.api.types.is_datetime64_any_dtype(col):
+        text = col.astype("string")
+        parsed = pd.to_datetime(text, format="%d/%m/%Y %H:%M:%S", errors="coerce", utc=True)
+        iso = parsed.isna() & text.notna()
+        if iso.any():
+            parsed[iso] = pd.to_datetime(text[iso], errors="coerce", utc=True, format="ISO8601")
+        col = parsed
+    elif col.dt.tz is None:
+        col = col.dt.tz_localize("UTC")
+    days = col.dt.tz_localize(None).values.astype("datetime64[D]").astype("float64")
+    days[col.isna().to_numpy()] = np.nan
+    return days
+
+
+def event_date_ranges(df):
+    """
+    {event_id: [premier jour, dernier jour]} à partir de firstdate_begin et
+    lastdate_end (ou lastdate_begin / firstdate_end à défaut). Les événements
+    sans date de début sont absents du résultat.
+    """
+    def days(*names):
+        out = np.full(len(df), np.nan)
+        for name in names:
+            if name in df.columns:
+                out = np.where(np.isnan(out), parse_day_column(df[name].reset_index(drop=True)), out)
+        return out
+
+    starts = days("firstdate_begin", "firstdate_end")
+    ends = days("lastdate_end", "lastdate_begin")
+    ends = np.where(np.isnan(ends) | (ends < starts), starts, ends)
+    return {
+        eid: [int(s), int(e)]
+        for eid, s, e in zip(df["event_id"].tolist(), starts, ends)
+        if not np.isnan(s)
+    }
+
+
+# %% --------------------------- INDEX D'INTERVALLES ---------------------------
+class DateIndex:
+    """
+    Intervalles [début, fin] (en jours) des événements, triés par début.
+
+    Un arbre de segments garde, pour chaque tranche du tableau trié, la plus
+    grande date de fin : une recherche « actif le jour D » ou « chevauche
+    [A, B] » coupe par dichotomie les événements qui commencent après B, puis
+    ne descend que dans les tranches dont une fin est >= A. Coût
+    O((m + 1) log n) pour m résultats, sans aucune analyse de texte.
+    """
+
+    def __init__(self, event_ids, starts, ends):
+        order = np.argsort(starts, kind="stable")
+        self.event_ids = np.asarray(event_ids, dtype=str)[order]
+        self.starts = np.asarray(starts, dtype="int32")[order]
+        self.ends = np.asarray(ends, dtype="int32")[order]
+        self._starts = self.starts.tolist()  # listes Python : accès scalaires rapides
+        self._size = 1
+        while self._size < len(self.starts):
+            self._size *= 2
+        tree = np.full(2 * self._size, np.iinfo("int32").min, dtype="int64")
+        tree[self._size:self._size + len(self.ends)] = self.ends
+        for node in range(self._size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        self._tree = tree.tolist()
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """ranges : {event_id: [début, fin]} (ex. champ "dates" du manifeste)."""
+        ids = list(ranges)
+        return cls(ids, [ranges[e][0] for e in ids], [ranges[e][1] for e in ids])
+
+    @classmethod
+    def from_manifest(cls, manifest):
+        return cls.from_ranges({
+            eid: entry["dates"] for eid, entry in manifest["events"].items() if entry.get("dates")
+        })
+
+    def save(self, path=DATE_INDEX_FILE):
+        with open(path, "wb") as f:
+            np.savez(f, event_ids=self.event_ids, starts=self.starts, ends=self.ends)
+
+    @classmethod
+    def load(cls, path=DATE_INDEX_FILE):
+        """Index sauvegardé au build, ou None s'il n'existe pas (ancien build)."""
+        if not Path(path).exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["event_ids"], data["starts"], data["ends"])
+
+    def _positions(self, first, last):
+        """Positions (tableau trié) des intervalles qui chevauchent [first, last]."""
+        k = bisect.bisect_right(self._starts, last)  # début <= last
+        found = []
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= k or self._tree[node] < first:
+                continue
+            if hi - lo == 1:
+                found.append(lo)
+                continue
+            mid = (lo + hi) // 2
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return found
+
+    def overlapping(self, first, last):
+        """event_ids des événements qui ont lieu au moins un jour de [first, last] (dates ou jours)."""
+        if isinstance(first, date):
+            first, last = to_day(first), to_day(last)
+        return {str(self.event_ids[i]) for i in self._positions(first, last)}
+
+    def active_on(self, day):
+        return self.overlapping(day, day)
+
+
+# %% --------------------------- PÉRIODE DEMANDÉE DANS LA QUESTION ---------------------------
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c)).replace("’", "'")
+
+
+_EXPLICIT_DATE = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+_DAY_MONTH = re.compile(r"\b(\d{1,2}|1er) (" + "|".join(MONTHS) + r")\b")
+_MONTH = re.compile(r"\b(" + "|".join(MONTHS) + r")\b")
+
+
+def _month_window(month, today):
+    year = today.year + (month < today.month)  # « en mars » posé en octobre : mars prochain
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def parse_time_window(question, today=None):
+    """
+    Période (premier jour, dernier jour) évoquée par une question en français,
+    ou None : aujourd'hui / ce soir, demain, ce week-end, cette semaine, la
+    semaine prochaine, ce mois-ci, « le 14 juillet », « en décembre », jj/mm/aaaa.
+    """
+    today = today or date.today()
+    q = _normalize(question)
+
+    m = _EXPLICIT_DATE.search(q)
+    if m:
+        try:
+            d = date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+            return d, d
+        except ValueError:
+            pass
+    if "aujourd'hui" in q or "ce soir" in q or "ce jour" in q or "en ce moment" in q:
+        return today, today
+    if "apres-demain" in q or "apres demain" in q:
+        return today + timedelta(days=2), today + timedelta(days=2)
+    if "demain" in q:
+        return today + timedelta(days=1), today + timedelta(days=1)
+    if re.search(r"week-?end|weekend", q):
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+        if today.weekday() == 6:  # dimanche : le week-end en cours
+            saturday = today - timedelta(days=1)
+        return max(saturday, today), saturday + timedelta(days=1)
+    if "semaine prochaine" in q:
+        monday = today + timedelta(days=7 - today.weekday())
+        return monday, monday + timedelta(days=6)
+    if "cette semaine" in q:
+        return today, today + timedelta(days=6 - today.weekday())
+    if "ce mois" in q:
+        return today, date(today.year, today.month, calendar.monthrange(today.year, today.month)[1])
+    m = _DAY_MONTH.search(q)
+    if m:
+        first, last = _month_window(MONTHS.index(m.group(2)) + 1, today)
+        day = 1 if m.group(1) == "1er" else int(m.group(1))
+        if day <= last.day:
+            d = first.replace(day=day)
+            if d < today and first.month == today.month:
+                d = d.replace(year=d.year + 1)
+            return d, d
+    m = _MONTH.search(q)
+    if m:
+        return _month_window(MONTHS.index(m.group(1)) + 1, today)
+    return None
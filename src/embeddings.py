@@ -0,0 +1,103 @@
+# %% --------------------------- IMPORTS ---------------------------
+import os
+import json
+from pathlib import Path
+
+import numpy as np
+
+# %% --------------------------- CONFIG ---------------------------
+BASE_DIR = Path(__file__).resolve().parent.parent
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# torch : SentenceTransformer (PyTorch) ; onnx / onnx-int8 : ONNX Runtime, modèle exporté
+# une fois par scripts/export_onnx.py (poids en float32 ou quantifiés en int8)
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = Path(os.getenv("ONNX_MODEL_DIR", str(BASE_DIR / "models" / EMBEDDING_MODEL_NAME)))
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+ONNX_CONFIG_FILE = "embedding_config.json"  # dimension, longueur max, pooling (écrit à l'export)
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 : choix d'ONNX Runtime (cœurs physiques)
+# Similarité cosinus minimale avec les embeddings de référence (PyTorch) pour valider un export
+MIN_COSINE = float(os.getenv("EMBEDDING_MIN_COSINE", "0.98"))
+
+
+# %% --------------------------- BACKEND ONNX ---------------------------
+class OnnxEmbedder:
+    """
+    Encodeur de phrases sur ONNX Runtime, sans torch.
+
+    Même interface que SentenceTransformer pour ce que le projet utilise
+    (`encode`, `get_sentence_embedding_dimension`, `max_seq_length`,
+    `tokenizer`) : le chatbot, le découpage en tokens et le build de l'index
+    l'utilisent sans changement. Le pooling (moyenne sur les tokens réels)
+    reproduit celui d'all-MiniLM-L6-v2.
+    """
+
+    def __init__(self, session, tokenizer, dimension, max_seq_length):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.dimension = dimension
+        self.max_seq_length = max_seq_length
+        self._inputs = {i.name for i in session.get_inputs()}
+
+    @classmethod
+    def load(cls, model_dir=ONNX_MODEL_DIR, quantized=False, threads=ONNX_THREADS):
+        model_dir = Path(model_dir)
+        model_file = model_dir / ONNX_FILES["onnx-int8" if quantized else "onnx"]
+        if not model_file.exists():
+            raise FileNotFoundError(
+                f"Modèle ONNX introuvable : {model_file} (à générer avec scripts/export_onnx.py)"
+            )
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        config = json.loads((model_dir / ONNX_CONFIG_FILE).read_text(encoding="utf-8"))
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        return cls(session, tokenizer, config["dimension"], config["max_seq_length"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _encode_batch(self, texts):
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length,
+                                 return_tensors="np")
+        feeds = {name: np.asarray(encoded[name], dtype="int64") for name in self._inputs}
+        hidden = self.session.run(None, feeds)[0]  # (lot, tokens, dim)
+        mask = np.asarray(encoded["attention_mask"], dtype="float32")[..., None]
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, convert_to_numpy=True,
+               show_progress_bar=None, **kwargs):
+        """Comme SentenceTransformer.encode : un vecteur pour une chaîne, une matrice float32 pour une liste."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.empty((len(texts), self.dimension), dtype="float32")
+        # Lots de longueurs voisines : moins de padding
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            batch_ids = order[start:start + batch_size]
+            vectors[batch_ids] = self._encode_batch([texts[i] for i in batch_ids])
+        if normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors[0] if single else vectors
+
+
+# %% --------------------------- CHOIX DU BACKEND ---------------------------
+def load_embedding_model(backend=EMBEDDING_BACKEND, model_name=EMBEDDING_MODEL_NAME, model_dir=ONNX_MODEL_DIR):
+    """Modèle d'embedding du backend demandé (interface SentenceTransformer)."""
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    if backend in ONNX_FILES:
+        return OnnxEmbedder.load(model_dir, quantized=backend == "onnx-int8")
+    raise ValueError(f"Backend d'embedding inconnu : {backend} ({', '.join(EMBEDDING_BACKENDS)})")
+
+
+def cosine_similarities(a, b):
+    """Similarité cosinus ligne à ligne entre deux matrices d'embeddings."""
+    a = np.asarray(a, dtype="float32")
+    b = np.asarray(b, dtype="float32")
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
@@ -0,0 +1,314 @@
+# %% --------------------------- IMPORTS ---------------------------
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+import weakref
+from collections import deque
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# %% --------------------------- CONFIG ---------------------------
+MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
+RETRY_STATUSES = {429, 500, 502, 503, 504}  # rate limit + erreurs serveur transitoires
+
+
+# %% --------------------------- CIRCUIT BREAKER ---------------------------
+def is_upstream_failure(exc):
+    """
+    Échec imputable à l'API Mistral (erreur réseau, 5xx, 429) : seuls ceux-là
+    comptent pour le circuit. Une 4xx (prompt invalide, clé refusée...) vient
+    de la requête d'un client et ne doit pas couper le service pour tous.
+    """
+    response = getattr(exc, "response", None)
+    if response is not None:
+        return response.status_code == 429 or response.status_code >= 500
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout, httpx.TransportError))
+
+
+class CircuitOpenError(RuntimeError):
+    """Levée quand le circuit est ouvert : l'API Mistral n'est pas appelée."""
+
+
+class CircuitBreaker:
+    """
+    Coupe les appels après `failure_threshold` échecs consécutifs, pendant
+    `reset_timeout` secondes. Passé ce délai, un seul appel d'essai est
+    autorisé (demi-ouvert), les autres sont refusés jusqu'à son issue : s'il
+    réussit le circuit se referme, sinon il se rouvre. Un essai sans issue
+    (appel annulé) est abandonné après `reset_timeout` secondes.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None  # appel d'essai en cours (demi-ouvert)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def check(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open":
+                now = time.monotonic()
+                if self.trial_started_at is None or now - self.trial_started_at >= self.reset_timeout:
+                    self.trial_started_at = now  # cet appel est l'essai
+                    return
+        raise CircuitOpenError("Circuit ouvert : trop d'échecs consécutifs de l'API Mistral.")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_started_at = None
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Appel terminé sans verdict sur l'API (ex. 4xx) : un nouvel essai peut passer."""
+        with self._lock:
+            self.trial_started_at = None
+
+
+# %% --------------------------- MÉTRIQUES ---------------------------
+class LatencyMetrics:
+    """Latences des derniers appels (fenêtre glissante) et compteurs cumulés."""
+
+    def __init__(self, window=1000):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok=True):
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.errors += 1
+            self.latencies.append(seconds)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            calls, errors, retries = self.calls, self.errors, self.retries
+        stats = {"calls": calls, "errors": errors, "retries": retries}
+        if latencies:
+            stats.update({
+                "latency_mean_s": round(statistics.fmean(latencies), 4),
+                "latency_p50_s": round(latencies[len(latencies) // 2], 4),
+                "latency_p95_s": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+                "latency_max_s": round(latencies[-1], 4)
+            })
+        return stats
+
+
+# %% --------------------------- WRAPPER MISTRAL ---------------------------
+class MistralLLM:
+    """
+    Client de l'endpoint /v1/chat/completions.
+
+    Les connexions sont réutilisées (keep-alive) via une requests.Session pour
+    les appels synchrones et un httpx.AsyncClient pour les appels asynchrones.
+    Les réponses 429/5xx et les erreurs réseau sont rejouées avec un backoff
+    exponentiel à jitter complet (ou le délai Retry-After s'il est fourni).
+    """
+
+    def __init__(self, api_key, model_name="mistral-small-latest", api_url=MISTRAL_API_URL,
+                 timeout=30, pool_size=10, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 breaker=None):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.api_url = api_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = LatencyMetrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._aclients = weakref.WeakKeyDictionary()  # boucle d'événements -> httpx.AsyncClient
+        self._aclients_lock = threading.Lock()
+
+    # ----------------------- utilitaires -----------------------
+    def _request(self, prompt, temperature, max_tokens):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        return headers, payload
+
+    def _backoff(self, attempt, retry_after=None):
+        """Délai avant la tentative suivante (Retry-After prioritaire, sinon jitter complet)."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _async_client(self):
+        # Un AsyncClient est lié à sa boucle d'événements : un client par boucle (celle de l'API,
+        # celle des évaluations par lot), à fermer par aclose() dans cette même boucle
+        loop = asyncio.get_running_loop()
+        with self._aclients_lock:
+            client = self._aclients.get(loop)
+            if client is None or client.is_closed:
+                client = self._aclients[loop] = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size)
+                )
+        return client
+
+    # ----------------------- appels -----------------------
+    def __call__(self, prompt, temperature=0.7, max_tokens=512):
+        self.breaker.check()
+        headers, payload = self._request(prompt, temperature, max_tokens)
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self.session.post(self.api_url, json=payload, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    data = response.json()
+                    self.breaker.record_success()
+                    self.metrics.record(time.perf_counter() - start)
+                    return data["choices"][0]["message"]["content"]
+                retry_after = response.headers.get("Retry-After")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    self._record_failure(start, e)
+                    raise
+            except Exception as e:
+                self._record_failure(start, e)
+                raise
+            self.metrics.record_retry()
+            time.sleep(self._backoff(attempt, retry_after))
+
+    async def acall(self, prompt, temperature=0.7, max_tokens=512):
+        """Version asynchrone : n'occupe pas la boucle d'événements pendant la génération."""
+        self.breaker.check()
+        headers, payload = self._request(prompt, temperature, max_tokens)
+        client = self._async_client()
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = await client.post(self.api_url, json=payload, headers=headers)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    data = response.json()
+                    self.breaker.record_success()
+                    self.metrics.record(time.perf_counter() - start)
+                    return data["choices"][0]["message"]["content"]
+                retry_after = response.headers.get("Retry-After")
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    self._record_failure(start, e)
+                    raise
+            except Exception as e:
+                self._record_failure(start, e)
+                raise
+            self.metrics.record_retry()
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    async def astream(self, prompt, temperature=0.7, max_tokens=512):
+        """
+        Génère la réponse morceau par morceau (mode `stream: true` de l'API,
+        événements SSE `data: {...}` terminés par `data: [DONE]`).
+        Les nouvelles tentatives n'ont lieu qu'avant la réception du premier token.
+        """
+        self.breaker.check()
+        headers, payload = self._request(prompt, temperature, max_tokens)
+        payload["stream"] = True
+        client = self._async_client()
+        start = time.perf_counter()
+        streamed = False
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with client.stream("POST", self.api_url, json=payload, headers=headers) as response:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                        if response.is_error:
+                            await response.aread()
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            delta = json.loads(data)["choices"][0].get("delta", {})
+                            if delta.get("content"):
+                                streamed = True
+                                yield delta["content"]
+                        self.breaker.record_success()
+                        self.metrics.record(time.perf_counter() - start)
+                        return
+                    retry_after = response.headers.get("Retry-After")
+            except httpx.TransportError as e:
+                # Pas de nouvelle tentative une fois des tokens envoyés : ils seraient dupliqués
+                if attempt == self.max_retries or streamed:
+                    self._record_failure(start, e)
+                    raise
+            except Exception as e:
+                self._record_failure(start, e)
+                raise
+            self.metrics.record_retry()
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    def _record_failure(self, start, exc):
+        if is_upstream_failure(exc):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_trial()
+        self.metrics.record(time.perf_counter() - start, ok=False)
+
+    def close(self):
+        self.session.close()
+
+    async def aclose(self):
+        """Ferme le client asynchrone de la boucle courante (ses connexions ne peuvent plus être
+        fermées une fois la boucle arrêtée)."""
+        with self._aclients_lock:
+            client = self._aclients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
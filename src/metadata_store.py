@@ -0,0 +1,138 @@
+# %% --------------------------- IMPORTS ---------------------------
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+# %% --------------------------- CONFIG ---------------------------
+DB_DIR = Path(__file__).resolve().parent.parent / "db"
+EVENTS_FILE = DB_DIR / "metadatas_events.arrow"   # une ligne par événement
+CHUNKS_FILE = DB_DIR / "metadatas_chunks.arrow"   # une ligne par vecteur : id -> événement + chunk
+LEGACY_PICKLE_FILE = DB_DIR / "metadatas.pkl"     # ancien format (un dict complet par chunk)
+
+EVENT_FIELDS = ["event_id", "title", "dates_text", "geo_text", "vectorise_text",
+                "location_postalcode", "age_min", "age_max"]  # les trois derniers : recherche filtrée
+
+
+# %% --------------------------- STORE COLONNAIRE ---------------------------
+class MetadataStore:
+    """
+    Métadonnées des vecteurs FAISS au format colonnaire (Arrow).
+
+    Les champs d'un événement sont stockés une seule fois ; chaque vecteur
+    pointe vers sa ligne d'événement via un tableau d'entiers. Les fichiers
+    sont ouverts en mémoire mappée : seules les lignes lues sont converties
+    en objets Python. `store[vector_id]` renvoie le même dict que l'ancien
+    metadatas.pkl (champs de l'événement + "chunk").
+    """
+
+    def __init__(self, events, chunks):
+        self.events = events.combine_chunks()
+        self.chunks = chunks.combine_chunks()
+        self.event_fields = list(self.events.column_names)
+        # Tableaux numpy sans copie (colonnes entières sans valeurs nulles)
+        self.vector_ids = self.chunks.column("vector_id").to_numpy()
+        self.event_rows = self.chunks.column("event_row").to_numpy()
+        self._event_columns = {f: _single_chunk(self.events.column(f)) for f in self.event_fields}
+        self._chunk_column = _single_chunk(self.chunks.column("chunk"))
+
+    # ----------------------- accès -----------------------
+    def __len__(self):
+        return len(self.vector_ids)
+
+    def _position(self, vector_id):
+        # vector_ids est trié : recherche dichotomique
+        pos = int(np.searchsorted(self.vector_ids, vector_id))
+        if pos == len(self.vector_ids) or self.vector_ids[pos] != vector_id:
+            raise KeyError(vector_id)
+        return pos
+
+    def __contains__(self, vector_id):
+        try:
+            self._position(vector_id)
+            return True
+        except KeyError:
+            return False
+
+    def __getitem__(self, vector_id):
+        pos = self._position(vector_id)
+        row = int(self.event_rows[pos])
+        meta = {f: self._event_columns[f][row].as_py() for f in self.event_fields}
+        meta["chunk"] = self._chunk_column[pos].as_py()
+        return meta
+
+    def get(self, vector_id, default=None):
+        try:
+            return self[vector_id]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """Matérialise tout le store (utilisé par le build incrémental)."""
+        return {int(vector_id): self[vector_id] for vector_id in self.vector_ids}
+
+    # ----------------------- construction -----------------------
+    @classmethod
+    def from_dict(cls, metadatas, event_fields=EVENT_FIELDS):
+        """Construit le store depuis un dict vector_id -> métadonnées (ou une liste)."""
+        if isinstance(metadatas, list):
+            metadatas = dict(enumerate(metadatas))
+        # Seuls les champs présents sont stockés (métadonnées d'un build plus ancien)
+        present = set().union(*(meta.keys() for meta in metadatas.values())) if metadatas else set(event_fields)
+        event_fields = [f for f in event_fields if f in present]
+        event_index = {}
+        event_values = {f: [] for f in event_fields}
+        vector_ids, event_rows, chunk_texts = [], [], []
+
+        for vector_id in sorted(metadatas):
+            meta = metadatas[vector_id]
+            key = meta.get("event_id", "")
+            if key not in event_index:
+                event_index[key] = len(event_index)
+                for f in event_fields:
+                    event_values[f].append(_to_text(meta.get(f, "")))
+            vector_ids.append(vector_id)
+            event_rows.append(event_index[key])
+            chunk_texts.append(_to_text(meta.get("chunk", "")))
+
+        events = pa.table({f: pa.array(event_values[f], pa.string()) for f in event_fields})
+        chunks = pa.table({
+            "vector_id": pa.array(vector_ids, pa.int64()),
+            "event_row": pa.array(event_rows, pa.int32()),
+            "chunk": pa.array(chunk_texts, pa.string())
+        })
+        return cls(events, chunks)
+
+    def save(self, events_file=EVENTS_FILE, chunks_file=CHUNKS_FILE):
+        for table, path in ((self.events, events_file), (self.chunks, chunks_file)):
+            tmp_path = Path(f"{path}.tmp")
+            with pa.OSFile(str(tmp_path), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, events_file=EVENTS_FILE, chunks_file=CHUNKS_FILE, mmap=True):
+        def read(path):
+            source = pa.memory_map(str(path), "r") if mmap else pa.OSFile(str(path), "rb")
+            return pa.ipc.open_file(source).read_all()
+        return cls(read(events_file), read(chunks_file))
+
+
+def _single_chunk(column):
+    """Colonne Arrow en un seul tableau contigu (accès direct par position)."""
+    return column.chunk(0) if column.num_chunks else pa.array([], column.type)
+
+
+def _to_text(value):
+    return "" if value is None else str(value)
+
+
+def load_metadatas(events_file=EVENTS_FILE, chunks_file=CHUNKS_FILE, legacy_file=LEGACY_PICKLE_FILE):
+    """Charge le store colonnaire, ou l'ancien metadatas.pkl pour un index construit avant lui."""
+    if Path(events_file).exists() and Path(chunks_file).exists():
+        return MetadataStore.load(events_file, chunks_file)
+    with open(legacy_file, "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,116 @@
+# %% --------------------------- IMPORTS ---------------------------
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+# %% --------------------------- CACHE OCR SUR DISQUE ---------------------------
+class OCRCache:
+    """
+    Cache persistant (SQLite) des textes extraits des affiches.
+
+    Une entrée par URL : hash SHA-256 du contenu de l'image, en-têtes ETag /
+    Last-Modified pour la revalidation HTTP, texte OCR, taille et durée de
+    l'OCR. Une image inchangée (304, ou même contenu sous une autre URL)
+    n'est jamais ré-analysée. Utilisable depuis plusieurs threads.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                text TEXT NOT NULL,
+                ocr_seconds REAL NOT NULL,
+                bytes INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_content_hash ON ocr (content_hash)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.revalidated = 0   # 304 : ni téléchargement ni OCR
+        self.content_hits = 0  # image re-téléchargée mais contenu déjà connu : pas d'OCR
+        self.misses = 0
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def content_hash(content):
+        return hashlib.sha256(content).hexdigest()
+
+    def _row(self, query, args):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT url, content_hash, etag, last_modified, text, ocr_seconds, bytes FROM ocr WHERE {query}",
+                args).fetchone()
+        if row is None:
+            return None
+        keys = ("url", "content_hash", "etag", "last_modified", "text", "ocr_seconds", "bytes")
+        return dict(zip(keys, row))
+
+    def get(self, url):
+        return self._row("url = ?", (url,))
+
+    def find_hash(self, content_hash):
+        return self._row("content_hash = ? LIMIT 1", (content_hash,))
+
+    def conditional_headers(self, entry):
+        """En-têtes de revalidation HTTP pour une entrée connue."""
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, content_hash, text, ocr_seconds, size, etag=None, last_modified=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, content_hash, etag, last_modified, text, ocr_seconds, size, time.time()))
+            self._conn.commit()
+
+    # ----------------------- statistiques -----------------------
+    def record_revalidated(self, entry):
+        with self._lock:
+            self.revalidated += 1
+            self.bytes_saved += entry["bytes"]
+            self.seconds_saved += entry["ocr_seconds"]
+
+    def record_content_hit(self, entry):
+        with self._lock:
+            self.content_hits += 1
+            self.seconds_saved += entry["ocr_seconds"]
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.revalidated + self.content_hits + self.misses
+            hits = self.revalidated + self.content_hits
+            return {
+                "revalidated": self.revalidated,
+                "content_hits": self.content_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else None,
+                "bytes_saved": self.bytes_saved,
+                "ocr_seconds_saved": round(self.seconds_saved, 2)
+            }
+
+    def report(self):
+        s = self.stats()
+        hit_rate = f"{s['hit_rate']:.0%}" if s["hit_rate"] is not None else "n/a"
+        return (f"Cache OCR : {s['revalidated']} revalidées (304), {s['content_hits']} contenus connus, "
+                f"{s['misses']} OCR effectués, taux de succès {hit_rate}, "
+                f"{s['bytes_saved'] / 1024 / 1024:.1f} Mo et {s['ocr_seconds_saved']:.1f} s d'OCR économisés")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,232 @@
+# %% --------------------------- IMPORTS ---------------------------
+import os
+import time
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+import numpy as np
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+# %% --------------------------- CONFIG ---------------------------
+OCR_LANGUAGES = ("fr",)
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "1280"))  # plus grand côté (px) avant reconnaissance
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))  # processus OCR
+OCR_DOWNLOAD_THREADS = int(os.getenv("OCR_DOWNLOAD_THREADS", "8"))
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "8"))  # images envoyées ensemble à un processus
+OCR_MAX_INFLIGHT = int(os.getenv("OCR_MAX_INFLIGHT", "0"))  # lots en cours de reconnaissance (0 : 2 par processus)
+
+
+# %% --------------------------- TÉLÉCHARGEMENT ---------------------------
+def fetch_image(url, cache=None, session=requests, timeout=5):
+    """
+    Télécharge (ou lit sur disque) une image.
+
+    Renvoie (texte, None) si le cache connaît déjà l'image (réponse 304 ou
+    contenu identique sous une autre URL), sinon (None, download) où
+    download contient le contenu et ce qu'il faut pour l'ajouter au cache.
+    """
+    etag = last_modified = None
+    if url.startswith("http"):
+        entry = cache.get(url) if cache else None
+        headers = cache.conditional_headers(entry) if cache else {}
+        response = session.get(url, timeout=timeout, headers=headers)
+        if entry and response.status_code == 304:
+            cache.record_revalidated(entry)
+            return entry["text"], None
+        response.raise_for_status()
+        content = response.content
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    else:
+        with open(url, "rb") as f:
+            content = f.read()
+
+    download = {"url": url, "content": content, "size": len(content), "hash": None,
+                "etag": etag, "last_modified": last_modified}
+    if cache is not None:
+        download["hash"] = cache.content_hash(content)
+        known = cache.find_hash(download["hash"])
+        if known:
+            cache.record_content_hit(known)
+            store_result(cache, download, known["text"], known["ocr_seconds"], miss=False)
+            return known["text"], None
+    return None, download
+
+
+def store_result(cache, download, text, seconds, miss=True):
+    if cache is None:
+        return
+    if miss:
+        cache.record_miss()
+    cache.put(download["url"], download["hash"], text, seconds, download["size"],
+              download["etag"], download["last_modified"])
+
+
+def prepare_image(content, max_side=OCR_MAX_SIDE):
+    """Niveaux de gris + réduction des affiches trop grandes : moins de pixels à analyser."""
+    img = Image.open(BytesIO(content)).convert("L")
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    return np.asarray(img)
+
+
+# %% --------------------------- PROCESSUS OCR ---------------------------
+_reader = None  # un easyocr.Reader par processus, créé une seule fois par l'initializer
+
+
+def init_worker(languages=OCR_LANGUAGES, gpu=False):
+    global _reader
+    import easyocr
+    _reader = easyocr.Reader(list(languages), gpu=gpu, verbose=False)
+
+
+def recognize_batch(images):
+    """Reconnaît un lot d'images ; renvoie [(texte, secondes)] (texte None en cas d'échec)."""
+    results = []
+    for img in images:
+        start = time.perf_counter()
+        try:
+            text = " ".join(_reader.readtext(img, detail=0))
+        except Exception:
+            text = None
+        results.append((text, time.perf_counter() - start))
+    return results
+
+
+# %% --------------------------- MOTEUR OCR ---------------------------
+class OCREngine:
+    """
+    OCR des affiches en deux étages :
+      - des threads téléchargent, revalident (cache) et préparent les images ;
+      - un pool de processus, chacun avec son propre Reader EasyOCR, fait la
+        reconnaissance par lots de `batch_size` images.
+    Avec workers=0 la reconnaissance se fait dans le processus courant.
+    La mémoire reste bornée : au plus 2 × download_threads téléchargements et
+    `max_inflight` lots en cours ; les téléchargements attendent quand les
+    processus OCR sont saturés.
+    Utilisé comme gestionnaire de contexte, le pool (et donc les Readers)
+    est conservé entre plusieurs appels à run().
+    """
+
+    def __init__(self, workers=OCR_WORKERS, download_threads=OCR_DOWNLOAD_THREADS, batch_size=OCR_BATCH_SIZE,
+                 max_side=OCR_MAX_SIDE, languages=OCR_LANGUAGES, cache=None, max_inflight=OCR_MAX_INFLIGHT):
+        self.workers = workers
+        self.download_threads = download_threads
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight or 2 * max(1, workers)
+        self.max_side = max_side
+        self.languages = languages
+        self.cache = cache
+        self._pool = None
+        self._started = False
+
+    def __enter__(self):
+        self._pool = self._make_pool()
+        self._started = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+        self._pool = None
+        self._started = False
+
+    def _download(self, url, session):
+        text, download = fetch_image(url, self.cache, session)
+        if download is not None:
+            download["image"] = prepare_image(download.pop("content"), self.max_side)
+        return text, download
+
+    def _make_pool(self):
+        if not self.workers:
+            init_worker(self.languages)
+            return None
+        # "spawn" : pas de fork d'un processus qui a déjà des threads et un modèle torch chargé
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=init_worker, initargs=(self.languages,))
+
+    def run(self, urls, progress=None):
+        """Renvoie {url: texte} ; une image illisible ou introuvable donne ""."""
+        results = {}
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.download_threads)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        owns_pool = not self._started
+        pool = self._make_pool() if owns_pool else self._pool
+        downloads = {}  # future -> url, au plus 2 × download_threads en cours
+        batches = {}  # future -> lot en cours de reconnaissance, au plus max_inflight
+
+        def done(url, text):
+            results[url] = text
+            if progress:
+                progress(1)
+
+        def collect(batch, recognized):
+            for download, (text, seconds) in zip(batch, recognized):
+                if text is not None:
+                    store_result(self.cache, download, text, seconds)
+                done(download["url"], text or "")
+
+        def collect_ready(block=False):
+            # Lots déjà reconnus (block : attend qu'au moins un se termine)
+            if block:
+                finished, _ = wait(batches, return_when=FIRST_COMPLETED)
+            else:
+                finished = [f for f in batches if f.done()]
+            for future in finished:
+                batch = batches.pop(future)
+                try:
+                    collect(batch, future.result())
+                except Exception:
+                    for download in batch:
+                        done(download["url"], "")
+
+        def submit(batch):
+            images = [d.pop("image") for d in batch]  # le lot ne garde plus les pixels
+            if pool is None:
+                collect(batch, recognize_batch(images))
+                return
+            while len(batches) >= self.max_inflight:
+                collect_ready(block=True)
+            batches[pool.submit(recognize_batch, images)] = batch
+
+        try:
+            batch = []
+            pending = iter(urls)
+            with ThreadPoolExecutor(self.download_threads) as io_pool:
+                def refill():
+                    for url in islice(pending, 2 * self.download_threads - len(downloads)):
+                        downloads[io_pool.submit(self._download, url, session)] = url
+
+                refill()
+                while downloads:
+                    finished, _ = wait(downloads, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        url = downloads.pop(future)
+                        try:
+                            text, download = future.result()
+                        except Exception:
+                            done(url, "")
+                            continue
+                        if download is None:
+                            done(url, text)
+                            continue
+                        batch.append(download)
+                        if len(batch) >= self.batch_size:
+                            submit(batch)
+                            batch = []
+                    collect_ready()
+                    refill()
+            if batch:
+                submit(batch)
+            while batches:
+                collect_ready(block=True)
+        finally:
+            if owns_pool and pool is not None:
+                pool.shutdown()
+            session.close()
+        return results
@@ -0,0 +1,349 @@
+# %% --------------------------- IMPORTS ---------------------------
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(os.path.dirname(__file__))
+sys.path.append(str(BASE_DIR))
+
+import preprocessing
+from ocr_cache import OCRCache
+from ocr_engine import OCREngine
+from vectorisation import BATCH_SIZE, MODEL_NAME, clean_texts
+from embeddings import EMBEDDING_BACKEND, load_embedding_model
+from db.vectorial_db import (
+    MAX_TRAIN_SIZE, INDEX_TYPE, TokenChunker, split_text, chunking_name, build_chunks, encode_chunks,
+    hash_text, new_manifest, create_index, train_index, open_existing_index, remove_events,
+    record_event_attributes, save_all
+)
+
+# %% --------------------------- CONFIG ---------------------------
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "500"))  # événements par lot
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))  # lots en attente entre deux étapes
+
+
+# %% --------------------------- OUTILS DE FLUX ---------------------------
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+class _Stopped(Exception):
+    """Le consommateur a abandonné le flux : le producteur s'arrête."""
+
+
+def threaded(items, maxsize=PIPELINE_QUEUE_SIZE):
+    """
+    Consomme `items` dans un thread et en renvoie les éléments via une file
+    bornée : l'étape suivante travaille pendant que celle-ci produit, et une
+    étape lente bloque la précédente au lieu d'accumuler des lots en mémoire.
+    """
+    q = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            put(_DONE)
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()  # le consommateur s'arrête : débloque le producteur
+
+
+def batched(records, size=PIPELINE_BATCH_SIZE):
+    """Regroupe des enregistrements (dicts) en DataFrames de `size` lignes."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield pd.DataFrame(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch)
+
+
+def checkpoint(batches, path):
+    """Recopie chaque lot dans `path` (JSON lines) au passage ; sans effet si path est None."""
+    if path is None:
+        yield from batches
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        for batch in batches:
+            if isinstance(batch, pd.DataFrame):
+                if len(batch):
+                    f.write(batch.to_json(orient="records", lines=True, force_ascii=False, date_format="iso"))
+                    f.write("\n")
+            else:
+                f.write(json.dumps(batch, ensure_ascii=False, default=str) + "\n")
+            yield batch
+
+
+# %% --------------------------- ÉTAPES ---------------------------
+def fetch_records(base_url=preprocessing.BASE_URL, params=preprocessing.PARAMS, maxsize=PIPELINE_BATCH_SIZE):
+    """
+    Enregistrements OpenData au fil du téléchargement : le fetch asynchrone
+    tourne dans son thread et pousse chaque enregistrement dans une file bornée.
+    """
+    q = queue.Queue(maxsize)
+    stop = threading.Event()
+    result = {}
+
+    def put(item):
+        # Avec délai : si le consommateur a abandonné le flux, le fetch s'interrompt au lieu de bloquer
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped()
+
+    def run():
+        try:
+            asyncio.run(preprocessing.fetch_all_events_async(base_url, dict(params), sink=put))
+        except _Stopped:
+            pass
+        except BaseException as e:
+            result["error"] = e
+        finally:
+            try:
+                put(_DONE)
+            except _Stopped:
+                pass
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+    if "error" in result:
+        raise result["error"]
+
+
+def prepare(batches):
+    for df in batches:
+        df = preprocessing.transform_events(df)
+        if len(df):
+            yield df
+
+
+def ocr(batches, engine):
+    for df in batches:
+        yield preprocessing.build_vectorise_text(df, engine.run(preprocessing.image_urls(df)))
+
+
+def clean(batches):
+    for df in batches:
+        df["vectorise_text"] = clean_texts(df["vectorise_text"].tolist(), workers=1)
+        yield df
+
+
+# %% --------------------------- ÉCRITURE DE L'INDEX ---------------------------
+class _PendingIndex:
+    def remove_ids(self, ids):
+        pass
+
+
+class IndexSink:
+    """
+    Dernière étape : reçoit les lots d'événements nettoyés, n'encode que les
+    événements nouveaux ou modifiés et ajoute leurs vecteurs à l'index.
+
+    Les index IVF / PQ doivent être entraînés avant tout ajout : les premiers
+    vecteurs sont gardés en attente (au plus `train_size`), puis l'index est
+    créé et entraîné sur cet échantillon. La mémoire utilisée par cette
+    attente est bornée quelle que soit la taille du jeu de données.
+    """
+
+    def __init__(self, model, index_type="flat", nlist=None, incremental=False,
+                 batch_size=BATCH_SIZE, train_size=MAX_TRAIN_SIZE, existing=None, chunker=split_text,
+                 embedding_backend=EMBEDDING_BACKEND):
+        self.model = model
+        self.chunker = chunker
+        self.index_type = index_type
+        self.nlist = nlist
+        self.batch_size = batch_size
+        self.train_size = train_size
+        if existing is None:
+            existing = open_existing_index(index_type, incremental, chunking_name(chunker),
+                                           embedding_backend, MODEL_NAME)
+        self.updates_existing = existing is not None  # mise à jour du build précédent (ids conservés)
+        if existing is not None:
+            self.index, self.metadatas, self.manifest = existing
+        else:
+            print(f"Création d'un index {index_type}")
+            self.index, self.metadatas, self.manifest = None, {}, new_manifest(
+                index_type, chunking_name(chunker), embedding_backend, MODEL_NAME)
+            if index_type in ("flat", "hnsw"):  # pas d'entraînement : index créé tout de suite
+                self.index = create_index(model.get_sentence_embedding_dimension(), index_type)
+        self.pending = []  # (vecteurs, ids) en attente de l'entraînement
+        self.seen = set()  # événements reçus depuis le début du build (tous lots confondus)
+        self.stats = {"new": 0, "updated": 0, "deleted": 0, "unchanged": 0, "duplicates": 0,
+                      "chunks_removed": 0, "chunks_encoded": 0, "seconds_encoding": 0.0}
+
+    def add(self, df):
+        df = df.drop_duplicates("event_id", keep="last")
+        events = self.manifest["events"]
+        hashes = {eid: hash_text(text) for eid, text in zip(df["event_id"], df["vectorise_text"])}
+        changed = [eid for eid, h in hashes.items() if events.get(eid, {}).get("hash") != h]
+        # Un événement déjà reçu dans un lot précédent est réindexé s'il a changé (la dernière
+        # version gagne) mais n'est compté qu'une fois dans les statistiques
+        repeated = self.seen.intersection(hashes)
+        self.seen.update(hashes)
+        first_changed = [eid for eid in changed if eid not in repeated]
+        n_new = sum(1 for eid in first_changed if eid not in events)
+        self.stats["new"] += n_new
+        self.stats["updated"] += len(first_changed) - n_new
+        self.stats["unchanged"] += len(hashes) - len(repeated) - len(first_changed)
+        self.stats["duplicates"] += len(repeated)
+        self.stats["chunks_removed"] += self._remove(changed, keep_entries=True)
+
+        chunks, chunk_metadatas = build_chunks(df[df["event_id"].isin(changed)], self.chunker)
+        next_id = self.manifest["next_id"]
+        ids = np.arange(next_id, next_id + len(chunks), dtype="int64")
+        if chunks:
+            vectors, report = encode_chunks(self.model, chunks, self.batch_size)
+            self.stats["chunks_encoded"] += len(chunks)
+            self.stats["seconds_encoding"] += report["seconds"]
+            self._add_vectors(vectors, ids)
+        self.manifest["next_id"] += len(chunks)
+
+        for eid in changed:
+            events[eid] = {"hash": hashes[eid], "ids": []}
+        for vector_id, meta in zip(ids.tolist(), chunk_metadatas):
+            self.metadatas[vector_id] = meta
+            events[meta["event_id"]]["ids"].append(vector_id)
+        record_event_attributes(self.manifest, self.metadatas, df)
+
+    def _remove(self, event_ids, keep_entries=False):
+        if self.index is not None:
+            return remove_events(self.index, self.metadatas, self.manifest, event_ids, keep_entries)
+        # index pas encore entraîné : les vecteurs sont encore dans le tampon
+        stale = [i for eid in event_ids for i in self.manifest["events"].get(eid, {}).get("ids", [])]
+        self.pending = [(v[~np.isin(i, stale)], i[~np.isin(i, stale)]) for v, i in self.pending]
+        return remove_events(_PendingIndex(), self.metadatas, self.manifest, event_ids, keep_entries)
+
+    def _add_vectors(self, vectors, ids):
+        if self.index is not None:
+            self.index.add_with_ids(vectors, ids)
+            return
+        self.pending.append((vectors, ids))
+        if sum(len(v) for v, _ in self.pending) >= self.train_size:
+            self._train_and_flush()
+
+    def _train_and_flush(self):
+        vectors = np.concatenate([v for v, _ in self.pending])
+        ids = np.concatenate([i for _, i in self.pending])
+        self.pending = []
+        self.index = create_index(vectors.shape[1], self.index_type, n_vectors=len(vectors), nlist=self.nlist)
+        train_index(self.index, vectors, self.train_size)
+        self.index.add_with_ids(vectors, ids)
+
+    def finish(self):
+        """Entraîne l'index si besoin et retire les événements absents de ce build."""
+        if self.pending:
+            self._train_and_flush()
+        if self.index is None:
+            raise ValueError("Aucun événement à indexer.")
+        deleted = [eid for eid in self.manifest["events"] if eid not in self.seen]
+        self.stats["deleted"] = len(deleted)
+        self.stats["chunks_removed"] += self._remove(deleted)
+        return self.stats
+
+
+# %% --------------------------- PIPELINE COMPLET ---------------------------
+def run_build(records=None, model=None, index_type=INDEX_TYPE, nlist=None, incremental=False, chunking="tokens",
+              checkpoint_dir=None, batch_size=PIPELINE_BATCH_SIZE, ocr_engine=None, sink=None, save=True,
+              embedding_backend=EMBEDDING_BACKEND):
+    """
+    Construit l'index en un seul processus : fetch -> préparation -> OCR ->
+    nettoyage -> chunks -> embeddings -> index. Chaque étape tourne dans son
+    thread et passe ses lots à la suivante par une file bornée ; aucun fichier
+    intermédiaire n'est nécessaire. Avec `checkpoint_dir`, la sortie de chaque
+    étape est aussi écrite en JSON lines pour le débogage.
+    """
+    start = time.perf_counter()
+    if model is None:
+        model = load_embedding_model(embedding_backend, MODEL_NAME)
+    if sink is None:
+        chunker = TokenChunker.from_model(model) if chunking == "tokens" else split_text
+        sink = IndexSink(model, index_type, nlist=nlist, incremental=incremental, chunker=chunker,
+                         embedding_backend=embedding_backend)
+
+    def path(name):
+        if checkpoint_dir is None:
+            return None
+        Path(checkpoint_dir).mkdir(parents=True, exist_ok=True)
+        return Path(checkpoint_dir) / f"{name}.jsonl"
+
+    ocr_cache = None
+    if ocr_engine is None:
+        ocr_cache = OCRCache(preprocessing.OCR_CACHE_FILE)
+        ocr_engine = OCREngine(cache=ocr_cache)
+
+    records = fetch_records() if records is None else records
+    with ocr_engine:
+        stream = checkpoint(records, path("01_raw"))
+        stream = threaded(checkpoint(prepare(batched(stream, batch_size)), path("02_prepared")))
+        stream = threaded(checkpoint(ocr(stream, ocr_engine), path("03_ocr")))
+        stream = threaded(checkpoint(clean(stream), path("04_clean")))
+        n_events = 0
+        for df in stream:
+            sink.add(df)
+            n_events += len(df)
+
+    stats = sink.finish()
+    if ocr_cache is not None:
+        print(ocr_cache.report())
+        ocr_cache.close()
+    print(
+        f"Événements : {stats['new']} nouveaux, {stats['updated']} modifiés, "
+        f"{stats['deleted']} supprimés, {stats['unchanged']} inchangés"
+    )
+    print(f"Chunks : {stats['chunks_encoded']} encodés, {stats['chunks_removed']} retirés")
+    if isinstance(sink.chunker, TokenChunker):
+        print(sink.chunker.report())
+    print(f"Index Faiss avec {sink.index.ntotal} vecteurs ({n_events} événements, "
+          f"{time.perf_counter() - start:.1f} s)")
+    if save:
+        save_all(sink.index, sink.metadatas, sink.manifest, incremental=sink.updates_existing)
+    return sink
@@ -1,20 +1,35 @@
 # %% --------------------------- IMPORTS ---------------------------
 import os
+import sys
+import json
+import time
+import random
+import asyncio
+from contextlib import nullcontext
+import httpx
 import requests
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 from PIL import Image
 from io import BytesIO
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import easyocr
 from tqdm import tqdm
 import numpy as np
 
+sys.path.append(os.path.dirname(__file__))
+from ocr_cache import OCRCache
+from ocr_engine import OCREngine, fetch_image, store_result
+
 # %% --------------------------- CONFIG ---------------------------
 BASE_URL = "https://public.opendatasoft.com/api/records/1.0/search/"
 DATASET = "evenements-publics-openagenda"
 DATE_LIMIT = (datetime.now() - timedelta(days=365)).isoformat()
 OUTPUT_FILENAME = "evenements_lyon_prets.feather"
+RAW_RECORDS_FILE = "evenements_bruts.jsonl"  # enregistrements bruts écrits au fil de l'eau
+MAX_RECORDS = 10000  # limite de pagination de l'API (start + rows <= 10 000)
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))  # pages téléchargées simultanément
+FETCH_MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", "3"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+OCR_CACHE_FILE = os.getenv("OCR_CACHE_FILE", "ocr_cache.sqlite")  # textes OCR conservés entre deux exécutions
 
 PARAMS = {
     "dataset": DATASET,
@@ -28,22 +43,88 @@ PARAMS = {
 }
 
 # %% --------------------------- FETCH OPENDATA ---------------------------
-def fetch_all_events(base_url, params):
-    all_records = []
-    response = requests.get(base_url, params=params).json()
-    total_count = response.get("nhits", 0)
-    print(f"Total d'événements trouvés : {total_count}")
-
-    while params["start"] < total_count and params["start"] < 10000:
-        print(f"Récupération à partir de {params['start']}...")
-        response = requests.get(base_url, params=params).json()
-        records = response.get("records", [])
-        if not records:
-            break
-        all_records.extend(records)
-        params["start"] += params["rows"]
-
-    return [rec["fields"] for rec in all_records]
+async def fetch_page(client, base_url, params, start, rows, max_retries=FETCH_MAX_RETRIES,
+                     backoff_base=0.5, backoff_max=8.0):
+    """Télécharge une page ; les 429/5xx et erreurs réseau sont rejoués (backoff à jitter complet)."""
+    page_params = {**params, "start": start, "rows": rows}
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.get(base_url, params=page_params)
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                response.raise_for_status()
+                return response.json()
+        except httpx.TransportError:
+            if attempt == max_retries:
+                raise
+        await asyncio.sleep(random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt)))
+
+
+async def fetch_all_events_async(base_url, params, output_file=RAW_RECORDS_FILE,
+                                 concurrency=FETCH_CONCURRENCY, max_records=MAX_RECORDS, sink=None,
+                                 **retry_kwargs):
+    """
+    Récupère tous les enregistrements et les écrit dans `output_file` (JSON lines),
+    ou les passe un à un à `sink` s'il est fourni (pipeline en flux).
+
+    La première page donne `nhits` : les offsets des pages suivantes en sont
+    déduits et elles sont téléchargées en parallèle (au plus `concurrency` à
+    la fois). Les pages sont écrites dans l'ordre dès que possible, sans
+    garder tout le jeu de données en mémoire. Renvoie le nombre d'enregistrements.
+    """
+    page_size = params["rows"]
+    first_start = params.get("start", 0)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        first_rows = min(page_size, max_records - first_start)
+        first_page = await fetch_page(client, base_url, params, first_start, first_rows, **retry_kwargs)
+        total_count = first_page.get("nhits", 0)
+        print(f"Total d'événements trouvés : {total_count}")
+
+        end = min(total_count, max_records)
+        starts = list(range(first_start + page_size, end, page_size))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded_fetch(start):
+            async with semaphore:
+                page = await fetch_page(client, base_url, params, start,
+                                        min(page_size, max_records - start), **retry_kwargs)
+                return start, page
+
+        written = 0
+        pending = {first_start: first_page}  # pages reçues, en attente de leur tour d'écriture
+        next_start = first_start
+
+        def flush(write):
+            nonlocal written, next_start
+            while next_start in pending:
+                for record in pending.pop(next_start).get("records", []):
+                    write(record["fields"])
+                    written += 1
+                next_start += page_size
+
+        tasks = [asyncio.create_task(bounded_fetch(start)) for start in starts]
+        try:
+            with (open(output_file, "w", encoding="utf-8") if sink is None else nullcontext()) as f:
+                write = sink or (lambda fields: f.write(json.dumps(fields, ensure_ascii=False) + "\n"))
+                flush(write)
+                for next_page in asyncio.as_completed(tasks):
+                    start, page = await next_page
+                    pending[start] = page
+                    flush(write)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    destination = output_file if sink is None else "le pipeline"
+    print(f"{written} enregistrements transmis à {destination} ({len(starts) + 1} pages)")
+    return written
+
+
+def fetch_all_events(base_url, params, output_file=RAW_RECORDS_FILE):
+    asyncio.run(fetch_all_events_async(base_url, params, output_file))
+    with open(output_file, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
 
 # ------------------------------------------------------
 # FONCTIONS UTILISÉES PAR LES TESTS (NE DOIVENT PAS EXÉCUTER DE CODE)
@@ -86,42 +167,208 @@ def convert_to_text(val):
         return val
     return str(val)
 
-# OCR (mockée dans les tests)
-reader = easyocr.Reader(['fr'], gpu=False)
+def format_coordinates(row):
+    lat = row.get('latitude')
+    lon = row.get('longitude')
+    if pd.notnull(lat) and pd.notnull(lon):
+        return f"Coordonnées : {lat:.5f}, {lon:.5f}"
+    return ""
+
+def build_age_text(row):
+    if row.get('age_min') and row.get('age_max'):
+        return f"Âge : {row['age_min']} à {row['age_max']}"
+    if row.get('age_min'):
+        return f"Âge : {row.get('age_min')}"
+    if row.get('age_max'):
+        return f"Âge : {row.get('age_max')}"
+    return ""
+
+# ------------------------------------------------------
+# TRANSFORMATIONS VECTORISÉES (colonne par colonne)
+# Mêmes résultats que les fonctions ligne à ligne ci-dessus, qui restent
+# la référence comparée dans les tests.
+# ------------------------------------------------------
+
+DATE_LABELS = [
+    ("firstdate_begin", "Première date : "),
+    ("firstdate_end", "Fin première période : "),
+    ("lastdate_begin", "Dernière date : "),
+    ("lastdate_end", "Fin dernière période : "),
+]
+
+def format_dates(values, with_time=False):
+    """
+    Équivalent de values.dt.strftime("%d/%m/%Y") (ou "%d/%m/%Y %H:%M:%S") pour une
+    colonne datetime64 : les chiffres sont réarrangés depuis la forme ISO dans un
+    tableau de caractères au lieu d'appeler strftime pour chaque cellule. NaT -> NaN.
+    """
+    if values.dt.tz is not None:
+        values = values.dt.tz_localize(None)  # heure locale du fuseau, comme strftime
+    iso = np.datetime_as_string(values.to_numpy("datetime64[s]"))  # "AAAA-MM-JJTHH:MM:SS" ou "NaT"
+    chars = iso.astype("U19").view("U1").reshape(-1, 19)
+    width = 19 if with_time else 10
+    out = np.empty((len(iso), width), dtype="U1")
+    out[:, 0:2], out[:, 2] = chars[:, 8:10], "/"
+    out[:, 3:5], out[:, 5] = chars[:, 5:7], "/"
+    out[:, 6:10] = chars[:, 0:4]
+    if with_time:
+        out[:, 10], out[:, 11:19] = " ", chars[:, 11:19]
+    text = pd.Series(out.view(f"U{width}").ravel(), index=values.index, dtype=object)
+    return text.where(values.notna().to_numpy())
+
+def join_parts(parts, sep, index):
+    """Concatène des colonnes de morceaux de texte en ignorant les valeurs manquantes."""
+    out = pd.Series("", index=index, dtype=object)
+    for part in parts:
+        has = part.notna()
+        current = out[has]
+        out[has] = current.where(current == "", current + sep) + part[has]
+    return out
+
+def dates_text_column(df):
+    """Version vectorisée de build_dates."""
+    parts = []
+    for col, label in DATE_LABELS:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            parts.append(label + format_dates(values))  # NaT -> NaN
+        else:  # colonne restée object (ex. fuseaux horaires mélangés)
+            parts.append(values.map(
+                lambda v: label + v.strftime("%d/%m/%Y") if isinstance(v, pd.Timestamp) else None))
+    if "timings" in df.columns:
+        timings = df["timings"]
+        parts.append(("Horaires : " + timings.astype(str)).where(timings.astype(bool)))
+    return join_parts(parts, " | ", df.index)
+
+def split_coords_column(coords):
+    """Version vectorisée de split_coords : deux colonnes float (NaN si invalide)."""
+    coords = coords.where(coords.map(type).eq(str), "")
+    parts = coords.str.split(",")
+    valid = parts.str.len().eq(2)
+    lat = pd.to_numeric(parts.str[0].str.strip(), errors="coerce").where(valid)
+    lon = pd.to_numeric(parts.str[-1].str.strip(), errors="coerce").where(valid)
+    both = lat.notna() & lon.notna()
+    return lat.where(both), lon.where(both)
+
+def geo_text_column(lat, lon):
+    """Version vectorisée de format_coordinates."""
+    lat = pd.to_numeric(lat, errors="coerce")
+    lon = pd.to_numeric(lon, errors="coerce")
+    valid = lat.notna() & lon.notna()
+    out = pd.Series("", index=lat.index, dtype=object)
+    lat_text = pd.Series(np.char.mod("%.5f", lat[valid].to_numpy()), index=lat.index[valid], dtype=object)
+    lon_text = pd.Series(np.char.mod("%.5f", lon[valid].to_numpy()), index=lat.index[valid], dtype=object)
+    out[valid] = "Coordonnées : " + lat_text + ", " + lon_text
+    return out
+
+def text_column(col):
+    """Version vectorisée de convert_to_text pour une colonne entière."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return format_dates(col, with_time=True).where(col.notna(), "NaT")
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype(str).astype(object)
+    if pd.api.types.infer_dtype(col, skipna=False) == "string":
+        return col
+    # Colonne mixte : seules les cellules qui ne sont pas des chaînes passent par convert_to_text
+    out = col.astype(object).copy()
+    others = ~col.map(type).eq(str)
+    out[others] = col[others].map(convert_to_text)
+    return out
+
+def age_text_column(df):
+    """Version vectorisée de build_age_text."""
+    missing = pd.Series("", index=df.index, dtype=object)  # colonne absente : valeur "fausse" comme None
+    age_min = df["age_min"] if "age_min" in df.columns else missing
+    age_max = df["age_max"] if "age_max" in df.columns else missing
+    has_min, has_max = age_min.astype(bool), age_max.astype(bool)
+    min_text, max_text = age_min.astype(str), age_max.astype(str)
+    text = np.select(
+        [has_min & has_max, has_min, has_max],
+        ["Âge : " + min_text + " à " + max_text, "Âge : " + min_text, "Âge : " + max_text],
+        ""
+    )
+    return pd.Series(text, index=df.index, dtype=object)
+
+def join_columns(df, cols, sep=" "):
+    """Équivalent vectorisé de df[cols].agg(sep.join, axis=1) pour des colonnes texte."""
+    if not cols:
+        return pd.Series("", index=df.index, dtype=object)
+    out = df[cols[0]]
+    for col in cols[1:]:
+        out = out + sep + df[col]
+    return out
+
+# OCR (mockée dans les tests) : le Reader EasyOCR n'est créé qu'au premier usage
+_reader = None
 
-def ocr_image(url):
+def get_reader():
+    global _reader
+    if _reader is None:
+        import easyocr
+        _reader = easyocr.Reader(['fr'], gpu=False)
+    return _reader
+
+def read_text(content):
+    img = Image.open(BytesIO(content))
+    result = get_reader().readtext(img, detail=0)
+    return " ".join(result)
+
+def ocr_image(url, cache=None):
+    """
+    Texte de l'image `url`. Avec un OCRCache, l'image est revalidée
+    (ETag / Last-Modified) et l'OCR n'est relancé que pour un contenu inconnu.
+    """
     try:
         if not url or not isinstance(url, str):
             return ""
-        if url.startswith("http"):
-            response = requests.get(url, timeout=5)
-            img = Image.open(BytesIO(response.content))
-        else:
-            img = Image.open(url)
-        result = reader.readtext(img, detail=0)
-        return " ".join(result)
+        text, download = fetch_image(url, cache)
+        if download is None:
+            return text
+        start = time.perf_counter()
+        text = read_text(download["content"])
+        store_result(cache, download, text, time.perf_counter() - start)
+        return text
     except:
         return ""
 
 # ------------------------------------------------------
-# TOUT LE CODE EXÉCUTIF ICI UNIQUEMENT
+# ÉTAPES DU PIPELINE (appelées par le script ou par src/pipeline.py, lot par lot)
 # ------------------------------------------------------
-if __name__ == "__main__":
 
-    # FETCH OPENDATA
-    df_od = pd.DataFrame(fetch_all_events(BASE_URL, PARAMS))
-    print(f"Nombre d'événements OpenData récupérés : {len(df_od)}")
+COLUMN_RENAMES = {
+    "uid": "event_id",
+    "title_fr": "title",
+    "description_fr": "description",
+    "longdescription_fr": "long_description",
+    "date_start": "start_date",
+    "location_lat": "latitude",
+    "location_lon": "longitude"
+}
+
+COLS_TO_KEEP = [
+    "event_id", "title", "slug",
+    "description", "long_description", "keywords_fr", "conditions_fr",
+    "location_name", "location_address", "location_city", "location_postalcode",
+    "location_region", "location_access_fr", "location_description_fr",
+    "firstdate_begin", "firstdate_end",
+    "lastdate_begin", "lastdate_end",
+    "dates_text", "timings",
+    "age_min", "age_max",
+    "accessibility", "accessibility_label_fr",
+    "canonicalurl", "location_website", "onlineaccesslink",
+    "image",
+    "location_coordinates",
+    "geo_text"
+]
 
+COLS_VECTORISATION = ['title', 'description', 'long_description', 'ocr_text', 'dates_text', 'geo_text', 'age_text']
+
+def transform_events(df_od):
+    """Enregistrements OpenData bruts -> colonnes texte prêtes pour l'OCR (sans l'OCR)."""
     # RENAME
-    df_od = df_od.rename(columns={
-        "uid": "event_id",
-        "title_fr": "title",
-        "description_fr": "description",
-        "longdescription_fr": "long_description",
-        "date_start": "start_date",
-        "location_lat": "latitude",
-        "location_lon": "longitude"
-    })
+    df_od = df_od.rename(columns=COLUMN_RENAMES)
 
     # DATE CLEANING
     date_cols = [col for col in df_od.columns if 'date' in col.lower()]
@@ -130,72 +377,65 @@ if __name__ == "__main__":
 
     one_year_ago = datetime.now(timezone.utc) - timedelta(days=365)
     if 'firstdate_begin' in df_od.columns:
-        df_od = df_od[df_od['firstdate_begin'] >= one_year_ago]
+        df_od = df_od[df_od['firstdate_begin'] >= one_year_ago].copy()
 
-    df_od['dates_text'] = df_od.apply(build_dates, axis=1)
+    df_od['dates_text'] = dates_text_column(df_od)
 
     # COORDINATES
     if 'location_coordinates' in df_od.columns:
         df_od['location_coordinates'] = df_od['location_coordinates'].fillna('')
-        df_od['latitude'], df_od['longitude'] = zip(*df_od['location_coordinates'].apply(split_coords))
+        df_od['latitude'], df_od['longitude'] = split_coords_column(df_od['location_coordinates'])
 
-    def format_coordinates(row):
-        lat = row.get('latitude')
-        lon = row.get('longitude')
-        if pd.notnull(lat) and pd.notnull(lon):
-            return f"Coordonnées : {lat:.5f}, {lon:.5f}"
-        return ""
-
-    df_od['geo_text'] = df_od.apply(format_coordinates, axis=1)
-    df_od.drop(columns=['latitude', 'longitude'], inplace=True)
+    no_coords = pd.Series(np.nan, index=df_od.index)
+    df_od['geo_text'] = geo_text_column(df_od.get('latitude', no_coords), df_od.get('longitude', no_coords))
+    df_od.drop(columns=['latitude', 'longitude'], inplace=True, errors='ignore')
 
     # REMOVE UNUSED COLUMNS
-    cols_to_keep = [
-        "event_id", "title", "slug",
-        "description", "long_description", "keywords_fr", "conditions_fr",
-        "location_name", "location_address", "location_city", "location_postalcode",
-        "location_region", "location_access_fr", "location_description_fr",
-        "firstdate_begin", "firstdate_end",
-        "lastdate_begin", "lastdate_end",
-        "dates_text", "timings",
-        "age_min", "age_max",
-        "accessibility", "accessibility_label_fr",
-        "canonicalurl", "location_website", "onlineaccesslink",
-        "image",
-        "location_coordinates",
-        "geo_text"
-    ]
-
-    df_od = df_od[[col for col in cols_to_keep if col in df_od.columns]].copy()
+    df_od = df_od[[col for col in COLS_TO_KEEP if col in df_od.columns]].copy()
 
     # TEXT CONVERSION
     for col in df_od.columns:
-        df_od[col] = df_od[col].apply(convert_to_text)
-
-    # OCR
-    valid_urls = [u for u in df_od['image'].dropna().unique() if isinstance(u, str) and len(u) > 5]
+        df_od[col] = text_column(df_od[col])
+    return df_od
 
-    ocr_map = {}
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = {executor.submit(ocr_image, url): url for url in valid_urls}
-        for future in tqdm(as_completed(futures), total=len(futures), ncols=90, desc="OCR en cours"):
-            ocr_map[futures[future]] = future.result()
+def image_urls(df_od):
+    if 'image' not in df_od.columns:
+        return []
+    return [u for u in df_od['image'].dropna().unique() if isinstance(u, str) and len(u) > 5]
 
-    df_od['ocr_text'] = df_od['image'].map(lambda x: ocr_map.get(x, ""))
+def build_vectorise_text(df_od, ocr_map):
+    """Ajoute le texte OCR des affiches puis assemble vectorise_text."""
+    images = df_od['image'] if 'image' in df_od.columns else pd.Series("", index=df_od.index)
+    df_od['ocr_text'] = images.map(lambda x: ocr_map.get(x, ""))
 
     # TEXT FINAL
-    df_od['age_text'] = df_od.apply(
-        lambda row: f"Âge : {row['age_min']} à {row['age_max']}"
-        if row.get('age_min') and row.get('age_max')
-        else (f"Âge : {row.get('age_min')}" if row.get('age_min')
-              else (f"Âge : {row.get('age_max')}" if row.get('age_max') else "")),
-        axis=1
-    )
+    df_od['age_text'] = age_text_column(df_od)
+
+    cols_vectorisation = [col for col in COLS_VECTORISATION if col in df_od.columns]
+    df_od['vectorise_text'] = join_columns(df_od, cols_vectorisation)
+    return df_od
+
+# ------------------------------------------------------
+# TOUT LE CODE EXÉCUTIF ICI UNIQUEMENT
+# ------------------------------------------------------
+if __name__ == "__main__":
+
+    # FETCH OPENDATA
+    df_od = pd.DataFrame(fetch_all_events(BASE_URL, PARAMS))
+    print(f"Nombre d'événements OpenData récupérés : {len(df_od)}")
+
+    df_od = transform_events(df_od)
+
+    # OCR
+    valid_urls = image_urls(df_od)
 
-    cols_vectorisation = ['title', 'description', 'long_description', 'ocr_text', 'dates_text', 'geo_text', 'age_text']
-    cols_vectorisation = [col for col in cols_vectorisation if col in df_od.columns]
+    ocr_cache = OCRCache(OCR_CACHE_FILE)
+    with tqdm(total=len(valid_urls), ncols=90, desc="OCR en cours") as progress:
+        ocr_map = OCREngine(cache=ocr_cache).run(valid_urls, progress=progress.update)
+    print(ocr_cache.report())
+    ocr_cache.close()
 
-    df_od['vectorise_text'] = df_od[cols_vectorisation].agg(" ".join, axis=1)
+    df_od = build_vectorise_text(df_od, ocr_map)
 
     # EXPORT
     try:
@@ -0,0 +1,165 @@
+# %% --------------------------- IMPORTS ---------------------------
+import gc
+import os
+import threading
+import time
+
+
+# %% --------------------------- SNAPSHOT D'INDEX ---------------------------
+class IndexSnapshot:
+    """
+    Index FAISS + métadonnées (+ index de dates, attributs de filtrage et
+    index BM25) chargés ensemble, identifiés par un numéro de version.
+    """
+
+    def __init__(self, version, index, metadatas, search_params=None, date_index=None, filter_index=None,
+                 sparse_index=None, build_stamp=None):
+        self.version = version  # numéro de chargement, propre au processus
+        self.build_stamp = build_stamp  # (mtime_ns, taille) du fichier surveillé : identique dans tous les workers
+        self.index = index
+        self.metadatas = metadatas
+        self.search_params = search_params
+        self.date_index = date_index
+        self.filter_index = filter_index
+        self.sparse_index = sparse_index
+        self.loaded_at = time.time()
+
+    def info(self):
+        return {
+            "version": self.version,
+            "vectors": int(self.index.ntotal),
+            "dimension": int(self.index.d),
+            "dated_events": len(self.date_index) if self.date_index is not None else None,
+            "sparse_terms": len(self.sparse_index.vocabulary) if self.sparse_index is not None else None,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            # Build servi (date d'écriture du manifeste) : comparable d'un worker à l'autre
+            "built_at": (time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.build_stamp[0] / 1e9))
+                         if self.build_stamp else None),
+            "worker": os.getpid()
+        }
+
+
+# %% --------------------------- RETRIEVER VERSIONNÉ ---------------------------
+class Retriever:
+    """
+    Donne accès à l'index courant et permet de le remplacer sans interruption.
+
+    Une requête lit `retriever.current` une seule fois et travaille sur ce
+    snapshot jusqu'au bout. `reload()` charge le nouveau couple index +
+    métadonnées à côté de l'ancien, le valide, puis remplace la référence
+    (affectation atomique) : les requêtes en cours finissent sur l'ancien
+    snapshot, les suivantes utilisent le nouveau. L'ancien est libéré dès
+    que plus aucune requête ne le référence.
+
+    Avec `watch_file` (le manifeste, écrit en dernier par chaque build), un
+    accès à `current` vérifie au plus toutes les `check_interval` secondes
+    si le fichier a changé et recharge alors en arrière-plan : chaque worker
+    uvicorn, processus séparé, suit ainsi le dernier build même si /rebuild
+    n'a été reçu que par l'un d'eux.
+    """
+
+    def __init__(self, load_index, load_metadatas, make_search_params=None, expected_dim=None,
+                 load_date_index=None, make_filter_index=None, load_sparse_index=None,
+                 watch_file=None, check_interval=2.0):
+        self._load_index = load_index
+        self._load_metadatas = load_metadatas
+        self._load_date_index = load_date_index
+        self._make_filter_index = make_filter_index  # (métadonnées, index de dates) -> FilterIndex
+        self._load_sparse_index = load_sparse_index
+        self._make_search_params = make_search_params
+        self._expected_dim = expected_dim  # callable renvoyant la dimension du modèle d'embedding
+        self._reload_lock = threading.Lock()
+        self._current = None
+        self._version = 0
+        self._watch_file = watch_file
+        self._check_interval = check_interval
+        self._next_check = 0.0
+        self._refreshing = False
+        self._failed_stamp = None  # build dont le chargement a échoué : pas de nouvel essai en boucle
+
+    @property
+    def current(self):
+        if self._current is None:
+            with self._reload_lock:
+                if self._current is None:
+                    self._publish(self._load_snapshot())
+        elif self._watch_file is not None:
+            self._check_for_update()
+        return self._current
+
+    def _stamp(self):
+        if self._watch_file is None:
+            return None
+        try:
+            stat = os.stat(self._watch_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _check_for_update(self):
+        now = time.monotonic()
+        if now < self._next_check or self._refreshing:
+            return
+        self._next_check = now + self._check_interval
+        stamp = self._stamp()
+        if stamp != self._current.build_stamp and stamp != self._failed_stamp:
+            # Rechargement en arrière-plan : les requêtes continuent sur le snapshot courant
+            self._refreshing = True
+            threading.Thread(target=self.refresh, daemon=True).start()
+
+    def refresh(self):
+        """Recharge si le fichier surveillé a changé depuis le snapshot courant. Renvoie le snapshot servi."""
+        try:
+            with self._reload_lock:
+                stamp = self._stamp()
+                if self._current is not None and stamp == self._current.build_stamp:
+                    return self._current
+                try:
+                    self._publish(self._load_snapshot())
+                except Exception as e:
+                    self._failed_stamp = stamp
+                    print(f"Rechargement de l'index modifié sur disque impossible : {e}")
+                return self._current
+        finally:
+            self._refreshing = False
+
+    def _load_snapshot(self):
+        stamp = self._stamp()  # lu avant les fichiers : un build écrit pendant le chargement sera rechargé
+        index = self._load_index()
+        metadatas = self._load_metadatas()
+        self.validate(index, metadatas)
+        params = self._make_search_params(index) if self._make_search_params else None
+        date_index = self._load_date_index() if self._load_date_index else None
+        filter_index = self._make_filter_index(metadatas, date_index) if self._make_filter_index else None
+        sparse_index = self._load_sparse_index() if self._load_sparse_index else None
+        if sparse_index is not None and len(sparse_index) != index.ntotal:
+            print(f"Index BM25 ({len(sparse_index)} chunks) désynchronisé de l'index FAISS : ignoré")
+            sparse_index = None
+        # Numéro de version attribué, mais pris seulement à la publication (un build en échec n'en consomme pas)
+        return IndexSnapshot(self._version + 1, index, metadatas, params, date_index, filter_index, sparse_index,
+                             stamp)
+
+    def _publish(self, snapshot):
+        old, self._current = self._current, snapshot
+        self._version = snapshot.version
+        return old
+
+    def validate(self, index, metadatas):
+        """Vérifie la cohérence d'un index et de ses métadonnées avant publication."""
+        if self._expected_dim is not None:
+            dim = self._expected_dim()
+            if index.d != dim:
+                raise ValueError(f"Dimension de l'index ({index.d}) différente de celle du modèle ({dim}).")
+        if index.ntotal != len(metadatas):
+            raise ValueError(
+                f"L'index contient {index.ntotal} vecteurs mais les métadonnées {len(metadatas)} entrées."
+            )
+
+    def reload(self):
+        """Charge, valide puis publie un nouveau snapshot. En cas d'erreur l'ancien reste actif."""
+        with self._reload_lock:
+            snapshot = self._load_snapshot()
+            old = self._publish(snapshot)
+        del old
+        gc.collect()  # libère au plus tôt l'ancien index si plus aucune requête ne l'utilise
+        return snapshot
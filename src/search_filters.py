@@ -0,0 +1,195 @@
+# %% --------------------------- IMPORTS ---------------------------
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# %% --------------------------- CONFIG ---------------------------
+# Champs d'événement utilisés par les filtres (copiés dans les métadonnées des chunks)
+FILTER_FIELDS = ["location_postalcode", "age_min", "age_max"]
+# Recherche sans sélecteur puis filtrage : candidats demandés = k × FILTER_OVERFETCH
+FILTER_OVERFETCH = int(os.getenv("FILTER_OVERFETCH", "10"))
+# Sélecteurs FAISS gardés par FilterIndex (donc par version d'index), par jeu de contraintes
+FILTER_SELECTOR_CACHE = int(os.getenv("FILTER_SELECTOR_CACHE", "128"))
+
+
+def normalize_postal_code(code):
+    """« 3 », « 3e », « 69003 » -> « 69003 » (arrondissements de Lyon)."""
+    code = str(code).strip().lower().rstrip("eèmr ")
+    if code.isdigit() and len(code) <= 2:
+        return f"690{int(code):02d}"
+    return code
+
+
+# %% --------------------------- CONTRAINTES ---------------------------
+class SearchFilters:
+    """
+    Contraintes structurées d'une recherche : période [date_from, date_to],
+    codes postaux (ou numéros d'arrondissement) et âge du participant.
+    Un champ à None n'impose rien.
+    """
+
+    def __init__(self, date_from=None, date_to=None, postal_codes=None, age=None):
+        if date_from is not None and date_to is not None and date_to < date_from:
+            raise ValueError("date_to doit être postérieure à date_from")
+        self.date_from = date_from
+        self.date_to = date_to
+        self.postal_codes = sorted({normalize_postal_code(c) for c in postal_codes}) if postal_codes else None
+        self.age = age
+
+    @property
+    def window(self):
+        if self.date_from is None and self.date_to is None:
+            return None
+        return (self.date_from or date.min, self.date_to or date.max)
+
+    def is_empty(self):
+        return self.window is None and not self.postal_codes and self.age is None
+
+    def key(self):
+        """Clé hashable (portée du cache de réponses)."""
+        return (self.date_from, self.date_to, tuple(self.postal_codes or ()), self.age)
+
+    def __repr__(self):
+        return (f"SearchFilters(date_from={self.date_from}, date_to={self.date_to}, "
+                f"postal_codes={self.postal_codes}, age={self.age})")
+
+
+# %% --------------------------- INDEX DES ATTRIBUTS ---------------------------
+def _numbers(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype="float64")
+
+
+class FilterIndex:
+    """
+    Attributs des événements en tableaux numpy (une ligne par événement) et
+    correspondance vecteur -> événement : une contrainte se traduit en masque
+    sur les événements puis en tableau trié d'ids de vecteurs autorisés,
+    directement utilisable par un IDSelector FAISS.
+
+    Un FilterIndex est construit avec chaque snapshot : les sélecteurs qu'il
+    met en cache (par clé de filtre) ne survivent pas à un rechargement.
+    """
+
+    def __init__(self, event_ids, postal_codes, age_min, age_max, vector_ids, event_rows, date_index=None):
+        self.event_ids = np.asarray(event_ids, dtype=object)
+        self.postal_codes = np.asarray([normalize_postal_code(c) for c in postal_codes], dtype=object)
+        self.age_min = _numbers(age_min)
+        self.age_max = _numbers(age_max)
+        self.vector_ids = np.asarray(vector_ids, dtype="int64")
+        self.event_rows = np.asarray(event_rows, dtype="int64")
+        self.date_index = date_index
+        self._selections = OrderedDict()  # filters.key() -> (ids autorisés, IDSelectorBatch)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_metadatas(cls, metadatas, date_index=None):
+        """Depuis le MetadataStore (colonnes Arrow, sans matérialiser les chunks) ou un dict id -> métadonnées."""
+        if hasattr(metadatas, "event_rows"):
+            def column(name):
+                if name not in metadatas.event_fields:
+                    return [""] * metadatas.events.num_rows
+                return metadatas.events.column(name).to_pylist()
+            return cls(column("event_id"), column("location_postalcode"), column("age_min"),
+                       column("age_max"), metadatas.vector_ids, metadatas.event_rows, date_index)
+
+        rows, events, vector_ids, event_rows = {}, [], [], []
+        for vector_id, meta in metadatas.items():
+            eid = meta.get("event_id", "")
+            if eid not in rows:
+                rows[eid] = len(events)
+                events.append(meta)
+            vector_ids.append(vector_id)
+            event_rows.append(rows[eid])
+        return cls([m.get("event_id", "") for m in events],
+                   *([m.get(f, "") for m in events] for f in FILTER_FIELDS),
+                   vector_ids, event_rows, date_index)
+
+    def event_mask(self, filters):
+        mask = np.ones(len(self.event_ids), dtype=bool)
+        if filters.window is not None:
+            if self.date_index is None:
+                warnings.warn("Période demandée mais aucun index de dates chargé : filtre de dates ignoré",
+                              RuntimeWarning, stacklevel=2)
+            else:
+                active = self.date_index.overlapping(*filters.window)
+                mask &= np.isin(self.event_ids, list(active))
+        if filters.postal_codes:
+            mask &= np.isin(self.postal_codes, filters.postal_codes)
+        if filters.age is not None:
+            # Bornes inconnues : pas de restriction d'âge
+            mask &= ~(self.age_min > filters.age) & ~(self.age_max < filters.age)
+        return mask
+
+    def allowed_ids(self, filters):
+        """Ids (triés) des vecteurs dont l'événement respecte les contraintes."""
+        return np.sort(self.vector_ids[self.event_mask(filters)[self.event_rows]])
+
+    def selection(self, filters, max_entries=FILTER_SELECTOR_CACHE):
+        """(ids autorisés, IDSelector) pour ces contraintes, calculés une fois par clé de filtre."""
+        key = filters.key()
+        with self._lock:
+            cached = self._selections.get(key)
+            if cached is not None:
+                self._selections.move_to_end(key)
+                return cached
+        allowed = self.allowed_ids(filters)
+        allowed.flags.writeable = False  # partagé entre requêtes, lu par le sélecteur
+        selection = (allowed, make_selector(allowed) if len(allowed) else None)
+        with self._lock:
+            self._selections[key] = selection
+            while len(self._selections) > max_entries:
+                self._selections.popitem(last=False)
+        return selection
+
+
+# %% --------------------------- RECHERCHE FILTRÉE ---------------------------
+def make_selector(allowed_ids):
+    """IDSelectorBatch sur `allowed_ids` (int64 contigu, à garder en vie aussi longtemps que lui)."""
+    import faiss
+    return faiss.IDSelectorBatch(len(allowed_ids), faiss.swig_ptr(allowed_ids))
+
+
+def filtered_search(index, q_vecs, k, allowed_ids, make_params, overfetch=FILTER_OVERFETCH, selector=None):
+    """
+    Recherche limitée aux vecteurs `allowed_ids`.
+
+    La recherche passe d'abord par un IDSelector FAISS (`make_params(sel)`
+    renvoie les paramètres de recherche de l'index avec ce sélecteur). Si
+    l'index ne gère pas les sélecteurs, ou si une ligne revient avec moins de
+    résultats que possible (index approché), on recherche k × overfetch
+    candidats sans filtre et on garde ceux qui sont autorisés.
+    `selector` : sélecteur déjà construit sur `allowed_ids` (FilterIndex.selection).
+    Renvoie (D, I) comme index.search (-1 pour les places vides).
+    """
+    q_vecs = np.asarray(q_vecs, dtype="float32")
+    allowed_ids = np.ascontiguousarray(allowed_ids, dtype="int64")  # lu par swig_ptr
+    D = np.full((len(q_vecs), k), -np.inf, dtype="float32")
+    I = np.full((len(q_vecs), k), -1, dtype="int64")
+    if len(allowed_ids) == 0:
+        return D, I
+
+    expected = min(k, len(allowed_ids))
+    if selector is None:
+        selector = make_selector(allowed_ids)
+    try:
+        D, I = index.search(q_vecs, k, params=make_params(selector))
+        missing = np.flatnonzero((I != -1).sum(axis=1) < expected)
+    except RuntimeError:  # sélecteurs non pris en charge par cet index
+        missing = np.arange(len(q_vecs))
+
+    if len(missing):
+        D_all, I_all = index.search(q_vecs[missing], min(k * overfetch, index.ntotal), params=make_params(None))
+        for row, d_row, i_row in zip(missing, D_all, I_all):
+            keep = (i_row != -1) & np.isin(i_row, allowed_ids, assume_unique=False)
+            found = i_row[keep][:k]
+            if len(found) > (I[row] != -1).sum():
+                I[row] = -1
+                D[row] = -np.inf
+                I[row, :len(found)] = found
+                D[row, :len(found)] = d_row[keep][:k]
+    return D, I
@@ -0,0 +1,193 @@
+# %% --------------------------- IMPORTS ---------------------------
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+# %% --------------------------- CONFIG ---------------------------
+DB_DIR = Path(__file__).resolve().parent.parent / "db"
+SPARSE_INDEX_FILE = DB_DIR / "sparse_index.npz"  # index BM25 des chunks (listes inversées CSR)
+
+BM25_K1 = 1.2   # saturation de la fréquence d'un terme
+BM25_B = 0.75   # normalisation par la longueur du chunk
+RRF_K = 60      # constante de la fusion par rangs réciproques
+
+STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette d dans de des du elle en est et il ils je l la le les leur leurs
+lui ma mais me mes mon n ne nos notre nous on ou par pas pour qu que quel quels quelle quelles
+qui quoi s sa se ses son sont sur ta te tes ton tu un une vos votre vous y
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Texte -> termes : minuscules, sans accents, sans mots vides ni lettres isolées."""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN.findall(text) if len(t) > 1 and t not in STOPWORDS]
+
+
+def document_text(meta):
+    """Texte indexé pour un chunk : titre de l'événement (noms propres) + texte du chunk."""
+    return f"{meta.get('title', '')} {meta.get('chunk', '')}"
+
+
+# %% --------------------------- INDEX BM25 ---------------------------
+class SparseIndex:
+    """
+    Index BM25 des chunks, en listes inversées au format CSR.
+
+    Les postings du terme t sont docs[indptr[t]:indptr[t + 1]] (positions des
+    chunks, int32) et leurs poids BM25 complets sont précalculés au build
+    (float32) : une requête se résume à concaténer quelques tranches et à
+    sommer les poids par chunk, sans aucun calcul par document non touché.
+
+    Les fréquences brutes (tfs) et longueurs des chunks sont gardées avec
+    l'index : un build incrémental ne tokenise que les chunks ajoutés
+    (voir `updated`), les poids étant recalculés sur l'ensemble.
+    """
+
+    def __init__(self, vocabulary, indptr, docs, weights, vector_ids, tfs=None, lengths=None):
+        self.vocabulary = np.asarray(vocabulary, dtype=str)
+        self.indptr = np.asarray(indptr, dtype="int64")
+        self.docs = np.asarray(docs, dtype="int32")
+        self.weights = np.asarray(weights, dtype="float32")
+        self.vector_ids = np.asarray(vector_ids, dtype="int64")
+        # None pour un index sauvegardé avant leur ajout : pas de mise à jour incrémentale
+        self.tfs = None if tfs is None else np.asarray(tfs, dtype="int32")
+        self.lengths = None if lengths is None else np.asarray(lengths, dtype="int32")
+        self._terms = {t: i for i, t in enumerate(self.vocabulary.tolist())}
+
+    def __len__(self):
+        return len(self.vector_ids)
+
+    @staticmethod
+    def _postings(texts, offset=0):
+        """Tokenise les textes : (terme, position du chunk, tf) par posting et longueur de chaque chunk."""
+        terms, docs, tfs = [], [], []
+        lengths = np.zeros(len(texts), dtype="int32")
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[position] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                terms.append(term)
+                docs.append(offset + position)
+                tfs.append(tf)
+        return (np.asarray(terms, dtype=str), np.asarray(docs, dtype="int32"),
+                np.asarray(tfs, dtype="int32"), lengths)
+
+    @classmethod
+    def _assemble(cls, terms, docs, tfs, lengths, vector_ids, k1, b):
+        """Index CSR (postings triés par terme puis par chunk) et poids BM25 à partir des postings bruts."""
+        vocabulary, term_ids = np.unique(terms, return_inverse=True)
+        order = np.lexsort((docs, term_ids))
+        term_ids, docs, tfs = term_ids[order], docs[order], tfs[order]
+        df = np.bincount(term_ids, minlength=len(vocabulary))
+        indptr = np.concatenate([[0], np.cumsum(df)])
+
+        n_docs = len(lengths)
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        avg_length = lengths.mean() if n_docs and lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * lengths[docs] / avg_length)
+        weights = idf[term_ids] * tfs * (k1 + 1) / (tfs + norm)
+        return cls(vocabulary, indptr, docs, weights, vector_ids, tfs, lengths)
+
+    @classmethod
+    def build(cls, texts, vector_ids, k1=BM25_K1, b=BM25_B):
+        """Construit l'index à partir des textes des chunks et de leurs ids de vecteurs."""
+        terms, docs, tfs, lengths = cls._postings(texts)
+        return cls._assemble(terms, docs, tfs, lengths, vector_ids, k1, b)
+
+    def updated(self, vector_ids, new_texts, new_vector_ids, k1=BM25_K1, b=BM25_B):
+        """
+        Nouvel index : chunks absents de `vector_ids` retirés, `new_texts`
+        (ids `new_vector_ids`) tokenisés et ajoutés. Les postings des autres
+        chunks sont repris tels quels.
+        """
+        if self.tfs is None:
+            raise ValueError("Index BM25 sans fréquences brutes : reconstruction complète nécessaire")
+        keep = np.isin(self.vector_ids, vector_ids)
+        new_positions = np.cumsum(keep) - 1  # ancienne position -> position dans le nouvel index
+        posting_keep = keep[self.docs]
+        terms = np.repeat(self.vocabulary, np.diff(self.indptr))[posting_keep]
+        docs = new_positions[self.docs[posting_keep]].astype("int32")
+        added = self._postings(new_texts, offset=int(keep.sum()))
+        return self._assemble(
+            np.concatenate([terms, added[0]]), np.concatenate([docs, added[1]]),
+            np.concatenate([self.tfs[posting_keep], added[2]]), np.concatenate([self.lengths[keep], added[3]]),
+            np.concatenate([self.vector_ids[keep], np.asarray(new_vector_ids, dtype="int64")]), k1, b
+        )
+
+    @classmethod
+    def from_metadatas(cls, metadatas, previous=None):
+        """
+        Depuis un dict vector_id -> métadonnées (build). Avec `previous` (index
+        du build précédent, ids jamais réutilisés), seuls les chunks qu'il ne
+        contient pas sont tokenisés.
+        """
+        vector_ids = sorted(metadatas)
+        if previous is None or previous.tfs is None:
+            return cls.build([document_text(metadatas[i]) for i in vector_ids], vector_ids)
+        new_ids = np.setdiff1d(np.asarray(vector_ids, dtype="int64"), previous.vector_ids)
+        return previous.updated(vector_ids, [document_text(metadatas[int(i)]) for i in new_ids], new_ids)
+
+    def save(self, path=SPARSE_INDEX_FILE):
+        raw = {} if self.tfs is None else {"tfs": self.tfs, "lengths": self.lengths}
+        with open(path, "wb") as f:
+            np.savez(f, vocabulary=self.vocabulary, indptr=self.indptr, docs=self.docs,
+                     weights=self.weights, vector_ids=self.vector_ids, **raw)
+
+    @classmethod
+    def load(cls, path=SPARSE_INDEX_FILE):
+        """Index sauvegardé au build, ou None s'il n'existe pas (ancien build)."""
+        if not Path(path).exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            raw = (data["tfs"], data["lengths"]) if "tfs" in data.files else (None, None)
+            return cls(data["vocabulary"], data["indptr"], data["docs"], data["weights"], data["vector_ids"], *raw)
+
+    def search(self, query, k, allowed_ids=None):
+        """
+        (scores, vector_ids) des k chunks de meilleur score BM25 pour la requête,
+        éventuellement restreints aux ids `allowed_ids` (tableau trié).
+        Seuls les chunks qui contiennent au moins un terme sont renvoyés.
+        """
+        rows = [self._terms[t] for t in set(tokenize(query)) if t in self._terms]
+        if not rows:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+        docs = np.concatenate([self.docs[self.indptr[r]:self.indptr[r + 1]] for r in rows])
+        weights = np.concatenate([self.weights[self.indptr[r]:self.indptr[r + 1]] for r in rows])
+        # Accumulation sur les seuls chunks touchés (tri des postings concaténés) : aucun
+        # tableau de la taille du corpus, le coût suit le nombre de postings lus
+        touched, slots = np.unique(docs, return_inverse=True)
+        scores = np.bincount(slots, weights=weights, minlength=len(touched))
+        if allowed_ids is not None:
+            keep = np.isin(self.vector_ids[touched], allowed_ids)
+            touched, scores = touched[keep], scores[keep]
+        if len(touched) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            touched, scores = touched[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return scores[order].astype("float32"), self.vector_ids[touched[order]]
+
+
+# %% --------------------------- FUSION ---------------------------
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """
+    Fusionne des classements d'ids (meilleur en premier, -1 ignoré) :
+    score(id) = Σ 1 / (rrf_k + rang). Renvoie (scores, ids) des k meilleurs,
+    complétés par -inf / -1 comme index.search.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, vector_id in enumerate(int(i) for i in ranking if i != -1):
+            fused[vector_id] = fused.get(vector_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    scores = np.full(k, -np.inf, dtype="float32")
+    ids = np.full(k, -1, dtype="int64")
+    scores[:len(best)] = [s for _, s in best]
+    ids[:len(best)] = [i for i, _ in best]
+    return scores, ids
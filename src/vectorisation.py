@@ -1,19 +1,112 @@
 # %% --------------------------- IMPORTS ---------------------------
+import os
 import pandas as pd
 import re
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
-from sentence_transformers import SentenceTransformer
+from bs4.dammit import EntitySubstitution, UnicodeDammit
 
 # %% --------------------------- CONFIG ---------------------------
 INPUT_FILENAME = "src/evenements_lyon_prets.feather"
 OUTPUT_FILENAME_VECTOR = "src/evenements_lyon_vectorises.jsonl"
 MODEL_NAME = "all-MiniLM-L6-v2"
 BATCH_SIZE = 64
-
-
-# %% --------------------------- FUNCTIONS ---------------------------
-def clean_text(text):
-    """Nettoie un texte HTML pour la vectorisation."""
+CLEAN_WORKERS = int(os.getenv("CLEAN_WORKERS", str(os.cpu_count() or 1)))  # processus pour clean_text
+CLEAN_CHUNK_SIZE = 2000  # textes par lot envoyé à un processus
+
+
+# %% --------------------------- NETTOYAGE HTML ---------------------------
+# Balises dont le texte n'est pas rendu par BeautifulSoup.get_text()
+HIDDEN_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+# Éléments vides : html.parser n'émet pas de balise fermante pour <br>, <img>...
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+             "link", "menuitem", "meta", "param", "source", "track", "wbr",
+             "basefont", "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer"}
+
+
+class TextExtractor(HTMLParser):
+    """
+    Extrait le texte visible d'un fragment HTML sans construire d'arbre.
+
+    Reproduit le découpage de BeautifulSoup(text, "html.parser") : le texte
+    est coupé à chaque balise, les entités sont décodées de la même façon,
+    commentaires / déclarations / contenu de <script>, <style>... sont ignorés.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts = []           # morceaux de texte visibles
+        self.current = []         # texte en cours, jusqu'à la prochaine balise
+        self.stack = []           # balises ouvertes
+        self.hidden = []          # positions dans stack des balises à texte caché
+        self.already_closed = []  # éléments vides dont une balise fermante peut suivre
+
+    def end_data(self, visible=True):
+        if self.current:
+            if visible and not self.hidden:
+                self.parts.append("".join(self.current))
+            self.current = []
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self.end_data()
+        if tag in HIDDEN_TEXT_TAGS:
+            self.hidden.append(len(self.stack))
+        self.stack.append(tag)
+        if handle_empty_element and tag in VOID_TAGS:
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed:
+            self.already_closed.remove(tag)
+            return
+        self.end_data()
+        if tag not in self.stack:
+            return
+        while self.stack:  # ferme aussi les balises restées ouvertes à l'intérieur
+            name = self.stack.pop()
+            if self.hidden and self.hidden[-1] == len(self.stack):
+                self.hidden.pop()
+            if name == tag:
+                break
+
+    def handle_data(self, data):
+        self.current.append(data)
+
+    def handle_charref(self, name):
+        code = int(name[1:], 16) if name[:1] in ("x", "X") else int(name)
+        self.current.append(UnicodeDammit.numeric_character_reference(code)[0])
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.current.append(character if character is not None else "&" + name)
+
+    def handle_comment(self, data):
+        self.end_data()
+
+    def handle_decl(self, decl):
+        self.end_data()
+
+    def handle_pi(self, data):
+        self.end_data()
+
+    def unknown_decl(self, data):
+        self.end_data()
+        if data.upper().startswith("CDATA["):  # texte CDATA : visible même dans <script>
+            self.parts.append(data[len("CDATA["):])
+
+    def close(self):
+        super().close()
+        self.end_data()
+
+
+def clean_text_reference(text):
+    """Nettoyage d'origine (arbre BeautifulSoup complet) : référence des tests."""
     if not text:
         return ""
 
@@ -25,17 +118,52 @@ def clean_text(text):
     return text.strip()
 
 
+def clean_text(text):
+    """Nettoie un texte HTML pour la vectorisation (même résultat que clean_text_reference)."""
+    if not text:
+        return ""
+    if not isinstance(text, str):
+        return clean_text_reference(text)
+    if "<" in text or "&" in text:
+        try:
+            extractor = TextExtractor()
+            extractor.feed(text)
+            extractor.close()
+        except Exception:
+            return clean_text_reference(text)
+        text = " ".join(extractor.parts)
+    # Équivaut aux deux re.sub + strip : str.split() coupe sur les mêmes espaces Unicode que \s
+    return " ".join(text.split())
+
+
+def _clean_chunk(texts):
+    return [clean_text(t) for t in texts]
+
+
+def clean_texts(texts, workers=CLEAN_WORKERS, chunk_size=CLEAN_CHUNK_SIZE):
+    """clean_text sur une liste, répartie par lots sur plusieurs processus si elle est grande."""
+    texts = list(texts)
+    if workers <= 1 or len(texts) <= chunk_size:
+        return _clean_chunk(texts)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [t for cleaned in executor.map(_clean_chunk, chunks) for t in cleaned]
+
+
+# %% --------------------------- FUNCTIONS ---------------------------
+
+
 def load_dataframe(path):
     """Charge le dataframe brut."""
     return pd.read_feather(path)
 
 
-def preprocess_dataframe(df):
+def preprocess_dataframe(df, workers=CLEAN_WORKERS):
     """Nettoyage des champs pour vectorisation."""
     if "vectorise_text" not in df.columns:
         raise ValueError("La colonne 'vectorise_text' est manquante.")
 
-    df["vectorise_text"] = df["vectorise_text"].apply(clean_text)
+    df["vectorise_text"] = clean_texts(df["vectorise_text"].tolist(), workers=workers)
     return df
 
 
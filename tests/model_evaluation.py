@@ -16,7 +16,7 @@ SRC_DIR = BASE_DIR / "src"
 sys.path.insert(0, str(SRC_DIR))
 
 
-from chatbot import chatbot_ask  # ton chatbot
+from chatbot import chatbot_ask_batch  # ton chatbot
 
 nest_asyncio.apply()
 
@@ -36,12 +36,15 @@ ground_truths = [ex["ground_truth_answer"] for ex in examples]
 placeholder_contexts = [ex["ground_truth_context"] for ex in examples]
 
 # Générer les réponses et récupérer le contexte utilisé par le chatbot
+# (un seul encodage groupé, une recherche FAISS et des appels Mistral concurrents)
 answers = []
 retrieved_contexts = []
-for q in questions_test:
-    ans, ctx = chatbot_ask(q)
-    answers.append(ans)
-    retrieved_contexts.append(ctx)
+for q, result in zip(questions_test, chatbot_ask_batch(questions_test)):
+    if isinstance(result, Exception):
+        print(f"⚠️ Échec pour « {q} » : {result}")
+        result = ("", [])
+    answers.append(result[0])
+    retrieved_contexts.append(result[1])
 
 # ----------------- PREPARATION DATASET RAGAS ----------------- #
 evaluation_data = {
@@ -3,7 +3,7 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import logging
 from api.main import app  # adapte selon ton chemin réel
 
@@ -17,10 +17,10 @@ client = TestClient(app)
 # -----------------------------
 # TEST /ask
 # -----------------------------
-@patch("api.main.chatbot_ask")
+@patch("api.main.chatbot_ask_async", new_callable=AsyncMock)
 def test_ask_success(mock_chatbot):
     logger.info("Test /ask success démarré")
-    mock_chatbot.return_value = "Réponse simulée"
+    mock_chatbot.return_value = ("Réponse simulée", [])
 
     payload = {"question": "Quels événements ont lieu aujourd’hui ?"}
     response = client.post("/ask", json=payload)
@@ -43,7 +43,7 @@ def test_ask_empty_question():
     logger.info("Test /ask question vide terminé")
 
 
-@patch("api.main.chatbot_ask", side_effect=Exception("Erreur interne"))
+@patch("api.main.chatbot_ask_async", new_callable=AsyncMock, side_effect=Exception("Erreur interne"))
 def test_ask_internal_error(mock_chatbot):
     logger.info("Test /ask internal error démarré")
     response = client.post("/ask", json={"question": "Test"})
@@ -54,28 +54,49 @@ def test_ask_internal_error(mock_chatbot):
     logger.info("Test /ask internal error terminé")
 
 
+# -----------------------------
+# TEST /ask/stream
+# -----------------------------
+@patch("api.main.chatbot_ask_stream")
+def test_ask_stream_sources_then_tokens(mock_stream):
+    logger.info("Test /ask/stream démarré")
+
+    async def fake_stream(question):
+        yield "sources", ["Concert au parc"]
+        yield "token", "Bonjour"
+        yield "token", " !"
+
+    mock_stream.side_effect = fake_stream
+    response = client.post("/ask/stream", json={"question": "Quoi ce soir ?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line.split(": ", 1)[1] for line in response.text.splitlines() if line.startswith("event:")]
+    logger.info("Événements reçus: %s", events)
+    assert events == ["sources", "token", "token", "done"]
+    logger.info("Test /ask/stream terminé")
+
+
 # -----------------------------
 # TEST /rebuild
 # -----------------------------
-@patch("api.main.faiss.read_index")
-@patch("api.main.pickle.load")
-def test_rebuild_success(mock_pickle, mock_faiss):
+@patch("api.main.reload_index")
+def test_rebuild_success(mock_reload):
     logger.info("Test /rebuild success démarré")
-    mock_faiss.return_value = MagicMock()
-    mock_pickle.return_value = [{"id": 1}]
+    mock_reload.return_value.info.return_value = {"version": 2, "vectors": 10}
 
     response = client.get("/rebuild")
     logger.info("Réponse reçue: %s", response.json())
 
     assert response.status_code == 200
     assert response.json()["status"] == "success"
-    mock_faiss.assert_called_once()
-    mock_pickle.assert_called_once()
+    assert response.json()["index"]["version"] == 2
+    mock_reload.assert_called_once()
     logger.info("Test /rebuild success terminé")
 
 
-@patch("api.main.faiss.read_index", side_effect=Exception("FAISS cassé"))
-def test_rebuild_failure(mock_faiss):
+@patch("api.main.reload_index", side_effect=Exception("FAISS cassé"))
+def test_rebuild_failure(mock_reload):
     logger.info("Test /rebuild failure démarré")
     response = client.get("/rebuild")
     logger.info("Réponse reçue: %s", response.json())
@@ -83,3 +104,63 @@ def test_rebuild_failure(mock_faiss):
     assert response.status_code == 500
     assert response.json()["detail"] == "FAISS cassé"
     logger.info("Test /rebuild failure terminé")
+
+
+# -----------------------------
+# TEST /ask/batch
+# -----------------------------
+@patch("api.main.chatbot_ask_batch_async", new_callable=AsyncMock)
+def test_ask_batch_keeps_order_and_item_errors(mock_batch):
+    mock_batch.return_value = [("Réponse A", ["ctx A"]), Exception("Mistral indisponible"), ("Réponse C", [])]
+
+    payload = {"questions": ["Question A", "  ", "Question B", "Question C"]}
+    response = client.post("/ask/batch", json=payload)
+    logger.info("Réponse reçue: %s", response.json())
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["count"], body["errors"]) == (4, 2)
+    results = body["results"]
+    assert [r["question"] for r in results] == ["Question A", "", "Question B", "Question C"]
+    assert results[0]["response"] == "Réponse A" and results[0]["metadata"] == ["ctx A"]
+    assert "ne peut pas être vide" in results[1]["error"]
+    assert results[2]["error"] == "Mistral indisponible"
+    assert results[3]["response"] == "Réponse C"
+    # Les questions valides sont traitées en un seul appel groupé
+    mock_batch.assert_called_once_with(["Question A", "Question B", "Question C"])
+
+
+def test_ask_batch_rejects_empty_list():
+    response = client.post("/ask/batch", json={"questions": []})
+    assert response.status_code == 422
+
+
+@patch("api.main.chatbot_ask_batch_async", new_callable=AsyncMock, side_effect=Exception("FAISS cassé"))
+def test_ask_batch_internal_error(mock_batch):
+    response = client.post("/ask/batch", json={"questions": ["Test"]})
+    assert response.status_code == 500
+    assert response.json()["detail"] == "FAISS cassé"
+
+
+# -----------------------------
+# TEST filtres de recherche
+# -----------------------------
+@patch("api.main.chatbot_ask_async", new_callable=AsyncMock)
+def test_ask_with_filters(mock_chatbot):
+    mock_chatbot.return_value = ("Réponse filtrée", [])
+    payload = {
+        "question": "Quels spectacles pour enfants ?",
+        "filters": {"date_from": "2025-07-01", "date_to": "2025-07-31", "postal_codes": ["3"], "age": 8}
+    }
+    response = client.post("/ask", json=payload)
+
+    assert response.status_code == 200
+    filters = mock_chatbot.call_args.kwargs["filters"]
+    assert (filters.date_from.isoformat(), filters.date_to.isoformat()) == ("2025-07-01", "2025-07-31")
+    assert (filters.postal_codes, filters.age) == (["69003"], 8)
+
+
+def test_ask_rejects_inverted_date_window():
+    payload = {"question": "Test", "filters": {"date_from": "2025-08-01", "date_to": "2025-07-01"}}
+    response = client.post("/ask", json=payload)
+    assert response.status_code == 422
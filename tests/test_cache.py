@@ -0,0 +1,96 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import numpy as np
+
+from src.cache import SemanticCache, EmbeddingCache
+
+
+def unit(*values):
+    v = np.array(values, dtype="float32")
+    return v / np.linalg.norm(v)
+
+
+# ----------------------------- SEMANTIC CACHE ----------------------------- #
+
+def test_semantic_cache_hit_above_threshold():
+    cache = SemanticCache(threshold=0.9)
+    cache.put(unit(1, 0, 0), "2025-12-05", "réponse week-end")
+
+    assert cache.get(unit(1, 0.1, 0), "2025-12-05") == "réponse week-end"
+    assert cache.get(unit(0, 1, 0), "2025-12-05") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_semantic_cache_expires_with_scope():
+    cache = SemanticCache(threshold=0.9)
+    cache.put(unit(1, 0, 0), "2025-12-05", "réponse d'hier")
+
+    assert cache.get(unit(1, 0, 0), "2025-12-06") is None
+    cache.put(unit(0, 1, 0), "2025-12-06", "réponse du jour")   # purge à l'insertion
+    assert cache.stats()["entries"] == 1
+    assert cache.get(unit(1, 0, 0), "2025-12-06") is None
+
+
+def test_semantic_cache_reuses_slots_and_honours_ttl(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("src.cache.time.monotonic", lambda: clock[0])
+    cache = SemanticCache(threshold=0.9, max_entries=2, ttl=10)
+    cache.put(unit(1, 0, 0), "j", "a")
+    cache.put(unit(0, 1, 0), "j", "b")
+    cache.put(unit(0, 0, 1), "j", "c")     # évince "a", réutilise son emplacement
+
+    assert cache._matrix.shape == (2, 3)
+    assert cache.get(unit(0, 0, 1), "j") == "c"
+    clock[0] += 11
+    assert cache.get(unit(0, 0, 1), "j") is None   # expirée : ignorée à la lecture
+    cache.put(unit(1, 0, 0), "j", "d")             # et purgée à l'insertion
+    assert cache.stats()["entries"] == 1
+
+
+def test_semantic_cache_lru_eviction():
+    cache = SemanticCache(threshold=0.99, max_entries=2)
+    cache.put(unit(1, 0, 0), "j", "a")
+    cache.put(unit(0, 1, 0), "j", "b")
+    cache.get(unit(1, 0, 0), "j")          # "a" devient la plus récente
+    cache.put(unit(0, 0, 1), "j", "c")     # évince "b"
+
+    assert cache.get(unit(0, 1, 0), "j") is None
+    assert cache.get(unit(1, 0, 0), "j") == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_semantic_cache_memory_cap_and_clear():
+    cache = SemanticCache(threshold=0.9, max_bytes=1)
+    cache.put(unit(1, 0, 0), "j", "trop gros")
+    assert cache.stats()["entries"] == 0
+
+    cache = SemanticCache(threshold=0.9)
+    cache.put(unit(1, 0, 0), "j", "a")
+    cache.clear()
+    assert cache.get(unit(1, 0, 0), "j") is None
+
+
+# ----------------------------- EMBEDDING CACHE ----------------------------- #
+
+def test_embedding_cache_normalises_questions():
+    cache = EmbeddingCache(max_entries=8)
+    cache.put("Quels concerts  ce soir ?", [0.1, 0.2])
+
+    vector = cache.get("  quels CONCERTS ce soir ? ")
+    assert vector.dtype == np.float32
+    assert not vector.flags.writeable
+    assert cache.get("Quelles expos ?") is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_embedding_cache_eviction_stats():
+    cache = EmbeddingCache(max_entries=2)
+    for q in ["a", "b", "c"]:
+        cache.put(q, [1.0])
+
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,120 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from types import SimpleNamespace
+import pytest
+import numpy as np
+
+import src.chatbot as chatbot
+
+
+# ----------------------------- FIXTURES ----------------------------- #
+
+class FakeModel:
+    """Le vecteur d'une question dépend de son dernier mot (A, B ou C)."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        self.calls.append(list(texts))
+        return np.array([np.eye(4)["ABCD".index(t.split()[-1])] for t in texts], dtype="float32")
+
+
+class FakeIndex:
+    def __init__(self):
+        self.searches = []
+
+    def search(self, vectors, k, params=None):
+        self.searches.append(len(vectors))
+        ids = vectors.argmax(axis=1)  # la question X retrouve l'événement X
+        return np.ones((len(vectors), 1), dtype="float32"), ids.reshape(-1, 1).astype("int64")
+
+
+class FakeLLM:
+    def __init__(self):
+        self.loops = []
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+    async def acall(self, prompt):
+        self.loops.append(asyncio.get_running_loop())
+        if "Question C" in prompt:
+            raise RuntimeError("Mistral indisponible")
+        await asyncio.sleep(0)
+        return "Réponse : " + prompt.split("- **")[1].split("**")[0]
+
+
+@pytest.fixture
+def fake_chatbot(monkeypatch):
+    model, index = FakeModel(), FakeIndex()
+    snapshot = SimpleNamespace(index=index, search_params=None, version=1, date_index=None, sparse_index=None,
+                               metadatas={i: {"title": f"Événement {x}"} for i, x in enumerate("ABCD")})
+    monkeypatch.setattr(chatbot, "_model", model)
+    monkeypatch.setattr(chatbot, "retriever", SimpleNamespace(current=snapshot))
+    monkeypatch.setattr(chatbot, "llm", FakeLLM())
+    chatbot.answer_cache.clear()
+    chatbot.embedding_cache.clear()
+    return model, index
+
+
+# ----------------------------- TESTS ----------------------------- #
+
+def test_batch_encodes_and_searches_once(fake_chatbot):
+    model, index = fake_chatbot
+    results = chatbot.chatbot_ask_batch(["Question B", "Question A", "Question C"])
+
+    assert model.calls == [["Question B", "Question A", "Question C"]]
+    assert index.searches == [3]
+    assert results[0] == ("Réponse : Événement B", ["Événement B (dates inconnues)"])
+    assert results[1][0] == "Réponse : Événement A"
+    assert isinstance(results[2], RuntimeError)  # erreur propre à cette question
+
+
+def test_batch_reuses_caches(fake_chatbot):
+    model, index = fake_chatbot
+    chatbot.chatbot_ask_batch(["Question A"])
+    results = chatbot.chatbot_ask_batch(["Question A", "Question B"])
+
+    assert model.calls == [["Question A"], ["Question B"]]  # embedding de A déjà en cache
+    assert index.searches == [1, 1]  # réponse de A en cache : seule B est cherchée
+    assert [r[0] for r in results] == ["Réponse : Événement A", "Réponse : Événement B"]
+
+
+def test_batch_reuses_one_event_loop(fake_chatbot):
+    chatbot.chatbot_ask_batch(["Question A"])
+    chatbot.chatbot_ask_batch(["Question B"])
+
+    assert len(chatbot.llm.loops) == 2
+    assert chatbot.llm.loops[0] is chatbot.llm.loops[1]  # même client HTTP et même sémaphore
+    chatbot.close_batch_runner()
+    assert chatbot.llm.closed
+    assert chatbot.llm.loops[0].is_closed()
+
+
+def test_batch_runner_exit_handler_registered_once(fake_chatbot, monkeypatch):
+    registered = []
+    monkeypatch.setattr(chatbot.atexit, "register", registered.append)
+    for _ in range(2):  # boucle recréée après fermeture
+        chatbot.chatbot_ask_batch(["Question A"])
+        chatbot.close_batch_runner()
+
+    assert registered == []  # enregistré à l'import du module seulement
+
+
+def test_llm_semaphore_is_per_event_loop(monkeypatch):
+    monkeypatch.setattr(chatbot, "LLM_MAX_CONCURRENCY", 1)
+
+    async def contend():
+        async def hold():
+            async with chatbot.llm_semaphore():
+                await asyncio.sleep(0)
+        await asyncio.gather(*(hold() for _ in range(3)))  # des tâches attendent le sémaphore
+        return chatbot.llm_semaphore()
+
+    first = asyncio.run(contend())
+    second = asyncio.run(contend())  # une autre boucle : pas de « bound to a different event loop »
+    assert first is not second
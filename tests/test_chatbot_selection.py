@@ -0,0 +1,68 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from types import SimpleNamespace
+import numpy as np
+
+import src.chatbot as chatbot
+
+
+# ----------------------------- FIXTURES ----------------------------- #
+
+def chunk(event_id, text="description"):
+    return {"event_id": event_id, "title": f"Événement {event_id}", "dates_text": "demain",
+            "geo_text": "Lyon", "vectorise_text": text}
+
+
+class FakeIndex:
+    """Vecteurs relus par id (comme IndexIDMap2.reconstruct)."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def reconstruct(self, i):
+        return self.vectors[i]
+
+
+# ----------------------------- REGROUPEMENT PAR ÉVÉNEMENT ----------------------------- #
+
+def test_collapse_keeps_best_chunk_per_event():
+    metadatas = {0: chunk("A"), 1: chunk("A"), 2: chunk("B"), 3: {"title": "sans id"}, 4: chunk("B")}
+    ids, chunks = chatbot.collapse_events(np.array([1, 0, 4, 3, 2, -1]), metadatas)
+    assert ids == [1, 4, 3]
+    assert [c.get("event_id") for c in chunks] == ["A", "B", None]
+
+
+def test_mmr_prefers_diverse_events():
+    q = np.array([1.0, 0.0, 0.0], dtype="float32")
+    near = np.array([0.9, 0.436, 0.0], dtype="float32")
+    vectors = [near, near, np.array([0.8, 0.0, 0.6], dtype="float32")]
+    assert chatbot.mmr_order(q, vectors, lambda_=1.0) == [0, 1, 2]
+    assert chatbot.mmr_order(q, vectors, lambda_=0.5) == [0, 2, 1]  # le doublon passe en dernier
+
+
+def test_select_chunks_dedupes_and_diversifies():
+    metadatas = {0: chunk("A"), 1: chunk("A"), 2: chunk("B"), 3: chunk("C")}
+    vectors = np.array([[1, 0], [1, 0], [0.99, 0.14], [0.6, 0.8]], dtype="float32")
+    snapshot = SimpleNamespace(metadatas=metadatas, index=FakeIndex(vectors), date_index=None)
+    q = np.array([1, 0], dtype="float32")
+
+    chunks = chatbot.select_chunks(snapshot, [0, 1, 2, 3], q, None, 2)
+    assert [c["event_id"] for c in chunks] == ["A", "B"]
+    chunks = chatbot.diversify(snapshot.index, q, [0, 2, 3], [metadatas[i] for i in (0, 2, 3)], 0.3)
+    assert [c["event_id"] for c in chunks] == ["A", "C", "B"]
+
+
+# ----------------------------- BUDGET DU PROMPT ----------------------------- #
+
+def test_build_prompt_respects_token_budget():
+    long_text = " ".join(["mot"] * 2000)  # ≈ 2300 tokens estimés
+    chunks = [chunk("A", "courte description"), chunk("B", long_text), chunk("C", "jamais envoyée")]
+
+    full, full_context = chatbot.build_prompt("Question ?", chunks, max_tokens=None)
+    prompt, context = chatbot.build_prompt("Question ?", chunks, max_tokens=600)
+
+    assert chatbot.estimate_tokens(prompt) <= 600 < chatbot.estimate_tokens(full)
+    assert "courte description" in prompt and "…" in prompt
+    assert "Événement C" not in prompt and len(context) == 2 and len(full_context) == 3
+    assert prompt.endswith("Question de l'utilisateur : Question ?\nRéponse :")
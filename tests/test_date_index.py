@@ -0,0 +1,83 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import random
+from datetime import date
+import pandas as pd
+
+from src.date_index import DateIndex, event_date_ranges, parse_time_window, to_day
+import src.chatbot as chatbot
+
+
+# ----------------------------- INDEX D'INTERVALLES ----------------------------- #
+
+def test_overlapping_matches_brute_force():
+    rnd = random.Random(0)
+    ids = [f"EV{i}" for i in range(300)]
+    starts = [rnd.randint(0, 400) for _ in ids]
+    ends = [s + rnd.choice([0, 0, 1, 3, 30, 200]) for s in starts]
+    index = DateIndex(ids, starts, ends)
+
+    for _ in range(500):
+        first = rnd.randint(-10, 650)
+        last = first + rnd.randint(0, 20)
+        expected = {e for e, s, t in zip(ids, starts, ends) if s <= last and t >= first}
+        assert index.overlapping(first, last) == expected
+    assert index.active_on(-5) == set()
+
+
+def test_save_and_load(tmp_path):
+    index = DateIndex.from_ranges({"EV1": [10, 20], "EV2": [15, 15]})
+    index.save(tmp_path / "dates.npz")
+    loaded = DateIndex.load(tmp_path / "dates.npz")
+
+    assert len(loaded) == 2
+    assert loaded.active_on(15) == {"EV1", "EV2"}
+    assert loaded.overlapping(16, 30) == {"EV1"}
+    assert DateIndex.load(tmp_path / "absent.npz") is None
+
+
+def test_event_date_ranges_from_preprocessed_columns():
+    df = pd.DataFrame({
+        "event_id": ["EV1", "EV2", "EV3", "EV4"],
+        "firstdate_begin": ["01/12/2026 18:00:00", "2026-12-05T10:00:00+00:00", "NaT", "24/12/2026 20:00:00"],
+        "lastdate_end": ["31/12/2026 23:00:00", "NaT", "NaT", "01/12/2026 20:00:00"],
+    })
+    ranges = event_date_ranges(df)
+
+    assert ranges["EV1"] == [to_day(date(2026, 12, 1)), to_day(date(2026, 12, 31))]
+    assert ranges["EV2"] == [to_day(date(2026, 12, 5))] * 2  # sans fin : un seul jour
+    assert "EV3" not in ranges
+    assert ranges["EV4"][0] == ranges["EV4"][1]  # fin antérieure au début ignorée
+
+
+# ----------------------------- PÉRIODE DE LA QUESTION ----------------------------- #
+
+def test_parse_time_window():
+    wednesday = date(2026, 10, 14)
+    assert parse_time_window("Que faire aujourd’hui ?", wednesday) == (wednesday, wednesday)
+    assert parse_time_window("Des concerts demain ?", wednesday) == (date(2026, 10, 15),) * 2
+    assert parse_time_window("Quoi faire ce week-end ?", wednesday) == (date(2026, 10, 17), date(2026, 10, 18))
+    assert parse_time_window("Quoi faire ce weekend ?", date(2026, 10, 18)) == (date(2026, 10, 18),) * 2
+    assert parse_time_window("La semaine prochaine", wednesday) == (date(2026, 10, 19), date(2026, 10, 25))
+    assert parse_time_window("Marchés de Noël en décembre", wednesday) == (date(2026, 12, 1), date(2026, 12, 31))
+    assert parse_time_window("Expos en mars", wednesday) == (date(2027, 3, 1), date(2027, 3, 31))
+    assert parse_time_window("Feu d'artifice le 14 juillet", wednesday) == (date(2027, 7, 14),) * 2
+    assert parse_time_window("Le 1er novembre", wednesday) == (date(2026, 11, 1),) * 2
+    assert parse_time_window("Et le 20/10/2026 ?", wednesday) == (date(2026, 10, 20),) * 2
+    assert parse_time_window("Un concert de jazz", wednesday) is None
+
+
+def test_temporal_rerank_puts_events_in_window_first():
+    index = DateIndex.from_ranges({
+        "EV1": [to_day(date(2026, 11, 1)), to_day(date(2026, 11, 2))],
+        "EV2": [to_day(date(2026, 12, 1)), to_day(date(2026, 12, 24))],
+        "EV3": [to_day(date(2026, 12, 20)), to_day(date(2026, 12, 20))],
+    })
+    chunks = [{"event_id": e} for e in ["EV1", "EV4", "EV3", "EV2"]]
+    december = (date(2026, 12, 1), date(2026, 12, 31))
+
+    reranked = chatbot.temporal_rerank(chunks, december, index, top_k=3)
+    assert [c["event_id"] for c in reranked] == ["EV3", "EV2", "EV1"]
+    assert chatbot.temporal_rerank(chunks, None, index) == chunks
+    assert chatbot.filter_events_today(chunks, index) == chunks  # aucun aujourd'hui : tout est gardé
@@ -0,0 +1,72 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from src.embeddings import OnnxEmbedder, cosine_similarities, load_embedding_model
+
+
+# ----------------------------- FIXTURES ----------------------------- #
+
+class FakeTokenizer:
+    """Un token par mot : id = longueur du mot ; padding à droite."""
+
+    def __call__(self, texts, padding=True, truncation=True, max_length=None, return_tensors="np"):
+        ids = [[len(w) for w in t.split()][:max_length] for t in texts]
+        width = max(len(i) for i in ids)
+        return {
+            "input_ids": np.array([i + [0] * (width - len(i)) for i in ids]),
+            "attention_mask": np.array([[1] * len(i) + [0] * (width - len(i)) for i in ids]),
+            "token_type_ids": np.zeros((len(ids), width), dtype=int),
+        }
+
+
+class FakeSession:
+    """État caché du token = [id, 1] ; les tokens de padding valent [100, 100]."""
+
+    def __init__(self):
+        self.batches = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, outputs, feeds):
+        assert set(feeds) == {"input_ids", "attention_mask"} and feeds["input_ids"].dtype == np.int64
+        self.batches.append(len(feeds["input_ids"]))
+        ids = feeds["input_ids"].astype("float32")
+        hidden = np.stack([ids, np.ones_like(ids)], axis=-1)
+        hidden[feeds["attention_mask"] == 0] = 100
+        return [hidden]
+
+
+# ----------------------------- BACKEND ONNX ----------------------------- #
+
+def test_onnx_embedder_mean_pooling_ignores_padding():
+    session = FakeSession()
+    embedder = OnnxEmbedder(session, FakeTokenizer(), dimension=2, max_seq_length=3)
+
+    vectors = embedder.encode(["a bbb", "cc", "dddd e ff gg"], batch_size=2)
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors, [[2, 1], [2, 1], [7 / 3, 1]])  # 4e mot tronqué (max_seq_length)
+    assert session.batches == [2, 1]
+    assert embedder.get_sentence_embedding_dimension() == 2
+
+    single = embedder.encode("cc", normalize_embeddings=True)
+    assert single.shape == (2,) and np.isclose(np.linalg.norm(single), 1)
+
+
+def test_load_embedding_model_backends(tmp_path):
+    model = load_embedding_model("torch", model_name="all-MiniLM-L6-v2")
+    assert model is not None  # SentenceTransformer (simulé dans conftest)
+    with pytest.raises(FileNotFoundError, match="export_onnx"):
+        load_embedding_model("onnx-int8", model_dir=tmp_path)
+    with pytest.raises(ValueError):
+        load_embedding_model("tensorrt")
+
+
+def test_cosine_similarities():
+    a = np.array([[1, 0], [1, 1]], dtype="float32")
+    b = np.array([[2, 0], [1, -1]], dtype="float32")
+    assert np.allclose(cosine_similarities(a, b), [1, 0])
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Exécutés dans un interpréteur neuf : conftest remplace faiss par un mock
+BUILD = """
+import sys, numpy as np, faiss
+index = faiss.IndexIDMap2(faiss.IndexFlatIP(64))
+index.add_with_ids(np.random.rand(100_000, 64).astype("float32"), np.arange(100_000))
+faiss.write_index(index, sys.argv[1])
+"""
+LOAD = """
+import sys, numpy as np, faiss  # importé avant la mesure (load_index l'importe à la demande)
+import src.chatbot as chatbot
+
+def rss_anon():
+    # Pages privées du processus : une copie de l'index y apparaît, pas les pages du fichier mappé
+    for line in open("/proc/self/status"):
+        if line.startswith("RssAnon:"):
+            return int(line.split()[1]) * 1024
+
+before = rss_anon()
+index = chatbot.load_index(sys.argv[1])
+index.search(np.random.rand(4, 64).astype("float32"), 5)
+print(rss_anon() - before)
+"""
+
+
+def run(code, *args, **env):
+    return subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT, capture_output=True, text=True,
+                          env={**os.environ, **env})
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="mesure RSS via /proc (Linux)")
+def test_mmap_index_is_not_copied_in_process_memory(tmp_path):
+    path = str(tmp_path / "faiss.index")
+    built = run(BUILD, path)
+    if built.returncode != 0:
+        pytest.skip(f"faiss indisponible : {built.stderr.strip().splitlines()[-1:]}")
+    size = os.path.getsize(path)
+
+    copied = run(LOAD, path, FAISS_MMAP="0")
+    mapped = run(LOAD, path, FAISS_MMAP="1")
+    assert copied.returncode == 0, copied.stderr
+    assert mapped.returncode == 0, mapped.stderr
+
+    assert int(copied.stdout.split()[-1]) > 0.75 * size   # sans mmap : vecteurs copiés en mémoire
+    assert int(mapped.stdout.split()[-1]) < 0.25 * size   # IDMap2,Flat mappé : pages partagées du fichier
@@ -0,0 +1,115 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import httpx
+import pytest
+
+import src.preprocessing as prep
+
+
+# ----------------------------- SERVEUR FIXTURE ----------------------------- #
+
+RECORDS = [{"recordid": str(i), "fields": {"uid": f"EV{i}", "title_fr": f"Événement {i}"}} for i in range(25)]
+
+
+class OpenDataHandler(BaseHTTPRequestHandler):
+    """Rejoue les pages de l'API records/1.0/search à partir de RECORDS."""
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        start, rows = int(query["start"][0]), int(query["rows"][0])
+        with self.server.lock:
+            self.server.requests.append((start, rows))
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+        time.sleep(self.server.delay)
+
+        if status == 200:
+            body = {"nhits": self.server.nhits, "records": RECORDS[start:start + rows]}
+        else:
+            body = {"error": status}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def opendata_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OpenDataHandler)
+    server.nhits = len(RECORDS)
+    server.statuses = []
+    server.requests = []
+    server.delay = 0
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(server, tmp_path, **kwargs):
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/records/1.0/search/"
+    output_file = tmp_path / "records.jsonl"
+    kwargs.setdefault("backoff_base", 0.001)
+    count = asyncio.run(prep.fetch_all_events_async(url, {"q": "*", "rows": 10, "start": 0},
+                                                    output_file, **kwargs))
+    with open(output_file, encoding="utf-8") as f:
+        return count, [json.loads(line) for line in f]
+
+
+# ----------------------------- TESTS ----------------------------- #
+
+def test_fetch_all_pages_in_order(opendata_server, tmp_path):
+    count, records = fetch(opendata_server, tmp_path, concurrency=3)
+
+    assert count == 25
+    assert [r["uid"] for r in records] == [f"EV{i}" for i in range(25)]
+    # La première page n'est demandée qu'une fois
+    assert sorted(opendata_server.requests) == [(0, 10), (10, 10), (20, 10)]
+
+
+def test_fetch_respects_record_cap(opendata_server, tmp_path):
+    count, records = fetch(opendata_server, tmp_path, max_records=15)
+
+    assert count == 15
+    assert sorted(opendata_server.requests) == [(0, 10), (10, 5)]
+
+
+def test_fetch_retries_transient_errors(opendata_server, tmp_path):
+    opendata_server.statuses = [200, 503, 429]
+
+    count, _ = fetch(opendata_server, tmp_path, concurrency=1)
+
+    assert count == 25
+    assert len(opendata_server.requests) == 5
+
+
+def test_fetch_gives_up_after_max_retries(opendata_server, tmp_path):
+    opendata_server.statuses = [500] * 3
+
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch(opendata_server, tmp_path, max_retries=2)
+
+
+def test_fetch_pages_concurrently(opendata_server, tmp_path):
+    opendata_server.nhits = 80  # 8 pages (les pages au-delà de RECORDS sont vides)
+    opendata_server.delay = 0.2
+
+    start = time.perf_counter()
+    fetch(opendata_server, tmp_path, concurrency=4)
+    elapsed = time.perf_counter() - start
+
+    # première page puis 7 pages par vagues de 4 : ~3 délais au lieu de 8
+    assert elapsed < 1.0
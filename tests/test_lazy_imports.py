@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.mark.parametrize("module, heavy", [
+    ("src.preprocessing", ["easyocr", "torch"]),
+    ("src.vectorisation", ["sentence_transformers", "torch"]),
+    ("src.chatbot", ["sentence_transformers", "faiss", "torch"]),
+])
+def test_import_does_not_load_models(module, heavy):
+    """Importer un module (dans un interpréteur neuf, sans les mocks de conftest) ne charge aucun modèle."""
+    code = f"import sys, {module}; print('chargés:', [m for m in {heavy!r} if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "chargés: []"
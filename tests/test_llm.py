@@ -0,0 +1,198 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+
+from src.llm import MistralLLM, CircuitBreaker, CircuitOpenError
+
+
+# ----------------------------- SERVEUR STUB ----------------------------- #
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Imite /v1/chat/completions : renvoie les statuts scriptés puis 200."""
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        self.server.client_ports.add(self.client_address[1])
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+
+        if status == 200 and payload.get("stream"):
+            self.stream_tokens(payload["messages"][0]["content"].split())
+            return
+        if status == 200:
+            prompt = payload["messages"][0]["content"]
+            body = json.dumps({"choices": [{"message": {"content": f"echo: {prompt}"}}]}).encode()
+        else:
+            body = json.dumps({"error": status}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_tokens(self, tokens):
+        """Réponse SSE en chunked transfer encoding, comme le mode stream de l'API."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [{"choices": [{"delta": {"role": "assistant"}}]}]
+        events += [{"choices": [{"delta": {"content": t + " "}}]} for t in tokens]
+        lines = [f"data: {json.dumps(e)}\n\n" for e in events] + ["data: [DONE]\n\n"]
+        for line in lines:
+            data = line.encode()
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.statuses = []
+    server.client_ports = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_llm(server, **kwargs):
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    kwargs.setdefault("backoff_base", 0.001)
+    return MistralLLM(api_key="test", api_url=url, **kwargs)
+
+
+# ----------------------------- TESTS ----------------------------- #
+
+def test_sync_call_reuses_connection(stub_server):
+    llm = make_llm(stub_server)
+    assert llm("bonjour") == "echo: bonjour"
+    assert llm("salut") == "echo: salut"
+    # Une seule connexion TCP pour les deux appels
+    assert len(stub_server.client_ports) == 1
+    assert llm.metrics.snapshot()["calls"] == 2
+
+
+def test_retry_on_rate_limit_and_server_errors(stub_server):
+    stub_server.statuses = [429, 503]
+    llm = make_llm(stub_server)
+    assert llm("bonjour") == "echo: bonjour"
+    stats = llm.metrics.snapshot()
+    assert stats["retries"] == 2
+    assert stats["errors"] == 0
+
+
+def test_gives_up_after_max_retries(stub_server):
+    stub_server.statuses = [500, 500, 500]
+    llm = make_llm(stub_server, max_retries=2)
+    with pytest.raises(requests.HTTPError):
+        llm("bonjour")
+    assert llm.metrics.snapshot()["errors"] == 1
+
+
+def test_circuit_breaker_opens_after_failures(stub_server):
+    stub_server.statuses = [503, 500]
+    llm = make_llm(stub_server, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            llm("bonjour")
+    with pytest.raises(CircuitOpenError):
+        llm("bonjour")
+    assert llm.breaker.state == "open"
+
+
+def test_client_errors_do_not_open_circuit(stub_server):
+    stub_server.statuses = [400, 400, 400]
+    llm = make_llm(stub_server, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            llm("prompt invalide")
+    assert llm.breaker.state == "closed"
+    assert llm("bonjour") == "echo: bonjour"
+    assert llm.metrics.snapshot()["errors"] == 3
+
+
+def test_half_open_lets_a_single_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    time.sleep(0.06)
+
+    breaker.check()  # essai autorisé
+    for _ in range(3):  # appels concurrents refusés tant que l'essai est en cours
+        with pytest.raises(CircuitOpenError):
+            breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.check()
+
+
+def test_failed_trial_reopens_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_async_call_with_retry(stub_server):
+    stub_server.statuses = [429]
+    llm = make_llm(stub_server)
+
+    async def run():
+        answers = await asyncio.gather(*(llm.acall(f"q{i}") for i in range(5)))
+        await llm.aclose()
+        return answers
+
+    answers = asyncio.run(run())
+    assert answers == [f"echo: q{i}" for i in range(5)]
+    assert llm.metrics.snapshot()["retries"] == 1
+
+
+def test_async_stream_yields_tokens(stub_server):
+    stub_server.statuses = [503]
+    llm = make_llm(stub_server)
+
+    async def run():
+        tokens = [t async for t in llm.astream("un deux trois")]
+        await llm.aclose()
+        return tokens
+
+    assert asyncio.run(run()) == ["un ", "deux ", "trois "]
+    assert llm.metrics.snapshot()["retries"] == 1
+
+
+def test_async_client_scoped_to_event_loop(stub_server):
+    llm = make_llm(stub_server)
+    clients = []
+
+    async def run():
+        await llm.acall("q1")
+        await llm.acall("q2")
+        clients.append(llm._async_client())  # même client pour les appels de cette boucle
+        await llm.aclose()
+
+    asyncio.run(run())
+    asyncio.run(run())
+    assert clients[0] is not clients[1]
+    assert all(c.is_closed for c in clients)
+    assert len(llm._aclients) == 0
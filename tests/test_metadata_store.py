@@ -0,0 +1,51 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pickle
+import pytest
+
+from src.metadata_store import MetadataStore, load_metadatas
+
+
+@pytest.fixture
+def metadatas():
+    """Format historique : un dict complet par chunk, vectorise_text dupliqué."""
+    long_text = "Concert de jazz " * 50
+    return {
+        0: {"event_id": "EV1", "title": "Jazz", "dates_text": "05/12/2025", "geo_text": "Lyon",
+            "vectorise_text": long_text, "chunk": long_text[:500]},
+        1: {"event_id": "EV1", "title": "Jazz", "dates_text": "05/12/2025", "geo_text": "Lyon",
+            "vectorise_text": long_text, "chunk": long_text[450:]},
+        7: {"event_id": "EV2", "title": "Expo", "dates_text": "06/12/2025", "geo_text": "Lyon 2e",
+            "vectorise_text": "Une exposition", "chunk": "Une exposition"},
+    }
+
+
+def test_store_returns_same_fields_as_pickle(metadatas):
+    store = MetadataStore.from_dict(metadatas)
+
+    assert len(store) == 3
+    assert store.events.num_rows == 2  # champs d'événement stockés une fois
+    for vector_id, meta in metadatas.items():
+        assert store[vector_id] == meta
+    assert 3 not in store
+    with pytest.raises(KeyError):
+        store[3]
+
+
+def test_store_roundtrip_memory_mapped(metadatas, tmp_path):
+    events_file, chunks_file = tmp_path / "events.arrow", tmp_path / "chunks.arrow"
+    MetadataStore.from_dict(metadatas).save(events_file, chunks_file)
+
+    store = load_metadatas(events_file, chunks_file)
+    assert store[7]["title"] == "Expo"
+    assert store.to_dict() == metadatas
+
+
+def test_load_metadatas_falls_back_to_legacy_pickle(metadatas, tmp_path):
+    legacy = tmp_path / "metadatas.pkl"
+    with open(legacy, "wb") as f:
+        pickle.dump(list(metadatas.values()), f)
+
+    loaded = load_metadatas(tmp_path / "absent.arrow", tmp_path / "absent2.arrow", legacy)
+    assert loaded[2]["title"] == "Expo"
@@ -0,0 +1,102 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import pytest
+from PIL import Image
+
+import easyocr  # mocké par conftest.py
+import src.preprocessing as prep
+from src.ocr_cache import OCRCache
+
+
+# ----------------------------- SERVEUR D'IMAGES ----------------------------- #
+
+def png_bytes(color):
+    buffer = BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Sert des affiches avec ETag et répond 304 si l'ETag envoyé correspond."""
+
+    def do_GET(self):
+        content = self.server.images[self.path]
+        etag = f'"{OCRCache.content_hash(content)[:16]}"'
+        self.server.hits.append(self.path)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def image_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    server.images = {"/affiche.png": png_bytes("red"), "/copie.png": png_bytes("red")}
+    server.hits = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+# ----------------------------- TESTS ----------------------------- #
+
+@patch.object(easyocr.Reader.return_value, "readtext", return_value=["Concert", "gratuit"])
+def test_unchanged_image_is_not_reocred(mock_readtext, image_server, tmp_path):
+    cache = OCRCache(tmp_path / "ocr.sqlite")
+    assert prep.ocr_image(url(image_server, "/affiche.png"), cache) == "Concert gratuit"
+    cache.close()
+
+    # Nouvelle exécution : le cache est relu depuis le disque, le serveur répond 304
+    cache = OCRCache(tmp_path / "ocr.sqlite")
+    assert prep.ocr_image(url(image_server, "/affiche.png"), cache) == "Concert gratuit"
+
+    assert mock_readtext.call_count == 1
+    stats = cache.stats()
+    assert (stats["revalidated"], stats["misses"]) == (1, 0)
+    assert stats["bytes_saved"] == len(image_server.images["/affiche.png"])
+
+
+@patch.object(easyocr.Reader.return_value, "readtext", return_value=["Expo"])
+def test_same_content_under_other_url_reuses_text(mock_readtext, image_server, tmp_path):
+    cache = OCRCache(tmp_path / "ocr.sqlite")
+
+    prep.ocr_image(url(image_server, "/affiche.png"), cache)
+    assert prep.ocr_image(url(image_server, "/copie.png"), cache) == "Expo"
+
+    assert mock_readtext.call_count == 1
+    assert cache.stats()["content_hits"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+@patch.object(easyocr.Reader.return_value, "readtext", return_value=["Nouveau"])
+def test_changed_image_is_reocred(mock_readtext, image_server, tmp_path):
+    cache = OCRCache(tmp_path / "ocr.sqlite")
+    prep.ocr_image(url(image_server, "/affiche.png"), cache)
+
+    image_server.images["/affiche.png"] = png_bytes("blue")  # nouvel ETag
+    prep.ocr_image(url(image_server, "/affiche.png"), cache)
+
+    assert mock_readtext.call_count == 2
+    assert cache.stats()["misses"] == 2
+    assert "OCR effectués" in cache.report()
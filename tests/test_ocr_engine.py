@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from unittest.mock import patch
+import pytest
+from PIL import Image
+
+import easyocr  # mocké par conftest.py
+import src.ocr_engine as engine
+from src.ocr_cache import OCRCache
+
+
+@pytest.fixture
+def posters(tmp_path):
+    """Cinq affiches locales, dont une très grande."""
+    paths = []
+    for i, size in enumerate([(40, 30)] * 4 + [(4000, 3000)]):
+        path = tmp_path / f"affiche{i}.png"
+        Image.new("RGB", size, (i * 40, 0, 0)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_prepare_image_downscales_and_grayscales(posters):
+    with open(posters[-1], "rb") as f:
+        img = engine.prepare_image(f.read(), max_side=1000)
+
+    assert img.shape == (750, 1000)  # niveaux de gris, proportions conservées
+    with open(posters[0], "rb") as f:
+        assert engine.prepare_image(f.read(), max_side=1000).shape == (30, 40)
+
+
+@patch.object(easyocr.Reader.return_value, "readtext", return_value=["Fête", "des", "Lumières"])
+def test_engine_batches_recognition(mock_readtext, posters):
+    with patch.object(engine, "recognize_batch", wraps=engine.recognize_batch) as spy:
+        results = engine.OCREngine(workers=0, batch_size=2).run(posters + ["/introuvable.png"])
+
+    assert results["/introuvable.png"] == ""
+    assert all(results[p] == "Fête des Lumières" for p in posters)
+    assert [len(call.args[0]) for call in spy.call_args_list] == [2, 2, 1]
+    assert max(img.shape[1] for call in spy.call_args_list for img in call.args[0]) <= engine.OCR_MAX_SIDE
+
+
+@patch.object(easyocr.Reader.return_value, "readtext", return_value=["Expo"])
+def test_engine_uses_cache(mock_readtext, posters, tmp_path):
+    cache = OCRCache(tmp_path / "ocr.sqlite")
+    engine.OCREngine(workers=0, cache=cache).run(posters)
+    assert mock_readtext.call_count == len(posters)
+
+    results = engine.OCREngine(workers=0, cache=cache).run(posters)
+
+    assert mock_readtext.call_count == len(posters)  # aucun nouvel OCR
+    assert set(results.values()) == {"Expo"}
+    assert cache.stats()["content_hits"] == len(posters)
+
+
+class CountingPool(ThreadPoolExecutor):
+    """Pool de threads qui relève le nombre de lots non terminés à chaque soumission."""
+
+    def __init__(self):
+        super().__init__(8)
+        self.futures, self.max_running = [], 0
+
+    def submit(self, fn, *args):
+        future = super().submit(fn, *args)
+        self.futures.append(future)
+        self.max_running = max(self.max_running, sum(not f.done() for f in self.futures))
+        return future
+
+
+def test_engine_caps_batches_in_flight(posters):
+    def slow_recognize(images):
+        time.sleep(0.05)
+        assert all(img.ndim == 2 for img in images)
+        return [("Concert", 0.05)] * len(images)
+
+    ocr = engine.OCREngine(workers=8, batch_size=1, max_inflight=2)
+    ocr._pool, ocr._started = CountingPool(), True
+    with patch.object(engine, "recognize_batch", slow_recognize):
+        results = ocr.run(posters * 3)
+    ocr._pool.shutdown()
+
+    assert set(results.values()) == {"Concert"}
+    assert len(ocr._pool.futures) == 3 * len(posters)  # lots d'une image
+    assert ocr._pool.max_running <= 2
@@ -0,0 +1,206 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import threading
+from datetime import datetime, timezone
+import pytest
+import numpy as np
+
+import src.pipeline as pipeline
+import src.vectorisation as vect
+from db.vectorial_db import new_manifest
+
+
+# ----------------------------- FIXTURES ----------------------------- #
+
+@pytest.fixture(autouse=True)
+def real_clean_texts(monkeypatch):
+    # conftest.py remplace le module `vectorisation` importé par le pipeline
+    monkeypatch.setattr(pipeline, "clean_texts", vect.clean_texts)
+
+
+class FakeModel:
+    """Modèle factice : le vecteur d'un texte encode sa longueur."""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, **kwargs):
+        self.calls.append(list(texts))
+        return np.array([[len(t)] * self.dim for t in texts], dtype="float32")
+
+
+class FakeIndex:
+    def __init__(self):
+        self.ids = set()
+
+    @property
+    def ntotal(self):
+        return len(self.ids)
+
+    def add_with_ids(self, vectors, ids):
+        assert len(vectors) == len(ids)
+        self.ids.update(ids.tolist())
+
+    def remove_ids(self, ids):
+        self.ids.difference_update(ids.tolist())
+
+
+class FakeOCREngine:
+    """Remplace l'OCR : chaque affiche a pour texte son nom de fichier."""
+
+    def __init__(self):
+        self.opened = 0
+        self.calls = []
+
+    def __enter__(self):
+        self.opened += 1
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def run(self, urls, progress=None):
+        self.calls.append(list(urls))
+        return {u: u.rsplit("/", 1)[-1] for u in urls}
+
+
+def record(uid, title, image=None):
+    return {
+        "uid": uid,
+        "title_fr": title,
+        "description_fr": f"<p>Description de <b>{title}</b></p>",
+        "firstdate_begin": datetime.now(timezone.utc).isoformat(),
+        "location_coordinates": "45.76, 4.83",
+        "image": image,
+    }
+
+
+def sink(index=None):
+    return pipeline.IndexSink(FakeModel(), "flat", batch_size=8, existing=(index or FakeIndex(), {}, new_manifest()))
+
+
+# ----------------------------- OUTILS DE FLUX ----------------------------- #
+
+def test_threaded_preserves_order_and_bounds_queue():
+    produced = []
+
+    def source():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    stream = pipeline.threaded(source(), maxsize=2)
+    assert next(stream) == 0
+    threading.Event().wait(0.2)
+    assert len(produced) <= 4  # 1 consommé + 2 en file + 1 en attente d'insertion
+    assert list(stream) == list(range(1, 20))
+
+
+def test_threaded_propagates_errors():
+    def source():
+        yield 1
+        raise RuntimeError("étape en échec")
+
+    with pytest.raises(RuntimeError, match="étape en échec"):
+        list(pipeline.threaded(source()))
+
+
+def test_fetch_records_stops_producer_when_consumer_leaves(monkeypatch):
+    finished = threading.Event()
+
+    async def fake_fetch(base_url, params, sink):
+        try:
+            for i in range(100):
+                sink({"uid": i})
+        finally:
+            finished.set()
+
+    monkeypatch.setattr(pipeline.preprocessing, "fetch_all_events_async", fake_fetch)
+    stream = pipeline.fetch_records(maxsize=2)
+    assert next(stream) == {"uid": 0}
+    stream.close()  # le consommateur abandonne avec une file pleine
+
+    assert finished.wait(2)
+
+
+def test_batched_yields_dataframes():
+    batches = list(pipeline.batched(({"uid": i} for i in range(7)), size=3))
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert batches[-1]["uid"].tolist() == [6]
+
+
+# ----------------------------- PIPELINE ----------------------------- #
+
+def test_run_build_streams_batches_into_index(tmp_path):
+    records = [record(f"EV{i}", f"Concert {i}", image=f"http://img/affiche{i}.png") for i in range(5)]
+    engine = FakeOCREngine()
+    result = pipeline.run_build(records=records, model=FakeModel(), sink=sink(), ocr_engine=engine,
+                                batch_size=2, checkpoint_dir=tmp_path, save=False)
+
+    assert set(result.manifest["events"]) == {f"EV{i}" for i in range(5)}
+    assert result.index.ids == set(result.metadatas)
+    assert engine.opened == 1 and len(engine.calls) == 3  # un seul pool pour tous les lots
+    texts = {m["event_id"]: m["chunk"] for m in result.metadatas.values()}
+    assert "affiche3.png" in texts["EV3"]
+    assert "<b>" not in texts["EV3"]
+    assert all(entry["dates"] for entry in result.manifest["events"].values())  # pour l'index de dates
+
+    for name in ["01_raw", "02_prepared", "03_ocr", "04_clean"]:
+        assert (tmp_path / f"{name}.jsonl").exists()
+    with open(tmp_path / "04_clean.jsonl", encoding="utf-8") as f:
+        assert len([json.loads(line) for line in f if line.strip()]) == 5
+
+
+def test_run_build_incremental_only_encodes_changes():
+    index_sink = sink()
+    records = [record("EV1", "Concert"), record("EV2", "Expo"), record("EV3", "Atelier")]
+    pipeline.run_build(records=records, model=index_sink.model, sink=index_sink,
+                       ocr_engine=FakeOCREngine(), save=False)
+
+    # Second build sur le même index : EV2 modifié, EV3 supprimé
+    manifest = index_sink.manifest
+    second = pipeline.IndexSink(FakeModel(), "flat", batch_size=8,
+                                existing=(index_sink.index, index_sink.metadatas, manifest))
+    records = [record("EV1", "Concert"), record("EV2", "Expo photo")]
+    pipeline.run_build(records=records, model=second.model, sink=second, ocr_engine=FakeOCREngine(), save=False)
+
+    assert (second.stats["new"], second.stats["updated"], second.stats["deleted"]) == (0, 1, 1)
+    assert second.stats["unchanged"] == 1
+    encoded = [t for batch in second.model.calls for t in batch]
+    assert len(encoded) == 1 and "Expo photo" in encoded[0]
+    assert set(manifest["events"]) == {"EV1", "EV2"}
+    assert second.index.ids == set(second.metadatas)
+
+
+def test_sink_counts_events_repeated_across_batches_once():
+    records = [record("EV1", "Concert"), record("EV2", "Expo"), record("EV1", "Concert"), record("EV2", "Expo photo")]
+    index_sink = sink()
+    pipeline.run_build(records=records, model=index_sink.model, sink=index_sink,
+                       ocr_engine=FakeOCREngine(), batch_size=2, save=False)
+
+    stats = index_sink.stats
+    assert (stats["new"], stats["updated"], stats["unchanged"], stats["duplicates"]) == (2, 0, 0, 2)
+    assert "Expo photo" in index_sink.metadatas[max(index_sink.metadatas)]["chunk"]  # dernière version gardée
+    assert index_sink.index.ids == set(index_sink.metadatas)
+
+
+def test_ivf_sink_trains_once_on_buffered_vectors(monkeypatch):
+    created, trained = [], []
+    monkeypatch.setattr(pipeline, "create_index",
+                        lambda dim, index_type, n_vectors=0, nlist=None: created.append(n_vectors) or FakeIndex())
+    monkeypatch.setattr(pipeline, "train_index", lambda index, vectors, max_train_size: trained.append(len(vectors)))
+
+    index_sink = pipeline.IndexSink(FakeModel(), "ivf_flat", batch_size=8, train_size=3,
+                                    existing=(None, {}, new_manifest("ivf_flat")))
+    records = [record(f"EV{i}", f"Concert {i}") for i in range(5)]
+    pipeline.run_build(records=records, model=index_sink.model, sink=index_sink,
+                       ocr_engine=FakeOCREngine(), batch_size=2, save=False)
+
+    assert len(created) == 1 and trained == created == [4]  # entraîné dès 3 vecteurs en attente (2 lots)
+    assert index_sink.index.ids == set(index_sink.metadatas) and len(index_sink.metadatas) == 5
@@ -119,3 +119,65 @@ def test_vectorisation_field(sample_raw_df):
 
     assert "Super événement" in df["vectorise_text"].iloc[0]
     assert "image text" in df["vectorise_text"].iloc[0]
+
+
+# ---------------- TEST VERSIONS VECTORISÉES ---------------- #
+@pytest.fixture
+def messy_df():
+    """Cas limites : dates manquantes, coordonnées invalides, types mélangés."""
+    now = pd.Timestamp("2025-12-05 18:30:00", tz="UTC")
+    return pd.DataFrame({
+        "firstdate_begin": [now, pd.NaT, now, pd.NaT, now],
+        "firstdate_end": [now, now, pd.NaT, pd.NaT, now],
+        "lastdate_begin": [pd.NaT, now, now, pd.NaT, now],
+        "lastdate_end": [now, pd.NaT, pd.NaT, pd.NaT, now],
+        "timings": ["18:00", None, "", float("nan"), "20:00"],
+        "location_coordinates": ["45.7500,4.8500", "", "abc,4.8", [45.7, 4.8], " 45.76 , 4.86 "],
+        "age_min": ["10", "", "3", "", "nan"],
+        "age_max": ["99", "12", "", "", ""],
+        "keywords_fr": [["jazz", "concert"], None, {"a": 1}, 3.5, "expo"],
+        "count": [1.0, float("nan"), 2.5, 0.0, 1e-7],
+    })
+
+
+def test_dates_text_column_matches_row_version(messy_df):
+    expected = messy_df.apply(prep.build_dates, axis=1)
+    assert prep.dates_text_column(messy_df).tolist() == expected.tolist()
+
+
+def test_geo_text_column_matches_row_version(messy_df):
+    df = messy_df.copy()
+    df["latitude"], df["longitude"] = zip(*df["location_coordinates"].apply(prep.split_coords))
+    expected = df.apply(prep.format_coordinates, axis=1)
+
+    lat, lon = prep.split_coords_column(messy_df["location_coordinates"])
+    assert prep.geo_text_column(lat, lon).tolist() == expected.tolist()
+    assert expected.iloc[0] == "Coordonnées : 45.75000, 4.85000"
+
+
+def test_text_column_matches_convert_to_text(messy_df):
+    for col in messy_df.columns:
+        expected = messy_df[col].apply(prep.convert_to_text)
+        assert prep.text_column(messy_df[col]).tolist() == expected.tolist(), col
+
+
+def test_age_text_column_matches_row_version(messy_df):
+    expected = messy_df.apply(prep.build_age_text, axis=1)
+    assert prep.age_text_column(messy_df).tolist() == expected.tolist()
+    assert prep.age_text_column(messy_df.drop(columns=["age_max"])).tolist() == \
+        messy_df.drop(columns=["age_max"]).apply(prep.build_age_text, axis=1).tolist()
+
+
+def test_join_columns_matches_agg(messy_df):
+    df = messy_df[["age_min", "age_max"]]
+    assert prep.join_columns(df, ["age_min", "age_max"]).tolist() == df.agg(" ".join, axis=1).tolist()
+
+
+def test_format_dates_matches_strftime():
+    values = pd.Series(pd.to_datetime(["2025-03-30 01:59:59.9", None, "1999-12-31 23:00:00.0"]).tz_localize("UTC"))
+    values = values.dt.tz_convert("Europe/Paris")
+
+    assert prep.format_dates(values).tolist()[::2] == values.dt.strftime("%d/%m/%Y").tolist()[::2]
+    assert prep.format_dates(values, with_time=True).tolist()[::2] == \
+        values.dt.strftime("%d/%m/%Y %H:%M:%S").tolist()[::2]
+    assert pd.isna(prep.format_dates(values).iloc[1])
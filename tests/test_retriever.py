@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+
+from src.retriever import Retriever
+
+
+class FakeIndex:
+    def __init__(self, ntotal, d=8):
+        self.ntotal = ntotal
+        self.d = d
+
+
+def make_retriever(indexes, metadatas):
+    """Retriever dont chaque chargement renvoie l'index / les métadonnées suivants."""
+    indexes, metadatas = iter(indexes), iter(metadatas)
+    return Retriever(lambda: next(indexes), lambda: next(metadatas), expected_dim=lambda: 8)
+
+
+def test_lazy_load_and_swap_increments_version():
+    retriever = make_retriever([FakeIndex(2), FakeIndex(3)], [[{}, {}], [{}, {}, {}]])
+
+    first = retriever.current
+    assert first.version == 1
+    assert retriever.current is first
+
+    second = retriever.reload()
+    assert second.version == 2
+    assert retriever.current is second
+    assert second.info()["vectors"] == 3
+
+
+def test_inflight_snapshot_is_unchanged_by_reload():
+    retriever = make_retriever([FakeIndex(1), FakeIndex(2)], [[{"chunk": "ancien"}], [{}, {}]])
+
+    snapshot = retriever.current  # une requête en cours garde sa référence
+    retriever.reload()
+
+    assert snapshot.version == 1
+    assert snapshot.metadatas == [{"chunk": "ancien"}]
+    assert snapshot.index.ntotal == 1
+
+
+@pytest.mark.parametrize("bad_index, bad_metadatas", [
+    (FakeIndex(2, d=16), [{}, {}]),  # dimension différente du modèle
+    (FakeIndex(5), [{}, {}]),        # index et métadonnées désynchronisés
+])
+def test_invalid_reload_keeps_previous_snapshot(bad_index, bad_metadatas):
+    retriever = make_retriever([FakeIndex(1), bad_index], [[{}], bad_metadatas])
+    previous = retriever.current
+
+    with pytest.raises(ValueError):
+        retriever.reload()
+
+    assert retriever.current is previous
+    assert retriever.current.version == 1
+
+
+def test_failed_build_does_not_consume_a_version():
+    date_indexes = iter([None, OSError("index de dates illisible"), None])
+
+    def load_date_index():
+        value = next(date_indexes)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    indexes, metadatas = iter([FakeIndex(1)] * 3), iter([[{}]] * 3)
+    retriever = Retriever(lambda: next(indexes), lambda: next(metadatas), load_date_index=load_date_index)
+    assert retriever.current.version == 1
+
+    with pytest.raises(OSError):
+        retriever.reload()  # échoue après la validation, pendant la construction du snapshot
+    assert retriever.current.version == 1
+
+    assert retriever.reload().version == 2
+
+
+def test_workers_follow_a_rebuild_through_the_manifest(tmp_path):
+    """Deux Retriever sur les mêmes fichiers, comme deux workers uvicorn."""
+    index_file, manifest = tmp_path / "index.json", tmp_path / "manifest.json"
+
+    def write_build(n_vectors, mtime_ns):
+        index_file.write_text(str(n_vectors))
+        manifest.write_text(json.dumps({"next_id": n_vectors}))
+        os.utime(manifest, ns=(mtime_ns, mtime_ns))
+
+    def make_worker():
+        return Retriever(lambda: FakeIndex(int(index_file.read_text())),
+                         lambda: [{}] * int(index_file.read_text()),
+                         watch_file=manifest, check_interval=0)
+
+    write_build(1, 1_000_000_000_000)
+    first, second = make_worker(), make_worker()
+    assert first.current.index.ntotal == second.current.index.ntotal == 1
+
+    write_build(2, 2_000_000_000_000)  # nouveau build sur disque
+    first.reload()  # /rebuild reçu par le premier worker seulement
+
+    second.current  # le second voit le nouveau manifeste et recharge en arrière-plan
+    deadline = time.monotonic() + 2
+    while second.current.index.ntotal != 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert second.current.index.ntotal == 2
+    assert first.current.info()["built_at"] == second.current.info()["built_at"]
+    assert second.refresh() is second.current  # manifeste inchangé : pas de rechargement
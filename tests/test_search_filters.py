@@ -0,0 +1,127 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from datetime import date
+import pytest
+import numpy as np
+
+from src.date_index import DateIndex, to_day
+from src.metadata_store import MetadataStore
+from src.search_filters import FilterIndex, SearchFilters, filtered_search, normalize_postal_code
+
+
+# ----------------------------- FIXTURES ----------------------------- #
+
+def make_metadatas():
+    events = {
+        "EV1": {"location_postalcode": "69001", "age_min": "", "age_max": ""},
+        "EV2": {"location_postalcode": "69003", "age_min": 6, "age_max": 12},
+        "EV3": {"location_postalcode": "69003", "age_min": 18, "age_max": ""},
+    }
+    metadatas, vid = {}, 0
+    for eid, attrs in events.items():
+        for chunk in range(2):
+            metadatas[vid] = {"event_id": eid, "title": eid, "chunk_text": f"{eid} {chunk}", **attrs}
+            vid += 1
+    return metadatas
+
+
+def make_date_index():
+    return DateIndex.from_ranges({
+        "EV1": [to_day(date(2025, 7, 1)), to_day(date(2025, 7, 31))],
+        "EV2": [to_day(date(2025, 7, 14)), to_day(date(2025, 7, 14))],
+        "EV3": [to_day(date(2025, 8, 1)), to_day(date(2025, 8, 2))],
+    })
+
+
+class FakeIndex:
+    """Index exact sur des ids 0..n-1 ; `supports_selector=False` imite un index sans IDSelector."""
+
+    def __init__(self, vectors, supports_selector=True):
+        self.vectors = vectors
+        self.ntotal = len(vectors)
+        self.supports_selector = supports_selector
+        self.calls = []
+
+    def search(self, q_vecs, k, params=None):
+        self.calls.append(params)
+        if params is not None and not self.supports_selector:
+            raise RuntimeError("search params not supported for this index")
+        scores = q_vecs @ self.vectors.T
+        if params is not None:
+            scores[:, ~np.isin(np.arange(self.ntotal), params["allowed"])] = -np.inf
+        order = np.argsort(-scores, axis=1)[:, :k]
+        D = np.take_along_axis(scores, order, axis=1)
+        return D, np.where(np.isinf(D), -1, order)
+
+
+# ----------------------------- TESTS ----------------------------- #
+
+def test_normalize_postal_code():
+    assert normalize_postal_code("3") == "69003"
+    assert normalize_postal_code("7e") == "69007"
+    assert normalize_postal_code(" 69001 ") == "69001"
+    assert SearchFilters(postal_codes=["1er", "69001"]).postal_codes == ["69001"]
+
+
+def test_allowed_ids_dict_and_store_agree():
+    metadatas = make_metadatas()
+    cases = [
+        (SearchFilters(postal_codes=["3"]), [2, 3, 4, 5]),
+        (SearchFilters(age=8), [0, 1, 2, 3]),  # EV1 sans bornes d'âge : pas de restriction
+        (SearchFilters(date_from=date(2025, 7, 10), date_to=date(2025, 7, 20)), [0, 1, 2, 3]),
+        (SearchFilters(date_from=date(2025, 7, 20), postal_codes=["69003"]), [4, 5]),
+        (SearchFilters(), [0, 1, 2, 3, 4, 5]),
+    ]
+    for source in (metadatas, MetadataStore.from_dict(metadatas)):
+        index = FilterIndex.from_metadatas(source, make_date_index())
+        for filters, expected in cases:
+            assert index.allowed_ids(filters).tolist() == expected
+
+
+def test_selection_is_cached_per_filter_key():
+    index = FilterIndex.from_metadatas(make_metadatas(), make_date_index())
+
+    allowed, selector = index.selection(SearchFilters(postal_codes=["3"]))
+    assert index.selection(SearchFilters(postal_codes=["69003"])) == (allowed, selector)  # même clé normalisée
+    assert allowed.tolist() == [2, 3, 4, 5] and not allowed.flags.writeable
+    assert index.selection(SearchFilters(age=8))[0].tolist() == [0, 1, 2, 3]
+
+    index.selection(SearchFilters(age=20), max_entries=2)
+    assert len(index._selections) == 2  # la plus ancienne clé est évincée
+
+
+def test_date_window_without_date_index_warns():
+    index = FilterIndex.from_metadatas(make_metadatas())
+
+    with pytest.warns(RuntimeWarning, match="index de dates"):
+        allowed = index.allowed_ids(SearchFilters(date_from=date(2025, 7, 10)))
+    assert allowed.tolist() == [0, 1, 2, 3, 4, 5]
+
+
+def test_filtered_search_uses_selector():
+    vectors = np.eye(6, dtype="float32")
+    index = FakeIndex(vectors)
+    allowed = np.array([2, 4], dtype="int64")
+    D, I = filtered_search(index, vectors[[0]], 2, allowed, lambda sel: None if sel is None else {"allowed": allowed})
+
+    assert sorted(I[0].tolist()) == [2, 4]
+    assert len(index.calls) == 1  # aucune recherche de secours nécessaire
+
+
+def test_filtered_search_falls_back_to_overfetch():
+    vectors = np.eye(6, dtype="float32")
+    index = FakeIndex(vectors, supports_selector=False)
+    D, I = filtered_search(index, vectors[[4, 1]], 2, np.array([4, 5]),
+                           lambda sel: None if sel is None else {"allowed": [4, 5]})
+
+    assert I[0].tolist() == [4, 5]
+    assert D[0][0] == 1.0
+    assert sorted(I[1].tolist()) == [4, 5]
+
+
+def test_filtered_search_nothing_allowed():
+    index = FakeIndex(np.eye(3, dtype="float32"))
+    D, I = filtered_search(index, np.eye(3, dtype="float32")[[0]], 2, np.array([], dtype="int64"), lambda sel: None)
+    assert I.tolist() == [[-1, -1]]
+    assert index.calls == []
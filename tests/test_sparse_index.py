@@ -0,0 +1,127 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import math
+from collections import Counter
+from types import SimpleNamespace
+import numpy as np
+
+from src.sparse_index import SparseIndex, reciprocal_rank_fusion, tokenize
+import src.chatbot as chatbot
+
+
+TEXTS = [
+    "Concert de jazz au Transbordeur avec Ibrahim Maalouf",
+    "Exposition de peinture au musée des Beaux-Arts",
+    "Apéro végétal place Bellecour pendant le Run in Lyon",
+    "Concert classique à l'Auditorium, orchestre national de Lyon",
+    "Atelier jazz pour enfants",
+]
+VECTOR_IDS = [10, 11, 12, 20, 21]
+
+
+def brute_force_bm25(query, texts, k1=1.2, b=0.75):
+    docs = [Counter(tokenize(t)) for t in texts]
+    lengths = [sum(d.values()) for d in docs]
+    avg = sum(lengths) / len(docs)
+    scores = []
+    for doc, length in zip(docs, lengths):
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in d for d in docs)
+            if term in doc:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                tf = doc[term]
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg))
+        scores.append(score)
+    return scores
+
+
+# ----------------------------- INDEX BM25 ----------------------------- #
+
+def test_tokenize_strips_accents_and_stopwords():
+    assert tokenize("L'apéro végétal de Bellecour") == ["apero", "vegetal", "bellecour"]
+
+
+def test_search_matches_brute_force():
+    index = SparseIndex.build(TEXTS, VECTOR_IDS)
+    for query in ["concert jazz", "Bellecour", "orchestre de Lyon", "musée"]:
+        scores, ids = index.search(query, 3)
+        expected = brute_force_bm25(query, TEXTS)
+        ranked = sorted((s, VECTOR_IDS[i]) for i, s in enumerate(expected) if s > 0)[::-1][:3]
+        assert np.allclose(scores, [s for s, _ in ranked], rtol=1e-5)
+        assert set(ids.tolist()) == {i for _, i in ranked}
+    assert len(index.search("inconnu", 3)[1]) == 0
+
+
+def test_search_allowed_ids_and_save_load(tmp_path):
+    index = SparseIndex.build(TEXTS, VECTOR_IDS)
+    assert index.search("jazz", 5, allowed_ids=np.array([21]))[1].tolist() == [21]
+
+    index.save(tmp_path / "bm25.npz")
+    loaded = SparseIndex.load(tmp_path / "bm25.npz")
+    assert len(loaded) == 5
+    assert loaded.search("Transbordeur", 1)[1].tolist() == [10]
+    assert SparseIndex.load(tmp_path / "absent.npz") is None
+
+
+def test_incremental_update_matches_full_build(monkeypatch, tmp_path):
+    metadatas = {i: {"title": "", "chunk": t} for i, t in zip(VECTOR_IDS, TEXTS)}
+    previous = SparseIndex.from_metadatas(metadatas)
+    previous.save(tmp_path / "bm25.npz")
+    previous = SparseIndex.load(tmp_path / "bm25.npz")
+
+    # Événement modifié : ses chunks reviennent avec de nouveaux ids ; un autre est supprimé
+    del metadatas[11], metadatas[21]
+    metadatas[22] = {"title": "", "chunk": "Exposition photo au musée Gadagne"}
+    tokenized = []
+    monkeypatch.setattr("src.sparse_index.tokenize", lambda text: tokenized.append(text) or tokenize(text))
+    updated = SparseIndex.from_metadatas(metadatas, previous)
+
+    assert tokenized == [" Exposition photo au musée Gadagne"]  # seul le chunk ajouté est tokenisé
+    full = SparseIndex.from_metadatas(metadatas)
+    assert updated.vector_ids.tolist() == full.vector_ids.tolist() == [10, 12, 20, 22]
+    assert updated.vocabulary.tolist() == full.vocabulary.tolist()
+    assert updated.indptr.tolist() == full.indptr.tolist() and updated.docs.tolist() == full.docs.tolist()
+    assert np.allclose(updated.weights, full.weights)
+
+
+def test_index_without_raw_frequencies_is_rebuilt(tmp_path):
+    index = SparseIndex.build(TEXTS, VECTOR_IDS)
+    np.savez(tmp_path / "ancien.npz", vocabulary=index.vocabulary, indptr=index.indptr, docs=index.docs,
+             weights=index.weights, vector_ids=index.vector_ids)
+    legacy = SparseIndex.load(tmp_path / "ancien.npz")
+
+    assert legacy.tfs is None
+    metadatas = {i: {"title": "", "chunk": t} for i, t in zip(VECTOR_IDS, TEXTS)}
+    assert SparseIndex.from_metadatas(metadatas, legacy).tfs is not None
+
+
+def test_reciprocal_rank_fusion():
+    scores, ids = reciprocal_rank_fusion([[1, 2, 3, -1], [3, 4]], 4, rrf_k=60)
+    assert ids.tolist()[0] == 3  # présent dans les deux classements
+    assert set(ids.tolist()) == {1, 2, 3, 4}
+    assert np.isclose(scores[0], 1 / 63 + 1 / 61)
+    assert reciprocal_rank_fusion([[5]], 3)[1].tolist() == [5, -1, -1]
+
+
+# ----------------------------- RECHERCHE HYBRIDE ----------------------------- #
+
+class FakeIndex:
+    """Classement dense fixe : le chunk 11 puis 20, quelle que soit la question."""
+
+    def search(self, vectors, k, params=None):
+        ids = np.array([[11, 20, 12][:k]] * len(vectors), dtype="int64")
+        return np.ones(ids.shape, dtype="float32"), ids
+
+
+def test_hybrid_search_promotes_exact_keyword_match(monkeypatch):
+    monkeypatch.setattr(chatbot, "HYBRID_SEARCH", True)
+    snapshot = SimpleNamespace(index=FakeIndex(), search_params=None, filter_index=None,
+                               sparse_index=SparseIndex.build(TEXTS, VECTOR_IDS))
+    q_vecs = np.zeros((1, 4), dtype="float32")
+
+    _, dense = chatbot.search(snapshot, q_vecs, 2)
+    assert dense[0].tolist() == [11, 20]
+    _, hybrid = chatbot.search(snapshot, q_vecs, 2, questions=["Ibrahim Maalouf au Transbordeur"])
+    assert 10 in hybrid[0].tolist()  # trouvé par BM25 seulement
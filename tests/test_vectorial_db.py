@@ -0,0 +1,205 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import numpy as np
+import pandas as pd
+
+import db.vectorial_db as vdb
+
+
+# ----------------------------- FIXTURES ----------------------------- #
+
+class FakeModel:
+    """Modèle factice : le vecteur d'un texte encode sa longueur."""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, **kwargs):
+        self.calls.append(list(texts))
+        return np.array([[len(t)] * self.dim for t in texts], dtype="float32")
+
+
+@pytest.fixture
+def sample_df():
+    return pd.DataFrame({
+        "event_id": ["EV1", "EV2"],
+        "title": ["Concert", "Expo"],
+        "dates_text": ["01/05/2024", "02/05/2024"],
+        "geo_text": ["Lyon", "Lyon"],
+        "vectorise_text": ["a" * 1200, "Une exposition"]
+    })
+
+
+# ----------------------------- TESTS ----------------------------- #
+
+def test_split_text_short_text_not_chunked():
+    assert vdb.split_text("court") == ["court"]
+    assert vdb.split_text("") == []
+
+
+def test_build_chunks_keeps_event_metadata(sample_df):
+    chunks, metadatas = vdb.build_chunks(sample_df)
+    assert len(chunks) == len(metadatas) == 4
+    assert [m["event_id"] for m in metadatas] == ["EV1", "EV1", "EV1", "EV2"]
+    assert all(m["chunk"] == c for m, c in zip(metadatas, chunks))
+
+
+def test_encode_chunks_batches_into_preallocated_matrix():
+    model = FakeModel()
+    chunks = ["x" * n for n in [5, 1, 4, 2, 3]]
+    vectors, report = vdb.encode_chunks(model, chunks, batch_size=2)
+
+    assert vectors.dtype == np.float32
+    assert vectors.shape == (5, 8)
+    # Chaque ligne correspond bien à son chunk malgré le tri par longueur
+    assert vectors[:, 0].tolist() == [5, 1, 4, 2, 3]
+    assert len(model.calls) == 3
+    assert report["chunks"] == 5
+    assert report["batch_size"] == 2
+
+
+class FakeIndex:
+    """Index factice qui garde les ids présents."""
+
+    def __init__(self):
+        self.ids = set()
+
+    def add_with_ids(self, vectors, ids):
+        assert len(vectors) == len(ids)
+        self.ids.update(ids.tolist())
+
+    def remove_ids(self, ids):
+        self.ids.difference_update(ids.tolist())
+
+
+def test_update_index_only_reencodes_changed_events(sample_df):
+    model = FakeModel()
+    index = FakeIndex()
+    metadatas = {}
+    manifest = vdb.new_manifest()
+
+    stats = vdb.update_index(index, metadatas, manifest, sample_df, model, batch_size=8)
+    assert stats["new"] == 2
+    assert stats["chunks_encoded"] == 4
+    assert index.ids == set(metadatas) == {0, 1, 2, 3}
+
+    # Second passage : EV2 modifié, EV1 supprimé, EV3 ajouté
+    df = pd.DataFrame({
+        "event_id": ["EV2", "EV3"],
+        "title": ["Expo", "Atelier"],
+        "vectorise_text": ["Une exposition modifiée", "Un atelier"]
+    })
+    model.calls.clear()
+    stats = vdb.update_index(index, metadatas, manifest, df, model, batch_size=8)
+
+    assert (stats["new"], stats["updated"], stats["deleted"]) == (1, 1, 1)
+    assert stats["chunks_removed"] == 4
+    assert sorted(t for batch in model.calls for t in batch) == ["Un atelier", "Une exposition modifiée"]
+    assert index.ids == set(metadatas) == {4, 5}
+    assert set(manifest["events"]) == {"EV2", "EV3"}
+
+    # Troisième passage identique : rien à ré-encoder
+    model.calls.clear()
+    stats = vdb.update_index(index, metadatas, manifest, df, model, batch_size=8)
+    assert stats["unchanged"] == 2
+    assert stats["chunks_encoded"] == 0
+    assert model.calls == []
+
+
+def test_index_description_per_type():
+    assert vdb.index_description("flat", 384, 1000) == "IDMap2,Flat"
+    assert vdb.index_description("hnsw", 384, 1000) == "IDMap2,HNSW32"
+    assert vdb.index_description("ivf_flat", 384, 10000, nlist=64) == "IDMap2,IVF64,Flat"
+    assert vdb.index_description("ivf_pq", 384, 100000, nlist=256) == "IDMap2,IVF256,PQ48x8"
+    with pytest.raises(ValueError):
+        vdb.index_description("lsh", 384, 1000)
+
+
+# ----------------------------- DÉCOUPAGE EN TOKENS ----------------------------- #
+
+class FakeTokenizer:
+    """Un token par mot ou signe de ponctuation, avec ses positions dans le texte."""
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False):
+        import re
+        offsets = [m.span() for m in re.finditer(r"\w+|[^\w\s]", text)]
+        encoding = {"input_ids": list(range(len(offsets)))}
+        if return_offsets_mapping:
+            encoding["offset_mapping"] = offsets
+        return encoding
+
+
+def sentence(i, n_words):
+    return " ".join(f"m{i}_{j}" for j in range(n_words)) + "."
+
+
+def test_token_chunker_short_text_single_chunk():
+    chunker = vdb.TokenChunker(FakeTokenizer(), max_tokens=20, overlap_tokens=4)
+    assert chunker("Un concert gratuit. ") == ["Un concert gratuit."]
+    assert chunker("") == []
+
+
+def test_token_chunker_packs_whole_sentences_within_budget():
+    tokenizer = FakeTokenizer()
+    text = " ".join(sentence(i, 5) for i in range(10))  # 10 phrases de 6 tokens
+    chunker = vdb.TokenChunker(tokenizer, max_tokens=20, overlap_tokens=6)
+    chunks = chunker(text)
+
+    assert all(len(tokenizer(c)["input_ids"]) <= 20 for c in chunks)
+    assert all(c.startswith("m") and c.endswith(".") for c in chunks)  # pas de phrase coupée
+    # Recouvrement d'une phrase entière entre deux chunks consécutifs
+    assert all(a.split(". ")[-1] == b.split(". ")[0] + "." for a, b in zip(chunks, chunks[1:]))
+    assert chunks[-1].endswith(sentence(9, 5))
+    assert chunker.stats["sentences_split"] == 0
+    assert vdb.count_truncated(chunks, tokenizer, 20) == 0
+
+
+def test_token_chunker_splits_overlong_sentence_between_words():
+    tokenizer = FakeTokenizer()
+    text = sentence(0, 50)
+    chunker = vdb.TokenChunker(tokenizer, max_tokens=16, overlap_tokens=4)
+    chunks = chunker(text)
+
+    assert chunker.stats["sentences_split"] == len(chunks) - 1
+    assert all(len(tokenizer(c)["input_ids"]) <= 16 for c in chunks)
+    words = text.rstrip(".").split()
+    assert all(w in words for c in chunks for w in c.rstrip(".").split())  # aucun mot coupé
+    assert set(w for c in chunks for w in c.rstrip(".").split()) == set(words)
+    # L'ancien découpage en caractères dépasse la limite du modèle
+    assert vdb.count_truncated(vdb.split_text(text, 500, 50), tokenizer, 16) > 0
+
+
+def test_incremental_rebuild_when_chunking_changes(monkeypatch, tmp_path, capsys):
+    manifest_file = tmp_path / "manifest.json"
+    manifest_file.write_text('{"next_id": 0, "index_type": "flat", "chunking": "chars", "events": {}}')
+    monkeypatch.setattr(vdb, "load_manifest", lambda: vdb.json.loads(manifest_file.read_text()))
+
+    assert vdb.open_existing_index("flat", True, chunking="tokens:254/32") is None
+    assert "Découpage modifié" in capsys.readouterr().out
+
+
+def test_incremental_rebuild_when_embedding_backend_changes(monkeypatch, tmp_path, capsys):
+    manifest_file = tmp_path / "manifest.json"
+    monkeypatch.setattr(vdb, "load_manifest", lambda: vdb.json.loads(manifest_file.read_text()))
+    monkeypatch.setattr(vdb, "MODEL_NAME", "all-MiniLM-L6-v2")
+
+    # Manifeste d'avant ces champs : torch et MODEL_NAME
+    manifest_file.write_text('{"next_id": 0, "index_type": "flat", "chunking": "chars", "events": {}}')
+    assert vdb.open_existing_index("flat", True, embedding_backend="onnx-int8",
+                                   embedding_model="all-MiniLM-L6-v2") is None
+    assert "Backend d'embedding modifié (torch -> onnx-int8)" in capsys.readouterr().out
+
+    manifest_file.write_text(vdb.json.dumps(vdb.new_manifest("flat", "chars", "onnx-int8", "all-MiniLM-L6-v2")))
+    assert vdb.open_existing_index("flat", True, embedding_backend="torch",
+                                   embedding_model="all-MiniLM-L6-v2") is None
+    assert "Backend d'embedding modifié (onnx-int8 -> torch)" in capsys.readouterr().out
+
+    assert vdb.open_existing_index("flat", True, embedding_backend="onnx-int8",
+                                   embedding_model="autre-modele") is None
+    assert "Modèle d'embedding modifié (all-MiniLM-L6-v2 -> autre-modele)" in capsys.readouterr().out
@@ -5,6 +5,7 @@ import pytest
 import pandas as pd
 from unittest.mock import patch, MagicMock
 import json
+import random
 
 # ----------------------------- FIXTURES ----------------------------- #
 
@@ -25,18 +26,20 @@ def test_dataframe_has_vectorise_text(sample_df):
     assert "vectorise_text" in sample_df.columns
 
 
-@patch("src.vectorisation.SentenceTransformer")
+@patch("sentence_transformers.SentenceTransformer")
 def test_model_loading(mock_model, sample_df):
-    """Vérifie que SentenceTransformer est bien instancié avec le bon modèle."""
+    """Vérifie que SentenceTransformer est bien instancié avec le bon modèle par le chargeur paresseux."""
     from src.vectorisation import MODEL_NAME
+    from src.embeddings import load_embedding_model
 
     mock_model.return_value = MagicMock()
 
-    _ = mock_model(MODEL_NAME)
+    model = load_embedding_model("torch", MODEL_NAME)
     mock_model.assert_called_once_with(MODEL_NAME)
+    assert model is mock_model.return_value
 
 
-@patch("src.vectorisation.SentenceTransformer")
+@patch("sentence_transformers.SentenceTransformer")
 def test_vectorisation_process(mock_model, sample_df, tmp_path):
     """
     Test complet :
@@ -58,9 +61,11 @@ def test_vectorisation_process(mock_model, sample_df, tmp_path):
     mock_instance.encode.return_value = fake_vectors
 
     # Simule le script
+    from src.embeddings import load_embedding_model
+    model = load_embedding_model("torch")
     df = sample_df.copy()
     texts = df["vectorise_text"].tolist()
-    embeddings = mock_instance.encode(
+    embeddings = model.encode(
         texts,
         batch_size=64,
         show_progress_bar=True,
@@ -87,3 +92,44 @@ def test_vectorisation_process(mock_model, sample_df, tmp_path):
     assert len(lines) == 2
     assert "embedding" in lines[0]
     assert len(lines[0]["embedding"]) == 128
+
+
+# ----------------------------- CLEAN_TEXT ----------------------------- #
+
+from src.vectorisation import clean_text, clean_text_reference, clean_texts, preprocess_dataframe
+
+FRAGMENTS = [
+    "Concert", " de jazz ", "Fête des Lumières", "d’art", "\n", "\t", "\r\n", "\xa0", " ", "\x1c", "  ",
+    "<p>", "</p>", "<br>", "<br/>", "</br>", "<img src='a.png'>", "<b>", "</b>", "<a href=\"x?a=1&b=2\">", "</a>",
+    "<ul><li>", "</li></ul>", "<script>var a = '<p>';</script>", "<style>p {}</style>", "<template>t",
+    "</template>", "<rt>", "</rt>", "<rp>(</rp>", "<!-- commentaire -->", "<!DOCTYPE html>", "<?php echo 1 ?>",
+    "<![CDATA[brut]]>", "&amp;", "&amp", "&eacute;", "&nbsp;", "&#39;", "&#x41;", "&#150;", "&foo;", "&",
+    "a < b", "1 > 0", "<", "</", "<div", "</span>", "<pre>", "</pre>",
+]
+
+
+def fuzz_corpus(n=3000, seed=42):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 12))) for _ in range(n)]
+
+
+def test_clean_text_matches_reference_on_fixture(sample_df):
+    for text in sample_df["vectorise_text"].tolist() + ["", None, "<p>Un <b>super</b>&nbsp;concert</p>"]:
+        assert clean_text(text) == clean_text_reference(text)
+
+
+def test_clean_text_matches_reference_on_fuzz_corpus():
+    for text in fuzz_corpus():
+        assert clean_text(text) == clean_text_reference(text), repr(text)
+
+
+def test_clean_texts_parallel_keeps_order():
+    corpus = fuzz_corpus(n=300, seed=7)
+
+    assert clean_texts(corpus, workers=2, chunk_size=50) == [clean_text_reference(t) for t in corpus]
+
+
+def test_preprocess_dataframe_cleans_html():
+    df = pd.DataFrame({"vectorise_text": ["<p>Concert&nbsp;de <b>jazz</b></p>\n", "Expo"]})
+
+    assert preprocess_dataframe(df, workers=1)["vectorise_text"].tolist() == ["Concert de jazz", "Expo"]